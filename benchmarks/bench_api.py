@@ -0,0 +1,38 @@
+"""
+Times compiling a small file many times through compile_to_assembly against compile_assembly,
+which prints its banners and writes main.s each time.
+Run from the repo root with: python3 -m benchmarks.bench_api [calls]
+Embedding tools call the compiler at high rates on small inputs, where the fixed cost of each call shows.
+"""
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+from core.compile import compile_assembly, compile_to_assembly
+
+SOURCE = "int g = 3;\nint f(int a) { return a * g; }\nint main(void) { return f(2); }\n"
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as root:
+        os.chdir(root)
+        try:
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                for _ in range(calls):
+                    compile_assembly(SOURCE)
+            files = time.perf_counter() - start
+        finally:
+            os.chdir(cwd)
+    start = time.perf_counter()
+    for _ in range(calls):
+        assert compile_to_assembly(SOURCE).ok
+    api = time.perf_counter() - start
+    print(f"compile_assembly:    {calls / files:8.0f} calls/s")
+    print(f"compile_to_assembly: {calls / api:8.0f} calls/s ({files / api:.2f}x)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+Compares the arena against the tree of node objects for the same translation unit.
+Run from the repo root with: python3 -m benchmarks.bench_arena [statements]
+Reports the memory each representation keeps alive, measured with tracemalloc, and the time and size of
+writing the whole tree out and reading it back: the arena with to_bytes, the node objects with pickle.
+"""
+import pickle
+import sys
+import time
+import tracemalloc
+from core.lexer import Lexer
+from core.parser import Parser
+from core.data.arena import Arena
+from core.util.context import CompilationContext
+
+STATEMENT = "a = a + b * {n} - (c / 3);\nif (a > b) b = b + 1;\n"
+
+def make_source(statements: int) -> str:
+    body = "".join(STATEMENT.format(n=n) for n in range(statements // 2))
+    return "int main(void) {\n int a = 1;\n int b = 2;\n int c = 3;\n" + body + " return a;\n}\n"
+
+def retained(build) -> tuple:
+    tracemalloc.start()
+    result = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size
+
+def timed(function, *args) -> tuple:
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+def main():
+    statements = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 10000))
+    tokens = Lexer(make_source(statements), context=CompilationContext()).tokenise_buffer()
+    tree, tree_size = retained(lambda: Parser(tokens, context=CompilationContext()).parse_program())
+    arena, arena_size = retained(lambda: Arena.from_program(tree))
+    print(f"{len(arena)} nodes: objects {tree_size / 1e6:6.2f} MB, arena {arena_size / 1e6:6.2f} MB ({tree_size / arena_size:.1f}x less)")
+
+    data, dump = timed(pickle.dumps, tree)
+    _, load = timed(pickle.loads, data)
+    print(f"pickle:   {len(data) / 1e6:6.2f} MB, dump {dump * 1e3:7.2f}ms, load {load * 1e3:7.2f}ms")
+    data, dump = timed(arena.to_bytes)
+    _, load = timed(Arena.from_bytes, data)
+    print(f"to_bytes: {len(data) / 1e6:6.2f} MB, dump {dump * 1e3:7.2f}ms, load {load * 1e3:7.2f}ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+"""
+Times compiling a batch of files with compile_many at different numbers of jobs.
+Run from the repo root with: python3 -m benchmarks.bench_batch [files] [functions per file]
+Files share nothing, so throughput should grow with the jobs up to the number of CPUs
+and then stay flat. The pool's start up is counted, it is what a batch pays.
+"""
+import os
+import sys
+import tempfile
+import time
+from core.batch import compile_many
+from benchmarks.bench_pipeline_memory import make_source
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    functions = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    cpus = os.cpu_count() or 1
+    with tempfile.TemporaryDirectory() as root:
+        paths = []
+        for n in range(count):
+            path = os.path.join(root, f"unit{n}.c")
+            with open(path, "w") as file:
+                file.write(make_source(functions))
+            paths.append(path)
+        out_dir = os.path.join(root, "out")
+        serial = None
+        for jobs in sorted({1, 2, 4, cpus}):
+            start = time.perf_counter()
+            results = compile_many(paths, jobs, out_dir)
+            elapsed = time.perf_counter() - start
+            assert not any(result.error for result in results)
+            serial = serial or elapsed
+            print(f"{jobs:>3} jobs: {elapsed * 1e3:8.2f}ms, {count / elapsed:7.1f} files/s ({serial / elapsed:.2f}x)")
+    print(f"{cpus} CPUs")
+
+if __name__ == "__main__":
+    main()
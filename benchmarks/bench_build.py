@@ -0,0 +1,70 @@
+"""
+Times building and running a batch of files one after another, as compile() does, against the asyncio
+driver that runs clang and the programs while the next file compiles.
+Run from the repo root with: python3 -m benchmarks.bench_build [files] [functions per file]
+Without clang on the PATH a stand in that sleeps for CLANG_SECONDS is used, so the overlap can still be seen.
+"""
+import io
+import os
+import shutil
+import stat
+import subprocess
+import sys
+import tempfile
+import time
+from core.build import build_many
+from core.compile import emit_assembly
+from benchmarks.bench_pipeline_memory import make_source
+
+CLANG_SECONDS = 0.05
+
+STAND_IN = f"""#!/bin/sh
+sleep {CLANG_SECONDS}
+printf '#!/bin/sh\\nexit 0\\n' > "$3"
+chmod +x "$3"
+"""
+
+def serial(paths: list, root: str):
+    for path in paths:
+        with open(path) as file:
+            text = file.read()
+        out = io.StringIO()
+        emit_assembly(text, out)
+        with open(os.path.join(root, "main.s"), "w") as file:
+            file.write(out.getvalue())
+        subprocess.run(["clang", "main.s", "-o", "main"], cwd=root, check=True)
+        subprocess.run(["./main"], cwd=root)
+        os.remove(os.path.join(root, "main.s"))
+        os.remove(os.path.join(root, "main"))
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 24
+    functions = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+    with tempfile.TemporaryDirectory() as root:
+        if shutil.which("clang") is None:
+            bin = os.path.join(root, "bin")
+            os.mkdir(bin)
+            clang = os.path.join(bin, "clang")
+            with open(clang, "w") as file:
+                file.write(STAND_IN)
+            os.chmod(clang, os.stat(clang).st_mode | stat.S_IEXEC)
+            os.environ["PATH"] = bin + os.pathsep + os.environ["PATH"]
+            print(f"clang not found, using a stand in that takes {CLANG_SECONDS * 1e3:.0f}ms")
+        paths = []
+        for n in range(count):
+            path = os.path.join(root, f"unit{n}.c")
+            with open(path, "w") as file:
+                file.write(make_source(functions))
+            paths.append(path)
+        start = time.perf_counter()
+        serial(paths, root)
+        one_by_one = time.perf_counter() - start
+        start = time.perf_counter()
+        results = build_many(paths)
+        overlapped = time.perf_counter() - start
+        assert not any(result.error for result in results)
+    print(f"{count} files one after another: {one_by_one * 1e3:8.2f}ms")
+    print(f"{count} files overlapped:        {overlapped * 1e3:8.2f}ms ({one_by_one / overlapped:.2f}x faster)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+"""
+Times producing the assembly for a large source with an empty compile cache and again with the entry cached.
+Run from the repo root with: python3 -m benchmarks.bench_cache [functions]
+A hit only hashes the source and copies the cached file, so it skips the whole front end and code generation.
+"""
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+from core.compile import compile_assembly
+from core.util.cache import CompileCache
+from benchmarks.bench_pipeline_memory import make_source
+
+def timed(text: str, cache: CompileCache) -> float:
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        compile_assembly(text, cache)
+    return time.perf_counter() - start
+
+def main():
+    functions = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    text = make_source(functions)
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as root:
+        os.chdir(root)
+        try:
+            cache = CompileCache(os.path.join(root, "cache"))
+            miss = timed(text, cache)
+            hit = min(timed(text, cache) for _ in range(5))
+        finally:
+            os.chdir(cwd)
+    print(f"{functions} functions: miss {miss * 1e3:8.2f}ms, hit {hit * 1e3:6.2f}ms ({miss / hit:.0f}x faster), {cache.report()}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+Times code generation for functions that grow in both length and nesting depth.
+Run from the repo root with: python3 -m benchmarks.bench_codegen [depth]
+Each level of nesting holds the same handful of statements, so when output was built by returning
+and concatenating strings every level re-copied everything below it and the time per statement grew
+with depth. Writing into one buffer keeps it flat.
+"""
+import os
+import sys
+import time
+from core.lexer import Lexer
+from core.parser import Parser
+from core.fold import Fold
+from core.codegen import CodeGenerator
+from core.util.context import CompilationContext
+
+LEVEL = """
+    a = a + b * {n} - (b / 3);
+    b = b - a % 7;
+    if (a > b && b != {n}) a = a - 1; else b = b + 1;
+    while (a > 100) a = a / 2;
+    if (a < {n}) {{
+"""
+
+def make_source(depth: int) -> str:
+    body = "".join(LEVEL.format(n=n) for n in range(depth))
+    return "int main(void) {\n    int a = 1;\n    int b = 2;\n" + body + "    a = a + 1;\n" + "    }\n" * depth + "    return a;\n}\n"
+
+def run(depth: int) -> tuple:
+    context = CompilationContext()
+    ast = Fold(Parser(Lexer(make_source(depth), context=context).tokenise_buffer(), context=context).parse_program(), context=context).start_fold()
+    with open(os.devnull, "w") as out:
+        start = time.perf_counter()
+        CodeGenerator(ast, context=context).generate_program(out)
+        elapsed = time.perf_counter() - start
+    return depth * 5, elapsed
+
+def main():
+    depth = int(sys.argv[1]) if len(sys.argv) > 1 else 160
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), depth * 10))
+    per_statement = []
+    for d in (depth // 8, depth // 4, depth // 2, depth):
+        statements, elapsed = min((run(d) for _ in range(3)), key=lambda r: r[1])
+        per_statement.append(elapsed / statements)
+        print(f"depth {d:>4}, {statements:>5} statements: {elapsed * 1e3:7.2f}ms ({elapsed / statements * 1e6:.2f}us each)")
+    print(f"time per statement grew {per_statement[-1] / per_statement[0]:.2f}x from depth {depth // 8} to {depth} (1.00x is linear)")
+
+if __name__ == "__main__":
+    main()
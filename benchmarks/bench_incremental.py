@@ -0,0 +1,32 @@
+"""
+Times regenerating the assembly of a large file after one of its functions changed, with and without the function cache.
+Run from the repo root with: python3 -m benchmarks.bench_incremental [functions]
+The front end still lexes, parses and folds every function, code generation only runs for the changed one,
+so the saving is the share of the time code generation took.
+"""
+import io
+import sys
+import time
+from core.compile import emit_assembly
+from core.util.cache import FunctionCache
+from benchmarks.bench_pipeline_memory import make_source
+
+def timed(text: str, functions=None) -> tuple:
+    out = io.StringIO()
+    start = time.perf_counter()
+    emit_assembly(text, out, functions)
+    return time.perf_counter() - start, out.getvalue()
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    text = make_source(count)
+    changed = text.replace("return total + 7;", "return total + 8;")
+    functions = FunctionCache()
+    timed(text, functions)
+    full, expected = min(timed(changed) for _ in range(3))
+    incremental, assembly = min(timed(changed, functions) for _ in range(3))
+    assert assembly == expected
+    print(f"{count} functions, one changed: full {full * 1e3:8.2f}ms, incremental {incremental * 1e3:8.2f}ms ({full / incremental:.2f}x faster), {functions.report()}")
+
+if __name__ == "__main__":
+    main()
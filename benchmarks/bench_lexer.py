@@ -0,0 +1,45 @@
+"""
+Compares the throughput of the two lexer engines.
+Run from the repo root with: python3 -m benchmarks.bench_lexer [copies]
+The input is every file in src/ glued together and repeated, so it looks like real code, then the same
+with a string literal in front of every return, which the regex engine lexes without leaving its fast path.
+Both engines lex into a TokenBuffer, the form the compiler reads its tokens in. They take turns and the
+best CPU time of a few runs is kept, so a busy machine does not decide the result.
+"""
+import glob
+import sys
+import time
+from core.lexer import Lexer, ENGINES
+from core.util.context import CompilationContext
+
+def make_source(copies: int) -> str:
+    files = sorted(glob.glob("src/*.c"))
+    unit = "\n".join(open(f).read() for f in files) + "\n"
+    return unit * copies
+
+def run(text: str, engine: str) -> tuple:
+    start = time.process_time()
+    count = len(Lexer(text, engine, context=CompilationContext()).tokenise_buffer())
+    return count, time.process_time() - start
+
+def compare(name: str, text: str):
+    runs = {engine: [] for engine in ENGINES}
+    for _ in range(5):
+        for engine in ENGINES:
+            runs[engine].append(run(text, engine))
+    print(f"{name}: {len(text) / 1e6:.2f} MB")
+    rates = {}
+    for engine in ENGINES:
+        count, elapsed = min(runs[engine], key=lambda r: r[1])
+        rates[engine] = count / elapsed
+        print(f"{engine:>6}: {count} tokens in {elapsed:.3f}s ({rates[engine]:,.0f} tokens/s)")
+    print(f"regex/scan speedup: {rates['regex'] / rates['scan']:.1f}x")
+
+def main():
+    copies = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    text = make_source(copies)
+    compare("Input", text)
+    compare("With strings", text.replace("return", 'puts("done"); return'))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Compares the memory taken by an AST of slots nodes against the same tree built from plain dataclasses.
+Run from the repo root with: python3 -m benchmarks.bench_node_memory [statements]
+The parsed tree is copied once into the node classes and once into dataclasses with the same fields
+but a per instance __dict__, and tracemalloc records the peak of building each copy.
+"""
+import dataclasses
+import sys
+import tracemalloc
+from core.lexer import Lexer
+from core.parser import Parser
+from core.data import nodes
+from core.util.context import CompilationContext
+
+STATEMENT = "a = a + b * {n} - (c / 3);\nif (a > b) b = b + 1;\n"
+
+def make_source(statements: int) -> str:
+    body = "".join(STATEMENT.format(n=n) for n in range(statements // 2))
+    return "int main(void) {\n int a = 1;\n int b = 2;\n int c = 3;\n" + body + " return a;\n}\n"
+
+# Dataclasses with the same fields as each node class, laid out the way the nodes were before slots
+def dict_classes() -> dict:
+    classes = {}
+    for cls in vars(nodes).values():
+        if isinstance(cls, type) and dataclasses.is_dataclass(cls):
+            fields = [(f.name, f.type) for f in dataclasses.fields(cls)]
+            classes[cls] = dataclasses.make_dataclass(cls.__name__, fields)
+    return classes
+
+def copy(node, classes: dict):
+    if isinstance(node, list):
+        return [copy(item, classes) for item in node]
+    if not dataclasses.is_dataclass(node):
+        return node
+    values = {f.name: copy(getattr(node, f.name), classes) for f in dataclasses.fields(node)}
+    return classes[type(node)](**values)
+
+def peak(tree, classes: dict) -> int:
+    tracemalloc.start()
+    built = copy(tree, classes)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+def main():
+    statements = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    context = CompilationContext()
+    tree = Parser(Lexer(make_source(statements), context=context).tokenise_buffer(), context=context).parse_program()
+    slots = peak(tree, {cls: cls for cls in dict_classes()})
+    plain = peak(tree, dict_classes())
+    print(f"{statements} statements: plain dataclasses {plain / 1e6:7.2f} MB, slots {slots / 1e6:7.2f} MB ({plain / slots:.2f}x less)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""
+Times generating one large file's functions in worker processes against generating them in turn.
+Run from the repo root with: python3 -m benchmarks.bench_parallel_codegen [functions]
+On Linux, run from the main thread, the workers are forked and inherit the functions, anywhere else
+they are spawned and sent the functions packed into arenas, see codegen.start_method. Only the
+assembly comes back, so the gain is the share of the time code generation took, less that traffic
+and the pool's start up, which spawning makes far larger.
+The output is checked to be the same at every number of jobs.
+"""
+import os
+import sys
+import time
+from core.lexer import Lexer
+from core.parser import Parser
+from core.fold import Fold
+from core.codegen import CodeGenerator
+from core.util.context import CompilationContext
+from benchmarks.bench_pipeline_memory import make_source
+
+def timed(text: str, jobs: int) -> tuple:
+    context = CompilationContext()
+    ast = Fold(Parser(Lexer(text, context=context).tokenise_buffer(), context=context).parse_program(), context=context).start_fold()
+    start = time.perf_counter()
+    assembly = CodeGenerator(ast, context=context).generate_program(jobs=jobs)
+    return time.perf_counter() - start, assembly
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    text = make_source(count)
+    cpus = os.cpu_count() or 1
+    serial, expected = min(timed(text, 1) for _ in range(3))
+    print(f"{count} functions, 1 job: {serial * 1e3:8.2f}ms")
+    for jobs in sorted({2, 4, cpus} - {1}):
+        elapsed, assembly = min(timed(text, jobs) for _ in range(3))
+        assert assembly == expected
+        print(f"{count} functions, {jobs} jobs: {elapsed * 1e3:8.2f}ms ({serial / elapsed:.2f}x)")
+    print(f"{cpus} CPUs")
+
+if __name__ == "__main__":
+    main()
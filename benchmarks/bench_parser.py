@@ -0,0 +1,40 @@
+"""
+Times the parser on expression heavy code.
+Run from the repo root with: python3 -m benchmarks.bench_parser [statements]
+Each statement mixes every binary operator level with literals, variables and parentheses,
+so most of the time is spent in the expression parser rather than in statements.
+"""
+import sys
+import time
+from core.lexer import Lexer
+from core.parser import Parser
+from core.util.context import CompilationContext
+
+EXPRESSIONS = (
+    "a + b * c - (d / 2) % 7",
+    "a << 2 | b & c ^ d >> 1",
+    "a < b && c >= d || a != 3 == (b <= c)",
+    "-a + ~b * !c - (a ? b : c)",
+    "((a + 1) * (b - 2)) / ((c + 3) % (d + 4))",
+)
+
+def make_source(statements: int) -> str:
+    body = ["int a = 1;", "int b = 2;", "int c = 3;", "int d = 4;"]
+    for i in range(statements):
+        body.append(f"a += {EXPRESSIONS[i % len(EXPRESSIONS)]};")
+    body.append("return a;")
+    return "int main(void) {\n    " + "\n    ".join(body) + "\n}\n"
+
+def run(tokens) -> float:
+    start = time.perf_counter()
+    Parser(tokens, context=CompilationContext()).parse_program()
+    return time.perf_counter() - start
+
+def main():
+    statements = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    tokens = Lexer(make_source(statements), context=CompilationContext()).tokenise_buffer()
+    elapsed = min(run(tokens) for _ in range(3))
+    print(f"{statements} statements, {len(tokens)} tokens in {elapsed:.3f}s ({len(tokens) / elapsed:,.0f} tokens/s)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Parses pathologically deep programs with the stack mode parser and checks the time grows linearly.
+Run from the repo root with: python3 -m benchmarks.bench_parser_depth [depth]
+The recursive mode overflows the interpreter stack long before these sizes, so it is only
+timed on the flat expression, which it can still parse.
+"""
+import sys
+import time
+from core.lexer import Lexer
+from core.parser import Parser
+from core.util.context import CompilationContext
+
+# if (x == 0) return 0; else if (x == 1) return 1; ... nested once per else
+def else_if_chain(depth: int) -> str:
+    ladder = " else ".join(f"if (x == {i}) return {i};" for i in range(depth))
+    return f"int main(void) {{ int x = 7; {ladder} return x; }}"
+
+# x + 1 * x - 2 ... with every binary operator level, flat but long
+def long_expression(terms: int) -> str:
+    ops = ("+", "*", "-", "<<", "|", "&", "^", "==", "<", "&&", "||", "/", "%")
+    exp = " ".join(f"{'x' if i % 2 else i + 1} {ops[i % len(ops)]}" for i in range(terms - 1)) + " x"
+    return f"int main(void) {{ int x = 7; return {exp}; }}"
+
+# (1 + (1 + (1 + ... x))), every term opens another parenthesis
+def nested_expression(terms: int) -> str:
+    exp = "(1 + " * (terms - 1) + "x" + ")" * (terms - 1)
+    return f"int main(void) {{ int x = 7; return {exp}; }}"
+
+def run(text: str, mode: str) -> float:
+    tokens = Lexer(text, context=CompilationContext()).tokenise_buffer()
+    start = time.perf_counter()
+    try:
+        Parser(tokens, mode=mode, context=CompilationContext()).parse_program()
+    except RecursionError:
+        return None
+    return time.perf_counter() - start
+
+def main():
+    depth = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    cases = (
+        ("else if chain", else_if_chain, depth),
+        ("long expression", long_expression, depth // 2),
+        ("nested expression", nested_expression, depth // 2),
+    )
+    for name, make, size in cases:
+        print(name)
+        per_item = []
+        for n in (size // 4, size // 2, size):
+            elapsed = run(make(n), "stack")
+            per_item.append(elapsed / n)
+            print(f"  stack     {n:>7}: {elapsed:.3f}s ({elapsed / n * 1e6:.2f}us each)")
+        print(f"  growth from {size // 4} to {size}: {per_item[-1] / per_item[0]:.2f}x per item (1.00x is linear)")
+        elapsed = run(make(size), "recursive")
+        result = "RecursionError" if elapsed is None else f"{elapsed:.3f}s"
+        print(f"  recursive {size:>7}: {result}")
+
+if __name__ == "__main__":
+    main()
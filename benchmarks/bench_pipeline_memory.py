@@ -0,0 +1,56 @@
+"""
+Compares peak memory of compiling a whole translation unit at once against the per function pipeline.
+Run from the repo root with: python3 -m benchmarks.bench_pipeline_memory [functions]
+The streamed peak should stay flat as the number of functions grows, the whole unit peak grows with it.
+"""
+import os
+import sys
+import tracemalloc
+from core.lexer import Lexer
+from core.parser import Parser
+from core.fold import Fold
+from core.codegen import CodeGenerator
+from core.util.context import CompilationContext
+from core.compile import emit_assembly
+
+FUNCTION = """
+int f{n}(int a, int b) {{
+    int total = 0;
+    for (int i = 0; i < a; i++) {{
+        int step = i * b + 3 - (a / 2) % 7;
+        if (step > 10 && b != 0) total += step; else total -= 1;
+        while (total > 1000) total = total / 2;
+    }}
+    return total + {n};
+}}
+"""
+
+def make_source(functions: int) -> str:
+    return "".join(FUNCTION.format(n=n) for n in range(functions)) + "int main(void) { return f0(3, 4); }\n"
+
+def whole_unit(text: str):
+    context = CompilationContext()
+    ast = Parser(Lexer(text, context=context).tokenise_buffer(), context=context).parse_program()
+    with open(os.devnull, "w") as out:
+        out.write(CodeGenerator(Fold(ast, context=context).start_fold(), context=context).generate_program())
+
+def streamed(text: str):
+    with open(os.devnull, "w") as out:
+        emit_assembly(text, out)
+
+def peak(compile, text: str) -> int:
+    tracemalloc.start()
+    compile(text)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+def main():
+    functions = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    for n in (functions // 4, functions):
+        text = make_source(n)
+        whole, stream = peak(whole_unit, text), peak(streamed, text)
+        print(f"{n:>6} functions: whole unit {whole / 1e6:7.2f} MB, streamed {stream / 1e6:6.2f} MB ({whole / stream:.1f}x less)")
+
+if __name__ == "__main__":
+    main()
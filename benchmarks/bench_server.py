@@ -0,0 +1,53 @@
+"""
+Times compiling a small file from a fresh interpreter, once by importing the compiler and once by asking
+a running compile server, which is what every client.py call does.
+Run from the repo root with: python3 -m benchmarks.bench_server [runs]
+Small files are where a build farm spends its time on start up, so the gap is mostly the import of core.
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from core.server import CompileServer
+
+SOURCE = "int g = 3;\nint f(int a) { return a * g; }\nint main(void) { return f(2); }\n"
+
+DIRECT = (
+    "import io, sys\n"
+    "from core.compile import emit_assembly\n"
+    "emit_assembly(open(sys.argv[1]).read(), io.StringIO())\n"
+)
+CLIENT = (
+    "import sys\n"
+    "from core.util.protocol import request\n"
+    "assert request(open(sys.argv[1]).read(), path=sys.argv[2])['assembly']\n"
+)
+
+def timed(script: str, *args) -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", script, *args], check=True, cwd=os.getcwd())
+    return time.perf_counter() - start
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    with tempfile.TemporaryDirectory() as root:
+        path = os.path.join(root, "unit.c")
+        with open(path, "w") as file:
+            file.write(SOURCE)
+        server = CompileServer(os.path.join(root, "compile.sock"))
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        try:
+            direct = sorted(timed(DIRECT, path) for _ in range(runs))[runs // 2]
+            client = sorted(timed(CLIENT, path, server.path) for _ in range(runs))[runs // 2]
+        finally:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+    print(f"importing the compiler: {direct * 1e3:7.2f}ms per file (median of {runs})")
+    print(f"asking the server:      {client * 1e3:7.2f}ms per file ({direct / client:.2f}x faster)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+"""
+Times compiling a large file without stats and with them, and how many events the stats counted.
+Run from the repo root with: python3 -m benchmarks.bench_stats [functions]
+Without stats the parser and code generator keep their own hot paths, so the time without stats is
+the time the compiler took before stats existed. Runs alternate so drift hits both the same.
+"""
+import io
+import sys
+import time
+from core.compile import emit_assembly
+from core.util.context import CompilationContext
+from core.util.stats import Stats
+from benchmarks.bench_pipeline_memory import make_source
+
+def timed(text: str, stats=None) -> float:
+    start = time.perf_counter()
+    emit_assembly(text, io.StringIO(), context=CompilationContext(stats=stats))
+    return time.perf_counter() - start
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    text = make_source(count)
+    plain, counted = [], []
+    for _ in range(5):
+        plain.append(timed(text))
+        counted.append(timed(text, Stats()))
+    stats = Stats()
+    timed(text, stats)
+    events = sum(sum(counts.values()) for counts in stats.to_dict().values())
+    off, on = sorted(plain)[2], sorted(counted)[2]
+    print(f"{count} functions: without stats {off * 1e3:8.2f}ms, with {on * 1e3:8.2f}ms ({on / off - 1:+.1%}), {events} counted")
+
+if __name__ == "__main__":
+    main()
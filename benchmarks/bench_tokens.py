@@ -0,0 +1,39 @@
+"""
+Compares how much memory the token stream takes as a list of Token objects
+against the packed TokenBuffer.
+Run from the repo root with: python3 -m benchmarks.bench_tokens [copies]
+"""
+import sys
+import time
+import tracemalloc
+from core.lexer import Lexer
+from core.util.context import CompilationContext
+from benchmarks.bench_lexer import make_source
+
+def measure(build) -> tuple:
+    tracemalloc.start()
+    start = time.perf_counter()
+    tokens = build()
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return len(tokens), current, peak, elapsed
+
+def main():
+    copies = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    text = make_source(copies)
+    print(f"Input: {len(text) / 1e6:.2f} MB")
+    results = {
+        "list[Token]": measure(lambda: Lexer(text, context=CompilationContext()).tokenise()),
+        "TokenBuffer": measure(lambda: Lexer(text, context=CompilationContext()).tokenise_buffer()),
+    }
+    for name, (count, current, peak, elapsed) in results.items():
+        print(
+            f"{name:>12}: {count} tokens, {current / 1e6:.1f} MB retained, "
+            f"{peak / 1e6:.1f} MB peak, {current / count:.1f} bytes/token ({elapsed:.2f}s traced)"
+        )
+    ratio = results["list[Token]"][1] / results["TokenBuffer"][1]
+    print(f"TokenBuffer uses {ratio:.1f}x less memory")
+
+if __name__ == "__main__":
+    main()
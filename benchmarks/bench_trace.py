@@ -0,0 +1,33 @@
+"""
+Times compiling a large file without a tracer and with one, and how many events the trace holds.
+Run from the repo root with: python3 -m benchmarks.bench_trace [functions]
+Without a tracer a pass only checks that the context has none once per function, so the untraced time is
+the time the compiler took before tracing existed. Runs alternate so drift hits both the same.
+"""
+import io
+import sys
+import time
+from core.compile import emit_assembly
+from core.util.context import CompilationContext
+from core.util.trace import Tracer
+from benchmarks.bench_pipeline_memory import make_source
+
+def timed(text: str, tracer=None) -> float:
+    start = time.perf_counter()
+    emit_assembly(text, io.StringIO(), context=CompilationContext(tracer))
+    return time.perf_counter() - start
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    text = make_source(count)
+    untraced, traced = [], []
+    for _ in range(5):
+        untraced.append(timed(text))
+        traced.append(timed(text, Tracer()))
+    tracer = Tracer()
+    timed(text, tracer)
+    off, on = sorted(untraced)[2], sorted(traced)[2]
+    print(f"{count} functions: untraced {off * 1e3:8.2f}ms, traced {on * 1e3:8.2f}ms ({on / off - 1:+.1%}), {len(tracer.events)} events")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Times dispatching over every node of a large AST with a chain of isinstance checks against the Visitor.
+Run from the repo root with: python3 -m benchmarks.bench_visitor [statements]
+Both walkers do the same work, counting nodes, so the difference is the cost of finding the method.
+The chain tests node types in the order the passes used to, where the most common nodes, variables and
+literals, came near the end, so they paid for every check above them.
+"""
+import sys
+import time
+from core.lexer import Lexer
+from core.parser import Parser
+from core.data.nodes import *
+from core.util.context import CompilationContext
+
+STATEMENT = "a = (a + b * {n} - c / 3) % 7 + (b << 2 | c & 5) ^ (a < b == c >= {n});\n"
+
+def make_source(statements: int) -> str:
+    body = "".join(STATEMENT.format(n=n) for n in range(statements))
+    return "int main(void) {\n int a = 1;\n int b = 2;\n int c = 3;\n" + body + " return a;\n}\n"
+
+# The isinstance chain, in the order generate_statement and generate_exp tested types
+def chain_count(node) -> int:
+    if isinstance(node, Return):
+        return 1 + chain_count(node.exp)
+    elif isinstance(node, If) or isinstance(node, For) or isinstance(node, While) or isinstance(node, DoWhile):
+        raise TypeError("not generated")
+    elif isinstance(node, Break) or isinstance(node, Continue):
+        return 1
+    elif isinstance(node, ExpStatement):
+        return 1 + (chain_count(node.exp) if node.exp else 0)
+    elif isinstance(node, Declare):
+        return 1 + (chain_count(node.exp) if node.exp else 0)
+    elif isinstance(node, Block):
+        return 1 + sum(chain_count(item) for item in node.block_items)
+    elif isinstance(node, CommaExp):
+        return 1 + chain_count(node.lhs) + chain_count(node.rhs)
+    elif isinstance(node, Assign):
+        return 1 + chain_count(node.exp)
+    elif isinstance(node, Conditional):
+        return 1 + chain_count(node.condition) + chain_count(node.if_statement) + chain_count(node.else_statement)
+    elif (
+        isinstance(node, OR) or isinstance(node, AND) or isinstance(node, Equality) or isinstance(node, Inequality)
+        or isinstance(node, BitOR) or isinstance(node, BitXOR) or isinstance(node, BitAND)
+    ):
+        return 1 + chain_count(node.operand1) + chain_count(node.operand2)
+    elif isinstance(node, BitShift):
+        return 1 + chain_count(node.value) + chain_count(node.shift)
+    elif isinstance(node, AddSub) or isinstance(node, MultDivMod):
+        return 1 + chain_count(node.operand1) + chain_count(node.operand2)
+    elif isinstance(node, Decrement) or isinstance(node, Increment):
+        return 1
+    elif isinstance(node, UnOp):
+        return 1 + chain_count(node.operand)
+    elif isinstance(node, IntLiteral):
+        return 1
+    elif isinstance(node, Var):
+        return 1
+    elif isinstance(node, Parenthesis):
+        return 1 + chain_count(node.exp)
+    elif isinstance(node, FunctionCall):
+        return 1 + sum(chain_count(param) for param in node.param)
+
+class Counter(Visitor):
+    @visits(Return, Assign, Parenthesis)
+    def count_exp(self, node) -> int:
+        return 1 + self.visit(node.exp)
+
+    @visits(ExpStatement, Declare)
+    def count_optional(self, node) -> int:
+        return 1 + (self.visit(node.exp) if node.exp else 0)
+
+    @visits(Block)
+    def count_block(self, node) -> int:
+        return 1 + sum(self.visit(item) for item in node.block_items)
+
+    @visits(OR, AND, Equality, Inequality, BitOR, BitXOR, BitAND, AddSub, MultDivMod)
+    def count_binary(self, node) -> int:
+        return 1 + self.visit(node.operand1) + self.visit(node.operand2)
+
+    @visits(BitShift)
+    def count_shift(self, node) -> int:
+        return 1 + self.visit(node.value) + self.visit(node.shift)
+
+    @visits(IntLiteral, Var, Break, Continue, Increment, Decrement)
+    def count_leaf(self, node) -> int:
+        return 1
+
+def best(count, root) -> tuple:
+    times = []
+    for _ in range(5):
+        start = time.perf_counter()
+        nodes = count(root)
+        times.append(time.perf_counter() - start)
+    return nodes, min(times)
+
+def main():
+    statements = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    context = CompilationContext()
+    body = Parser(Lexer(make_source(statements), context=context).tokenise_buffer(), context=context).parse_program().funcs[0].body
+    nodes, chain = best(chain_count, body)
+    visited, visitor = best(Counter().visit, body)
+    assert nodes == visited
+    print(f"{nodes} nodes: isinstance chain {chain * 1e3:7.2f}ms, visitor {visitor * 1e3:7.2f}ms ({chain / visitor:.2f}x faster)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+# Drop in replacement for main.py that has the compile server (python3 main.py --serve) do the compiling,
+# so it does not pay for importing the compiler. The assembly it gets back is linked and run as main.py does.
+# Without a server listening, or with anything but a single file, it runs main.py instead.
+# The server's socket is taken from COMPILE_SERVER, by default c-compiler.sock in $XDG_RUNTIME_DIR or in
+# c-compiler-<uid> under the temp dir. A socket that belongs to another user is never used.
+import os
+import subprocess
+import sys
+import tempfile
+from core.util.protocol import request
+
+def run_main():
+    import main
+    main.main()
+
+def main():
+    if len(sys.argv) != 2 or sys.argv[1].startswith("-"):
+        return run_main()
+
+    path = sys.argv[1]
+    if not os.path.exists(path):
+        print(f"Error: File '{path}' not found")
+        sys.exit(1)
+
+    with open(path, "r") as file:
+        text = file.read()
+
+    try:
+        response = request(text)
+    except (FileNotFoundError, ConnectionRefusedError):
+        return run_main()
+    except PermissionError as e:
+        print(f"Warning: not using the compile server, {e}", file=sys.stderr)
+        return run_main()
+
+    if response["stopped"]:
+        print(f"Compilation stopped at {response['stopped']}")
+        for diagnostic in response["diagnostics"]:
+            print(f"{diagnostic['type']}: {diagnostic['message']} on line {diagnostic['line']}")
+        sys.exit(1)
+
+    with tempfile.TemporaryDirectory(prefix="compile-") as directory:
+        with open(os.path.join(directory, "main.s"), "w") as file:
+            file.write(response["assembly"])
+        link = subprocess.run(["clang", "main.s", "-o", "main"], cwd=directory)
+        if link.returncode != 0 or not os.path.exists(os.path.join(directory, "main")):
+            print(f"clang exited with: {link.returncode}")
+            sys.exit(1)
+        result = subprocess.run(["./main"], cwd=directory)
+
+    print(f"Program exited with: {result.returncode}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Compiles many translation units at once, one per worker process.
+Every worker imports the compiler with its first file and then takes files until there are none left,
+so the import is paid once per worker rather than once per file. Each file is a compilation of its own,
+with its own CompilationContext, and its assembly is written next to it (or into out_dir) as <name>.s.
+Results come back in the order the files were given, whatever order the workers finish them in.
+With stats every file is counted on its own and its Stats come back with its result, to be added up,
+and so do its PassTimer when the batch is timed and its Tracer when it is traced.
+"""
+import io
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Optional
+from core.compile import emit_assembly
+from core.util.context import CompilationContext
+from core.util.error import ErrorManager
+from core.util.stats import Stats
+from core.util.timing import PassTimer
+from core.util.trace import Tracer
+from core.util.cache import CompileCache, FunctionCache
+
+@dataclass(slots=True)
+class BatchResult:
+    path: str
+    output: Optional[str]     # The .s file written, None if the file did not compile
+    error: Optional[str]      # What stopped the compilation
+    seconds: float
+    stats: Optional[Stats] = None  # What compiling the file counted, with stats and unless it was cached
+    timer: Optional[PassTimer] = None  # How long its passes took, when timed and unless it was cached
+    tracer: Optional[Tracer] = None    # Its trace, when traced and unless it was cached
+
+def output_path(path: str, out_dir: Optional[str]) -> str:
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(out_dir if out_dir else os.path.dirname(path), stem + ".s")
+
+# Runs in a worker. The assembly is built in memory and only written once the whole file compiled,
+# so a failed file leaves nothing behind. Whatever goes wrong with one file is that file's error, the
+# rest of the batch carries on.
+def compile_file(path: str, out_dir: Optional[str] = None, cache_dir: Optional[str] = None, stats: bool = False,
+                 timed: bool = False, traced: bool = False, parse_mode: str = "recursive") -> BatchResult:
+    start = time.perf_counter()
+    output = output_path(path, out_dir)
+    counted, timer, tracer = None, None, None
+    try:
+        with open(path) as file:
+            text = file.read()
+        cache = CompileCache(cache_dir) if cache_dir else None
+        key = cache.key(text, "s") if cache else None
+        if not (cache and cache.fetch(key, output)):
+            out = io.StringIO()
+            counted = Stats() if stats else None
+            timer = PassTimer() if timed else None
+            tracer = Tracer() if traced else None
+            context = CompilationContext(tracer, counted)
+            emit_assembly(text, out, FunctionCache(cache) if cache else None, context, timer, mode=parse_mode)
+            with open(output, "w") as file:
+                file.write(out.getvalue())
+            if cache:
+                cache.store(key, output)
+    except (ErrorManager.Stop, OSError) as e:
+        return BatchResult(path, None, str(e), time.perf_counter() - start, counted, timer, tracer)
+    except Exception as e:
+        return BatchResult(path, None, f"Internal compiler error: {e!r}", time.perf_counter() - start, counted, timer, tracer)
+    return BatchResult(path, output, None, time.perf_counter() - start, counted, timer, tracer)
+
+# jobs defaults to the number of CPUs, with one job everything runs in this process
+def compile_many(paths: list, jobs: Optional[int] = None, out_dir: Optional[str] = None, cache_dir: Optional[str] = None,
+                 stats: bool = False, timed: bool = False, traced: bool = False, parse_mode: str = "recursive") -> list:
+    jobs = jobs or os.cpu_count() or 1
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    if jobs == 1 or len(paths) < 2:
+        return [compile_file(path, out_dir, cache_dir, stats, timed, traced, parse_mode) for path in paths]
+    # Small chunks keep the workers evenly loaded when file sizes differ
+    chunksize = max(1, len(paths) // (jobs * 8))
+    with ProcessPoolExecutor(jobs) as pool:
+        return list(pool.map(
+            compile_file, paths, [out_dir] * len(paths), [cache_dir] * len(paths), [stats] * len(paths),
+            [timed] * len(paths), [traced] * len(paths), [parse_mode] * len(paths), chunksize=chunksize
+        ))
@@ -0,0 +1,99 @@
+"""
+Builds and runs many files, overlapping the compiler with clang.
+compile() waits for clang and then for the program before it starts on anything else, so Python sits idle
+while they run and they sit idle while Python compiles. Here files are compiled to assembly one after another
+on a thread of this process and as soon as a file's assembly is written its clang and program are started
+with asyncio, so they run while the next file is compiled. At most max_procs of them run at a time.
+Every file is built in a temporary directory of its own, removed when it is done, so no two builds ever
+share a main.s or main.
+"""
+import asyncio
+import io
+import os
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Optional
+from core.compile import emit_assembly
+from core.util.error import ErrorManager
+from core.util.cache import CompileCache
+
+@dataclass(slots=True)
+class BuildResult:
+    path: str
+    returncode: Optional[int]   # What the program exited with, None if it was not run
+    error: Optional[str]        # Why the file did not build or run
+
+async def build(paths: list, max_procs: Optional[int] = None, run: bool = True, cache: Optional[CompileCache] = None,
+                parse_mode: str = "recursive") -> list:
+    procs = asyncio.Semaphore(max_procs or os.cpu_count() or 1)
+    loop = asyncio.get_running_loop()
+    # Files are compiled on a thread, one at a time, so the loop is free to start and reap subprocesses meanwhile
+    compiler = ThreadPoolExecutor(1)
+    tasks = []
+    try:
+        for path in paths:
+            # Once its task is made finish removes the directory, until then it is removed here if anything fails
+            directory = tempfile.mkdtemp(prefix="build-")
+            try:
+                error, key = None, None
+                try:
+                    with open(path) as file:
+                        text = file.read()
+                except OSError as e:
+                    error = str(e)
+                else:
+                    key = cache.key(text, "exe") if cache else None
+                    if not (cache and cache.fetch(key, os.path.join(directory, "main"))):
+                        error = await loop.run_in_executor(compiler, compile_to, text, directory, parse_mode)
+            except BaseException:
+                shutil.rmtree(directory, ignore_errors=True)
+                raise
+            tasks.append(asyncio.create_task(finish(path, directory, error, procs, run, cache, key)))
+    finally:
+        compiler.shutdown()
+    return await asyncio.gather(*tasks)
+
+def build_many(paths: list, max_procs: Optional[int] = None, run: bool = True, cache: Optional[CompileCache] = None,
+               parse_mode: str = "recursive") -> list:
+    return asyncio.run(build(paths, max_procs, run, cache, parse_mode))
+
+# Writes the assembly to main.s in directory, returns the error that stopped it if any. Whatever goes wrong
+# compiling one file is that file's error, the rest of the build carries on
+def compile_to(text: str, directory: str, parse_mode: str = "recursive") -> Optional[str]:
+    out = io.StringIO()
+    try:
+        emit_assembly(text, out, mode=parse_mode)
+    except ErrorManager.Stop as e:
+        return str(e)
+    except Exception as e:
+        return f"Internal compiler error: {e!r}"
+    with open(os.path.join(directory, "main.s"), "w") as file:
+        file.write(out.getvalue())
+    return None
+
+async def finish(path: str, directory: str, error: Optional[str], procs: asyncio.Semaphore, run: bool,
+                 cache: Optional[CompileCache], key: Optional[str]) -> BuildResult:
+    try:
+        if error:
+            return BuildResult(path, None, error)
+        main = os.path.join(directory, "main")
+        if not os.path.exists(main):
+            returncode = await execute(procs, directory, "clang", "main.s", "-o", "main")
+            if returncode != 0 or not os.path.exists(main):
+                return BuildResult(path, None, f"clang exited with {returncode}")
+            if cache:
+                cache.store(key, main)
+        if not run:
+            return BuildResult(path, None, None)
+        return BuildResult(path, await execute(procs, directory, main), None)
+    except OSError as e:    # No clang, or a program that cannot be run
+        return BuildResult(path, None, str(e))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+async def execute(procs: asyncio.Semaphore, directory: str, *command: str) -> int:
+    async with procs:
+        process = await asyncio.create_subprocess_exec(*command, cwd=directory)
+        return await process.wait()
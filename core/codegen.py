@@ -3,17 +3,26 @@ from core.data.token_types import*
 from core.data.nodes import *
 from core.util.symbol_table import *
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 import math
-from core.util.error import error
+import multiprocessing
+import sys
+import threading
+from core.util.error import ErrorManager
+from core.util.context import CompilationContext
+from core.data.arena import Arena
 
-# Generates unique labels for jumps
+# Generates unique labels for jumps. Every function numbers its own labels and puts its name in front,
+# with a dot that cannot appear in a C name, so the labels of a function do not depend on any other
+# and never clash with them.
 class LabelGen:
-    count = defaultdict(int)
+    def __init__(self, function: str):
+        self.function = function
+        self.count = defaultdict(int)
 
-    @classmethod
-    def generate(cls, name):
-        cls.count[name] += 1
-        return f"{name}{cls.count[name]}"
+    def generate(self, name):
+        self.count[name] += 1
+        return f"{self.function}.{name}{self.count[name]}"
 
 sizeof = {
     TokenType.INT: 8,
@@ -22,7 +31,8 @@ sizeof = {
 }
 
 class Memory:
-    def __init__(self):
+    def __init__(self, error: ErrorManager):
+        self.error = error
         self.memory = 0
         self.offset = 0
     
@@ -37,8 +47,8 @@ class Memory:
     
     def assign_memory(self, id: str, table: dict, line: int) -> int:
         if self.memory == 0:
-            error.report(error_msg="Error assigning memory, no available space", line=line, type="MemoryError")
-            error.display("Code Generation")
+            self.error.report(error_msg="Error assigning memory, no available space", line=line, type="MemoryError")
+            self.error.display("Code generation")
         
         _type = table[id].type
         mem = sizeof[_type]
@@ -48,22 +58,67 @@ class Memory:
         entry.offset = self.offset
         return self.offset
 # TODO: write support for storing in different sizes
-class CodeGenerator:
-    def __init__(self, root: Program):
+# Assembly is appended to one shared buffer as it is generated instead of being returned and
+# concatenated at every level. With an out sink the buffer is written out every FLUSH_EVERY pieces,
+# without one the whole output is joined once at the end.
+# Methods for nodes with children are generators that yield each child to be generated, see Visitor,
+# so deeply nested expressions and long else if chains never run out of Python stack.
+FLUSH_EVERY = 4096
+
+class CodeGenerator(Visitor):
+    # functions caches the assembly of each function by its key, see generate_function
+    def __init__(self, root: Program = None, out=None, functions=None, *, context: CompilationContext):
         self.root = root
-        self.memory = Memory()
-        self.table_stack = []
+        self.out = out
+        self.buffer = []
+        self.context = context
+        self.error = self.context.error
+        self.global_table = self.context.global_table
+        self.memory = Memory(self.error)
+        self.scopes = ScopedSymbolTable()
+        self.functions = functions
+        # State for generating one top level item at a time
+        self.section = None
+        self.initialised = set()
+        self.uninitialised = {}
+        if self.context.stats:
+            self.count_hot_paths()
+
+    # With stats, symbol lookups are counted the way the parser counts them, see Parser.count_hot_paths
+    def count_hot_paths(self):
+        lookups = self.context.stats.lookups
+        self.scopes = CountingScopedSymbolTable(lookups)
+        search_blocks = self.search_blocks
+
+        def counted_search_blocks(id: str, line: int = None):
+            lookups["search_blocks"] += 1
+            return search_blocks(id, line)
+
+        self.search_blocks = counted_search_blocks
+
+    def emit(self, assembly: str):
+        self.buffer.append(assembly)
+        if self.out is not None and len(self.buffer) >= FLUSH_EVERY:
+            self.flush()
+
+    def flush(self):
+        self.out.write("".join(self.buffer))
+        self.buffer.clear()
+
+    # Returns everything emitted since the last take, for generating without a sink
+    def take(self) -> str:
+        assembly = "".join(self.buffer)
+        self.buffer.clear()
+        return assembly
 
     def search_blocks(self, id: str, line: int = None):
-        for i in range(-1, -len(self.table_stack) - 1, -1):
-            symbol = self.table_stack[i]
-            if id in symbol.table:
-                if not line:    # For break, continue labels
-                    return symbol.get(id)
-                elif line >= symbol.table[id].line:
-                    return (symbol.get(id), False)  # False for local
-            if id in global_table and isinstance(global_table[id], SymbolEntry):
-                return (global_table[id], True)   # True for global
+        entry = self.scopes.get(id, line)
+        if not line:    # For break, continue labels
+            return entry
+        elif entry:
+            return (entry, False)  # False for local
+        if id in self.global_table and isinstance(self.global_table[id], SymbolEntry):
+            return (self.global_table[id], True)   # True for global
         return None
 
     def padding(self, args) -> int:
@@ -71,569 +126,636 @@ class CodeGenerator:
             return 8
         else:
             return 0
-            
-    def generate_program(self) -> str:
-        assembly = ""
+
+    # Writes the program to out if there is one, otherwise returns it.
+    # With more than one job the functions are generated in worker processes, see generate_parallel
+    def generate_program(self, out=None, jobs: int = 1) -> Optional[str]:
+        if out is not None:
+            self.out = out
         if self.root.init_vars:
-            assembly += "    .section __DATA,__data\n"
+            self.emit("    .section __DATA,__data\n")
             for init_var in self.root.init_vars:
-                assembly += self.generate_global_init(init_var)
-            assembly += "\n\n"
+                self.generate_global_init(init_var)
+            self.emit("\n\n")
         if self.root.uninit_vars:
             for uninit_var in self.root.uninit_vars:
-                assembly += self.generate_global_uninit(uninit_var)
-            assembly += "\n\n"
+                self.generate_global_uninit(uninit_var)
+            self.emit("\n\n")
         if self.root.funcs:
-            assembly += (
-                "    .section __TEXT,__text\n"
-                
-            )
-            for func in self.root.funcs:
-                assembly += self.generate_function(func)
-        return assembly
+            self.emit("    .section __TEXT,__text\n")
+            if jobs > 1 and len(self.root.funcs) > 1:
+                self.generate_parallel(self.root.funcs, jobs)
+            else:
+                for func in self.root.funcs:
+                    self.generate_function(func)
+        if self.out is None:
+            return self.take()
+        self.flush()
+
+    # Streaming counterpart of generate_program, emits one function or global variable as soon
+    # as it is parsed. Sections are switched as needed.
+    # Uninitialised globals may still be initialised further down, so they are held back until finish()
+    def generate_top(self, top: Top):
+        if isinstance(top, Function):
+            self.switch_section("    .section __TEXT,__text\n")
+            self.generate_function(top)
+            return
+        name = top.id.id
+        if not top.init:
+            if name not in self.initialised:
+                self.uninitialised[name] = top
+            return
+        self.initialised.add(name)
+        self.uninitialised.pop(name, None)
+        self.switch_section("    .section __DATA,__data\n")
+        self.generate_global_init(top)
+
+    def switch_section(self, section: str):
+        if section == self.section:
+            return
+        if self.section:
+            self.emit("\n\n")
+        self.section = section
+        self.emit(section)
+
+    def finish(self):
+        if self.uninitialised:
+            if self.section:
+                self.emit("\n\n")
+            for uninit_var in self.uninitialised.values():
+                self.generate_global_uninit(uninit_var)
+            self.uninitialised = {}
+        if self.out is not None:
+            self.flush()
+
     # TODO: cant generate code as cannot calculate during run time so need calculate with python, check later
-    def generate_global_init(self, gl_var: GlobalVar) -> str:
+    def generate_global_init(self, gl_var: GlobalVar):
         variable = gl_var.id
         if not isinstance(gl_var.exp, IntLiteral):
-            error.report(
+            self.error.report(
                 error_msg=f"Global variable '{variable.id}' can only contain constant expressions",
                 line=variable.line, type="SyntaxError"
             ) 
-            error.display("Code Generation")
-        return (
+            self.error.display("Code generation")
+        self.emit(
             f"    .globl    _{variable.id}\n"
             "    .p2align    3\n"  # 2*2 = 4 for int, use 3 for simplicity right now
             f"_{variable.id}:\n"
             f"    .int    {gl_var.exp.value}\n"
         )
     
-    def generate_global_uninit(self, gl_var: GlobalVar) -> str:
+    def generate_global_uninit(self, gl_var: GlobalVar):
         variable = gl_var.id
-        return f"    .zerofill __DATA,__bss,_{variable.id},8,3\n"
+        self.emit(f"    .zerofill __DATA,__bss,_{variable.id},8,3\n")
+
+    # With a function cache, a function whose key was seen before has its assembly copied out of the cache,
+    # anything else is generated on its own buffer so it can be stored. A traced function is generated on its
+    # own buffer too, so the size of its assembly can go on its span
+    def generate_function(self, func: Function):
+        tracer = self.context.tracer
+        if tracer is None:
+            if self.functions is None or func.key is None:
+                self.emit_function(func)
+            else:
+                self.emit(self.function_assembly(func))
+            return
+        hits = self.functions.hits if self.functions is not None else 0
+        with tracer.span(func.name, "codegen") as end:
+            assembly = self.function_assembly(func)
+            end["bytes"] = len(assembly)
+            end["cached"] = self.functions is not None and self.functions.hits > hits
+        self.emit(assembly)
 
-    def generate_function(self, func: Function) -> str:
-        return  (
+    def function_assembly(self, func: Function) -> str:
+        cached = self.functions is not None and func.key is not None
+        if cached:
+            assembly = self.functions.get(func.key)
+            if assembly is not None:
+                return assembly
+        out, buffer, errors = self.out, self.buffer, self.error.error_count
+        self.out, self.buffer = None, []
+        try:
+            self.emit_function(func)
+            assembly = self.take()
+        finally:
+            self.out, self.buffer = out, buffer
+        if cached and self.error.error_count == errors:
+            self.functions.put(func.key, assembly)
+        return assembly
+
+    # A function's assembly only depends on the function and the global table, so functions can be generated
+    # anywhere and put back in source order to give the same output as generating them one after another.
+    # Functions in the function cache are copied as usual, the rest are split into runs of neighbouring
+    # functions, one worker generating each run. The global table is handed to the pool's initializer, so
+    # every worker gets it once. Forked workers inherit the functions from it too, without pickling, and
+    # are only told which to generate, see start_method. Spawned workers are sent each run packed into an
+    # Arena, which is far quicker to send than pickled nodes. Nothing is shared between calls, so
+    # generate_parallel can run on several threads at once.
+    def generate_parallel(self, funcs: list, jobs: int):
+        pieces = [self.functions.get(func.key) if self.functions is not None and func.key is not None else None for func in funcs]
+        missing = [index for index, piece in enumerate(pieces) if piece is None]
+        # A few runs per job so a run of long functions does not hold everything up
+        size = max(1, -(-len(missing) // (jobs * 4)))
+        runs = [missing[start:start + size] for start in range(0, len(missing), size)]
+        if runs:
+            method = start_method()
+            if method == "fork":
+                held, work = funcs, (generate_held, runs)
+            else:
+                held, work = None, (generate_run, [self.pack(funcs, run) for run in runs])
+            pool = ProcessPoolExecutor(
+                min(jobs, len(runs)), multiprocessing.get_context(method),
+                initializer=hold, initargs=(held, self.global_table)
+            )
+            with pool:
+                for run, (assemblies, failed, errors) in zip(runs, pool.map(*work)):
+                    for position, (index, assembly) in enumerate(zip(run, assemblies)):
+                        pieces[index] = assembly
+                        if self.functions is not None and funcs[index].key is not None and position not in failed:
+                            self.functions.put(funcs[index].key, assembly)
+                    for error in errors:
+                        self.error.report(*error)
+        for piece in pieces:
+            self.emit(piece)
+
+    @staticmethod
+    def pack(funcs: list, run: list) -> bytes:
+        arena = Arena()
+        arena.root = arena.store([funcs[index] for index in run])
+        return arena.to_bytes()
+
+    def emit_function(self, func: Function):
+        # Labels and stack offsets start again in every function, so its assembly only depends on itself
+        self.labels = LabelGen(func.name)
+        self.memory = Memory(self.error)
+        self.emit(
             f"    .globl    _{func.name}\n"
-            f"_{func.name}:\n" +
+            f"_{func.name}:\n"
             "    pushq    %rbp\n"
-            "    movq    %rsp, %rbp\n" +
-            self.generate_block(func.body)
+            "    movq    %rsp, %rbp\n"
         )
+        self.visit(func.body)
+        if self.context.stats:
+            self.context.stats.labels.update(self.labels.count)
 
-    def generate_block(self, blk: Block) -> str:
+    @visits(Block)
+    def generate_block(self, blk: Block):
         symbol = blk.symboltable
-        self.table_stack.append(symbol)
-        memory = self.memory.make_space(symbol.table)
-        assembly = ""
+        self.scopes.push(symbol)
+        memory = self.memory.make_space(symbol.table) if symbol else 0
         if memory != 0:
-            assembly += f"    subq    ${memory}, %rsp\n"
+            self.emit(f"    subq    ${memory}, %rsp\n")
         for itm in blk.block_items:
-            stm = self.generate_statement(itm)
-            if stm:
-                assembly += stm
-        self.table_stack.pop()
-        return assembly
-        
-    def generate_statement(self, stm: Statement) -> str:
-        if isinstance(stm, Return):
-            return (
-                self.generate_exp(stm.exp) +
-                "    movq    %rbp, %rsp\n"
-                "    popq    %rbp\n"
-                "    ret\n\n"
-            )
-            
-        elif isinstance(stm, If):
-            end = LabelGen.generate("end")
-            if stm.else_statement:
-                el = LabelGen.generate("el")
-                return (
-                    self.generate_exp(stm.condition) +
-                    "    cmpq    $0, %rax\n"
-                    f"    je    _{el}\n" +
-                    self.generate_statement(stm.if_statement) +
-                    f"    jmp    _{end}\n"
-                    f"_{el}:\n" +
-                    self.generate_statement(stm.else_statement) +
-                    f"_{end}:\n"
-                )
-            else:
-                return (
-                    self.generate_exp(stm.condition) +
-                    "    cmpq    $0, %rax\n"
-                    f"    je    _{end}\n" +
-                    self.generate_statement(stm.if_statement) +
-                    f"_{end}:\n"
-                )
-    
-        elif isinstance(stm, For):
-            assembly = ""
-            if stm.symboltable:
-                symbol = stm.symboltable
-                self.table_stack.append(symbol)
-                memory = self.memory.make_space(symbol.table)
-                assembly += f"    subq    ${memory}, %rsp\n"
-            else:
-                symbol = self.table_stack[-1]
-            assembly += (self.generate_statement(stm.initial) if stm.initial.exp else "")
-            start = LabelGen.generate('start')
-            end = LabelGen.generate('end')
-            cont = LabelGen.generate('cont')
-            symbol.insert(id="_continue", entry=LabelEntry(id="_continue", name=cont))
-            symbol.insert(id="_break", entry=LabelEntry(id="_break", name=end))
-            condition = self.generate_statement(stm.condition)
-            if not condition:
-                condition = ""
-            post_exp = self.generate_statement(stm.post_exp)
-            if not post_exp:
-                post_exp = ""
-            statement = self.generate_statement(stm.statement)
-            if not statement:
-                statement = ""
-            symbol.pop("_continue")
-            symbol.pop("_break")
-            if isinstance(stm.initial, Declare):
-                self.table_stack.pop()
-            assembly += (
-                f"_{start}:\n" +
-                condition +
+            yield itm
+        self.scopes.pop()
+
+    @visits(Return)
+    def generate_return(self, stm: Return):
+        yield stm.exp
+        self.emit(
+            "    movq    %rbp, %rsp\n"
+            "    popq    %rbp\n"
+            "    ret\n\n"
+        )
+
+    @visits(If)
+    def generate_if(self, stm: If):
+        end = self.labels.generate("end")
+        if stm.else_statement:
+            el = self.labels.generate("el")
+            yield stm.condition
+            self.emit(
                 "    cmpq    $0, %rax\n"
-                f"    je    _{end}\n" +
-                statement +
-                f"_{cont}:\n" +
-                (post_exp if stm.post_exp.exp else "") +
-                f"    jmp    _{start}\n"
-                f"_{end}:\n"
+                f"    je    _{el}\n"
             )
-            return assembly
-
-        elif isinstance(stm, While):
-            start = LabelGen.generate('start')
-            end = LabelGen.generate('end')
-            symbol = self.table_stack[-1]
-            symbol.insert(id="_continue", entry=LabelEntry(id="_continue", name=start))
-            symbol.insert(id="_break", entry=LabelEntry(id="_break", name=end))
-            condition = self.generate_exp(stm.condition)
-            if not condition:
-                condition = ""
-            statement = self.generate_statement(stm.statement)
-            if not statement:
-                statement = ""
-            symbol.pop("_continue")
-            symbol.pop("_break")
-            return (
-                f"_{start}:" +
-                condition +
-                "    cmpq    $0, %rax\n"
-                f"    je    _{end}\n" +
-                statement +
-                f"    jmp    _{start}\n"
-                f"_{end}:\n"
+            yield stm.if_statement
+            self.emit(
+                f"    jmp    _{end}\n"
+                f"_{el}:\n"
             )
-
-        elif isinstance(stm, DoWhile):
-            start = LabelGen.generate('start')
-            end = LabelGen.generate('end')
-            symbol = self.table_stack[-1]
-            symbol.insert(id="_continue", entry=LabelEntry(id="_continue", name=start))
-            symbol.insert(id="_break", entry=LabelEntry(id="_break", name=end))
-            condition = self.generate_exp(stm.condition)
-            if not condition:
-                condition = ""
-            statement = self.generate_statement(stm.statement)
-            if not statement:
-                statement = ""
-            symbol.pop("_continue")
-            symbol.pop("_break")
-            return (
-                f"_{start}:" +
-                statement +
-                condition +
+            yield stm.else_statement
+            self.emit(f"_{end}:\n")
+        else:
+            yield stm.condition
+            self.emit(
                 "    cmpq    $0, %rax\n"
                 f"    je    _{end}\n"
-                f"    jmp    _{start}\n"
-                f"_{end}:\n"
             )
-        
-        elif isinstance(stm, Break):
-            br = self.search_blocks(id="_break")
-            if not br:
-                error.report(error_msg="Break can only be used in loops", line=stm.line, type="SyntaxError")
-                error.display("Code Generation")
-            return f"    jmp    _{br.name}\n"
-
-        elif isinstance(stm, Continue):
-            cn = self.search_blocks(id="_continue")
-            if not cn:
-                error.report(error_msg="Continue can only be used in loops", line=stm.line, type="SyntaxError")
-                error.display("Code Generaton")
-            return f"    jmp _{cn.name}\n"
-            
-        elif isinstance(stm, ExpStatement):
-            if not stm.exp:
-                return None
-            else:
-                return self.generate_exp(stm.exp)
-                
-        # Declare kept here as for sake of compactness, although technically not a statement
-        elif isinstance(stm, Declare):
-            symbol = self.table_stack[-1]
-            variable = stm.id
-            offset = self.memory.assign_memory(variable.id, symbol.table, stm.line)
-            if stm.exp:
-                return (
-                    self.generate_exp(stm.exp) +
-                    f"    movq    %rax, {offset}(%rbp)\n"
-                )
-            else:
-                return ""
-        elif isinstance(stm, Block):
-            return self.generate_block(stm)
+            yield stm.if_statement
+            self.emit(f"_{end}:\n")
+
+    @visits(For)
+    def generate_for(self, stm: For):
+        # The loop gets its own scope, for the labels and any variable declared in the initialiser
+        self.scopes.push(stm.symboltable)
+        if stm.symboltable:
+            memory = self.memory.make_space(stm.symboltable.table)
+            self.emit(f"    subq    ${memory}, %rsp\n")
+        if stm.initial.exp:
+            yield stm.initial
+        start = self.labels.generate('start')
+        end = self.labels.generate('end')
+        cont = self.labels.generate('cont')
+        self.scopes.bind("_continue", LabelEntry(id="_continue", name=cont))
+        self.scopes.bind("_break", LabelEntry(id="_break", name=end))
+        self.emit(f"_{start}:\n")
+        yield stm.condition
+        self.emit(
+            "    cmpq    $0, %rax\n"
+            f"    je    _{end}\n"
+        )
+        yield stm.statement
+        self.emit(f"_{cont}:\n")
+        if stm.post_exp.exp:
+            yield stm.post_exp
+        self.emit(
+            f"    jmp    _{start}\n"
+            f"_{end}:\n"
+        )
+        self.scopes.pop()
+
+    @visits(While)
+    def generate_while(self, stm: While):
+        start = self.labels.generate('start')
+        end = self.labels.generate('end')
+        self.scopes.push()
+        self.scopes.bind("_continue", LabelEntry(id="_continue", name=start))
+        self.scopes.bind("_break", LabelEntry(id="_break", name=end))
+        self.emit(f"_{start}:\n")
+        yield stm.condition
+        self.emit(
+            "    cmpq    $0, %rax\n"
+            f"    je    _{end}\n"
+        )
+        yield stm.statement
+        self.emit(
+            f"    jmp    _{start}\n"
+            f"_{end}:\n"
+        )
+        self.scopes.pop()
+
+    @visits(DoWhile)
+    def generate_do_while(self, stm: DoWhile):
+        start = self.labels.generate('start')
+        end = self.labels.generate('end')
+        self.scopes.push()
+        self.scopes.bind("_continue", LabelEntry(id="_continue", name=start))
+        self.scopes.bind("_break", LabelEntry(id="_break", name=end))
+        self.emit(f"_{start}:\n")
+        yield stm.statement
+        yield stm.condition
+        self.emit(
+            "    cmpq    $0, %rax\n"
+            f"    je    _{end}\n"
+            f"    jmp    _{start}\n"
+            f"_{end}:\n"
+        )
+        self.scopes.pop()
+
+    @visits(Break)
+    def generate_break(self, stm: Break):
+        br = self.search_blocks(id="_break")
+        if not br:
+            self.error.report(error_msg="Break can only be used in loops", line=stm.line, type="SyntaxError")
+            self.error.display("Code generation")
+        self.emit(f"    jmp    _{br.name}\n")
+
+    @visits(Continue)
+    def generate_continue(self, stm: Continue):
+        cn = self.search_blocks(id="_continue")
+        if not cn:
+            self.error.report(error_msg="Continue can only be used in loops", line=stm.line, type="SyntaxError")
+            self.error.display("Code generation")
+        self.emit(f"    jmp _{cn.name}\n")
+
+    @visits(ExpStatement)
+    def generate_exp_statement(self, stm: ExpStatement):
+        if stm.exp:
+            yield stm.exp
+
+    # Declare kept with the statements for sake of compactness, although technically not a statement
+    @visits(Declare)
+    def generate_declare(self, stm: Declare):
+        symbol = self.scopes.current()
+        variable = stm.id
+        offset = self.memory.assign_memory(variable.id, symbol.table, stm.line)
+        if stm.exp:
+            yield stm.exp
+            self.emit(f"    movq    %rax, {offset}(%rbp)\n")
+
+    # Evaluates first, saves it on the stack, evaluates second and then runs assembly to combine them
+    def generate_binary(self, first: Exp, second: Exp, assembly: str):
+        yield first
+        self.emit("    pushq    %rax\n")
+        yield second
+        self.emit(assembly)
+
+    @visits(CommaExp)
+    def generate_comma(self, exp: CommaExp):
+        yield exp.lhs
+        yield exp.rhs
+
+    @visits(Assign)
+    def generate_assign(self, exp: Assign):
+        var, _global = self.search_blocks(exp.id.id, exp.line)
+        yield exp.exp
+        if _global:
+            self.emit(f"    movq    %rax, _{var.id}(%rip)\n")
         else:
-            return self.generate_exp(stm.exp)
+            self.emit(f"    movq    %rax, {var.offset}(%rbp)\n")
 
-    def generate_exp(self, exp: Exp) -> str:
+    @visits(Conditional)
+    def generate_conditional(self, exp: Conditional):
+        end = self.labels.generate("end")
+        el = self.labels.generate("el")
+        yield exp.condition
+        self.emit(
+            "    cmpq    $0, %rax\n"
+            f"    je    _{el}\n"
+        )
+        yield exp.if_statement
+        self.emit(
+            f"    jmp    _{end}\n"
+            f"_{el}:\n"
+        )
+        yield exp.else_statement
+        self.emit(f"_{end}:\n")
 
-        if isinstance(exp, CommaExp):
-            return f"{self.generate_exp(exp.lhs)}{self.generate_exp(exp.rhs)}"
-        
-        elif isinstance(exp, Assign):
-            var, _global = self.search_blocks(exp.id.id, exp.line)
-            assembly = self.generate_exp(exp.exp)
-            if _global:
-                assembly += f"    movq    %rax, _{var.id}(%rip)\n"
-            else:
-                assembly += f"    movq    %rax, {var.offset}(%rbp)\n"
-            return assembly
-        
-        elif isinstance(exp, Conditional):
-            end = LabelGen.generate("end")
-            el = LabelGen.generate("el")
-            return (
-                self.generate_exp(exp.condition) +
-                "    cmpq    $0, %rax\n"
-                f"    je    _{el}\n" +
-                self.generate_exp(exp.if_statement) +
-                f"    jmp    _{end}\n"
-                f"_{el}:\n" +
-                self.generate_exp(exp.else_statement) +
-                f"_{end}:\n"
-            )
-        
-        elif isinstance(exp, OR):
-            clause = LabelGen.generate("clause")
-            end = LabelGen.generate("end")
-            return (
-                self.generate_exp(exp.operand1) +
-                "    cmpq    $0, %rax\n"
-                f"    je    _{clause}\n"
-                "    movq    $1, %rax\n"
+    @visits(OR)
+    def generate_or(self, exp: OR):
+        clause = self.labels.generate("clause")
+        end = self.labels.generate("end")
+        yield exp.operand1
+        self.emit(
+            "    cmpq    $0, %rax\n"
+            f"    je    _{clause}\n"
+            "    movq    $1, %rax\n"
+            "    movzx    %al, %rax\n"
+            f"    jmp    _{end}\n"
+            f"_{clause}:\n"
+        )
+        yield exp.operand2
+        self.emit(
+            "    cmpq    $0, %rax\n"
+            "    movq    $0, %rax\n"
+            "    setne    %al\n"
+            "    movzx    %al, %rax\n"
+            f"_{end}:\n"
+        )
+
+    @visits(AND)
+    def generate_and(self, exp: AND):
+        clause = self.labels.generate("clause")
+        end = self.labels.generate("end")
+        yield exp.operand1
+        self.emit(
+            "    cmpq    $0, %rax\n"
+            f"    je    _{end}\n"
+            f"_{clause}:\n"
+        )
+        yield exp.operand2
+        self.emit(
+            "    cmpq    $0, %rax\n"
+            "    movq   $0, %rax\n"
+            "    setne    %al\n"
+            "    movzx    %al, %rax\n"
+            f"_{end}:\n"
+        )
+
+    @visits(Equality, Inequality)
+    def generate_comparison(self, exp: Union[Equality, Inequality]):
+        op = exp.operator
+        if op == TokenType.EQUAL:
+            yield from self.generate_binary(exp.operand1, exp.operand2,
+                "    popq    %rcx\n"
+                "    cmpq    %rcx, %rax\n"
+                "    movq    $0, %rax\n"
+                "    sete    %al\n"
                 "    movzx    %al, %rax\n"
-                f"    jmp    _{end}\n"
-                f"_{clause}:\n" +
-                self.generate_exp(exp.operand2) +
-                "    cmpq    $0, %rax\n"
+            )
+        elif op == TokenType.NOT_EQUAL:
+            yield from self.generate_binary(exp.operand1, exp.operand2,
+                "    popq    %rcx\n"
+                "    cmpq    %rcx, %rax\n"
                 "    movq    $0, %rax\n"
                 "    setne    %al\n"
                 "    movzx    %al, %rax\n"
-                f"_{end}:\n"
             )
 
-        elif isinstance(exp, AND):
-            clause = LabelGen.generate("clause")
-            end = LabelGen.generate("end")
-            return (
-                self.generate_exp(exp.operand1) +
-                "    cmpq    $0, %rax\n"
-                f"    je    _{end}\n"
-                f"_{clause}:\n" +
-                self.generate_exp(exp.operand2) +
-                "    cmpq    $0, %rax\n"
-                "    movq   $0, %rax\n"
-                "    setne    %al\n"
+        elif op == TokenType.GREATER_THAN:
+            yield from self.generate_binary(exp.operand2, exp.operand1,
+                "    popq    %rcx\n"
+                "    cmpq    %rcx, %rax\n"
+                "    movq    $0, %rax\n"
+                "    setg    %al\n"
                 "    movzx    %al, %rax\n"
-                f"_{end}:\n"
             )
-        
-        elif isinstance(exp, Equality) or isinstance(exp, Inequality):
-            op = exp.operator
-            if op == TokenType.EQUAL:
-                return (
-                    self.generate_exp(exp.operand1) +
-                    "    pushq    %rax\n" +
-                    self.generate_exp(exp.operand2) +
-                    "    popq    %rcx\n"
-                    "    cmpq    %rcx, %rax\n"
-                    "    movq    $0, %rax\n"
-                    "    sete    %al\n"
-                    "    movzx    %al, %rax\n"
-                )
-            elif op == TokenType.NOT_EQUAL:
-                return (
-                    self.generate_exp(exp.operand1) +
-                    "    pushq    %rax\n" +
-                    self.generate_exp(exp.operand2) +
-                    "    popq    %rcx\n"
-                    "    cmpq    %rcx, %rax\n"
-                    "    movq    $0, %rax\n"
-                    "    setne    %al\n"
-                    "    movzx    %al, %rax\n"
-                )
-            
-            elif op == TokenType.GREATER_THAN:
-                return (
-                    self.generate_exp(exp.operand2) +
-                    "    pushq    %rax\n" +
-                    self.generate_exp(exp.operand1) +
-                    "    popq    %rcx\n"
-                    "    cmpq    %rcx, %rax\n"
-                    "    movq    $0, %rax\n"
-                    "    setg    %al\n"
-                    "    movzx    %al, %rax\n"
-                )
-
-            elif op == TokenType.GREATER_THAN_OR_EQUAL:
-                return (
-                    self.generate_exp(exp.operand2) +
-                    "    pushq    %rax\n" +
-                    self.generate_exp(exp.operand1) +
-                    "    popq    %rcx\n"
-                    "    cmpq    %rcx, %rax\n"
-                    "    movq    $0, %rax\n"
-                    "    setge    %al\n"
-                    "    movzx    %al, %rax\n"
-                )
-
-            elif op == TokenType.LESS_THAN:
-                return (
-                    self.generate_exp(exp.operand2) +
-                    "    pushq    %rax\n" +
-                    self.generate_exp(exp.operand1) +
-                    "    popq    %rcx\n"
-                    "    cmpq    %rcx, %rax\n"
-                    "    movq    $0, %rax\n"
-                    "    setl    %al\n"
-                    "    movzx    %al, %rax\n"
-                )
-
-            elif op == TokenType.LESS_THAN_OR_EQUAL:
-                return (
-                    self.generate_exp(exp.operand2) +
-                    "    pushq    %rax\n" +
-                    self.generate_exp(exp.operand1) +
-                    "    popq    %rcx\n"
-                    "    cmpq    %rcx, %rax\n"
-                    "    movq    $0, %rax\n"
-                    "    setle    %al\n"
-                    "    movzx    %al, %rax\n"
-                )
-        
-        elif isinstance(exp, BitOR):
-            return (
-                self.generate_exp(exp.operand1) +
-                "    pushq    %rax\n" +
-                self.generate_exp(exp.operand2) +
+
+        elif op == TokenType.GREATER_THAN_OR_EQUAL:
+            yield from self.generate_binary(exp.operand2, exp.operand1,
                 "    popq    %rcx\n"
-                "    orq    %rcx, %rax\n"
+                "    cmpq    %rcx, %rax\n"
+                "    movq    $0, %rax\n"
+                "    setge    %al\n"
+                "    movzx    %al, %rax\n"
             )
 
-        elif isinstance(exp, BitXOR):
-            return (
-                self.generate_exp(exp.operand1) +
-                "    pushq    %rax\n" +
-                self.generate_exp(exp.operand2) +
+        elif op == TokenType.LESS_THAN:
+            yield from self.generate_binary(exp.operand2, exp.operand1,
                 "    popq    %rcx\n"
-                "    xorq    %rcx, %rax\n"
+                "    cmpq    %rcx, %rax\n"
+                "    movq    $0, %rax\n"
+                "    setl    %al\n"
+                "    movzx    %al, %rax\n"
             )
 
-        elif isinstance(exp, BitAND):
-            return (
-                self.generate_exp(exp.operand1) +
-                "    pushq    %rax\n" +
-                self.generate_exp(exp.operand2) +
-                "    popq    %%rcs\n"
-                "    andq    %rcx, %rax\n"
+        elif op == TokenType.LESS_THAN_OR_EQUAL:
+            yield from self.generate_binary(exp.operand2, exp.operand1,
+                "    popq    %rcx\n"
+                "    cmpq    %rcx, %rax\n"
+                "    movq    $0, %rax\n"
+                "    setle    %al\n"
+                "    movzx    %al, %rax\n"
             )
 
-        elif isinstance(exp, BitShift):
-            op = exp.operator
-            if op == TokenType.BIT_SHIFT_LEFT:
-                return (
-                    self.generate_exp(exp.shift) +
-                    "    pushq    %rax\n" +
-                    self.generate_exp(exp.value) +
-                    "    popq    %rcx\n"
-                    "    salq    %cl, %rax\n"
-                )
-               
-            elif op == TokenType.BIT_SHIFT_RIGHT:
-                return (
-                    self.generate_exp(exp.shift) +
-                    "    pushq    %rax\n" +
-                    self.generate_exp(exp.value) +
-                    "    popq    %rcx\n"
-                    "    sarq    %cl, %rax\n"
-                )
-
-        elif isinstance(exp, AddSub):
-            op = exp.operator
-            if op == TokenType.ADDITION:
-                return (
-                    self.generate_exp(exp.operand1) +
-                    "    pushq    %rax\n" +
-                    self.generate_exp(exp.operand2) +
-                    "    popq    %rcx\n"
-                    "    addq    %rcx, %rax\n"
-                )
-            elif op == TokenType.SUBTRACTION:
-                return (
-                    self.generate_exp(exp.operand2) +
-                    "    pushq    %rax\n" +
-                    self.generate_exp(exp.operand1) +
-                    "    popq    %rcx\n"
-                    "    subq    %rcx, %rax\n"
-                )
-        
-        elif isinstance(exp, MultDivMod):
-            op = exp.operator
-            if op == TokenType.MULTIPLICATION:
-                return (
-                    self.generate_exp(exp.operand1) +
-                    "    pushq    %rax\n" +
-                    self.generate_exp(exp.operand2) +
-                    "    popq    %rcx\n"
-                    "    imulq    %rcx, %rax\n"
-                )
-            elif op == TokenType.DIVISION:
-                return (
-                    self.generate_exp(exp.operand2) +
-                    "    pushq    %rax\n" +
-                    self.generate_exp(exp.operand1) +
-                    "    popq    %rcx\n"
-                    "    cqo\n"
-                    "    idivq    %rcx\n"
-                )
-            elif op == TokenType.MODULO:
-                return (
-                    self.generate_exp(exp.operand2) +
-                    "    pushq    %rax\n" +
-                    self.generate_exp(exp.operand1) +
-                    "    popq    %rcx\n"
-                    "    cqo\n"
-                    "    idivq    %rcx\n"
-                    "    movq    %rdx, %rax\n"
-                )
-
-        elif isinstance(exp, Decrement):
-            var, _global = self.search_blocks(exp.id, exp.line)
-            if exp.prefix == True:
-                if _global:
-                    return (
-                        f"    movq    _{var.id}(%rip), %rax\n"
-                        "    dec    %rax\n"
-                        f"    movq    %rax, _{var.id}(%rip)\n"
-                    )
-                else:
-                    return (
-                        f"    movq    {var.offset}(%rbp), %rax\n"
-                        "    dec    %rax\n"
-                        f"    movq    %rax, {var.offset}(%rbp)\n"
-                    )
-            elif exp.prefix == False:   #Postfix increment
-                if _global:
-                    return (
-                        f"    movq    _{var.id}(%rip), %rax\n"
-                        "    movq    %rax, %rcx\n"
-                        "    dec    %rcx\n"
-                        f"    movq    %rcx, _{var.id}(%rip)\n"
-                    )
-                else:
-                    return (
-                    f"    movq    {var.offset}(%rbp), %rax\n"
-                    "    movq    %rax, %rcx\n"
-                    "    dec    %rcx\n"
-                    f"    movq    %rcx, {var.offset}(%rbp)\n"
-                    )
-
-        elif isinstance(exp, Increment):
-            var, _global = self.search_blocks(exp.id, exp.line)
-            if exp.prefix == True:  #Prefix increment
-                if _global:
-                    return (
-                        f"    movq    _{var.id}(%rip), %rax\n"
-                        "    inc    %rax\n"
-                        f"    movq    %rax, _{var.id}(%rip)\n"
-                    )
-                else:
-                    return (
-                        f"    movq    {var.offset}(%rbp), %rax\n"
-                        "    inc    %rax\n"
-                        f"    movq    %rax, {var.offset}(%rbp)\n"
-                    )
-            elif exp.prefix == False:   #Postfix increment
-                if _global:
-                    return (
-                        f"    movq    _{var.id}(%rip), %rax\n"
-                        "    movq    %rax, %rcx\n"
-                        "    inc    %rcx\n"
-                        f"    movq    %rcx, _{var.id}(%rip)\n"
-                    )
-                else:
-                    return (
-                    f"    movq    {var.offset}(%rbp), %rax\n"
-                    "    movq    %rax, %rcx\n"
-                    "    inc    %rcx\n"
-                    f"    movq    %rcx, {var.offset}(%rbp)\n"
-                    )
-
-        elif isinstance(exp, UnOp):
-            op = exp.operator
-            if op == TokenType.BIT_COMP:
-                return self.generate_exp(exp.operand) + "    not    %rax\n"
-            elif op == TokenType.SUBTRACTION:
-                return self.generate_exp(exp.operand) + "    neg    %rax\n"
-            elif op == TokenType.LOGICAL_NEGATION:
-                return (
-                    self.generate_exp(exp.operand) +
-                    "    cmpq   $0, %rax\n"
-                    "    movq   $0, %rax\n"
-                    "    sete   %al\n"
-                    "    movzx    %al, %rax\n"
-                )
-
-        elif isinstance(exp, IntLiteral):
-            return f"    movq    ${exp.value}, %rax\n"
-
-
-        elif isinstance(exp, Var):
-            var, _global = self.search_blocks(exp.id, exp.line)
-            if _global:
-                return f"    movq    _{var.id}(%rip), %rax\n"
-            else:
-                return f"    movq    {var.offset}(%rbp), %rax\n"
+    @visits(BitOR)
+    def generate_bit_or(self, exp: BitOR):
+        yield from self.generate_binary(exp.operand1, exp.operand2,
+            "    popq    %rcx\n"
+            "    orq    %rcx, %rax\n"
+        )
 
-        elif isinstance(exp, Parenthesis):
-            return self.generate_exp(exp.exp)
-        
-        elif isinstance(exp, FunctionCall):
-            assembly = ""
-            params = exp.param
-            padding = self.padding(params)
-            if padding:
-                assembly += f"    subq    ${padding}, %rsp\n"
-            for i in range(len(params)):
-                assembly += (
-                    self.generate_exp(params[i]) +
-                    "    pushq    %rax\n"
-                )
-            assembly += f"    call    _{exp.name}\n"
-            if params:
-                cleanup = 8 * len(params)
-                assembly += (
-                    f"    addq    ${cleanup}, %rsp\n" +
-                    (f"    addq    ${padding}, %rsp\n" if padding else "")
-                    )
-            return assembly
+    @visits(BitXOR)
+    def generate_bit_xor(self, exp: BitXOR):
+        yield from self.generate_binary(exp.operand1, exp.operand2,
+            "    popq    %rcx\n"
+            "    xorq    %rcx, %rax\n"
+        )
 
+    @visits(BitAND)
+    def generate_bit_and(self, exp: BitAND):
+        yield from self.generate_binary(exp.operand1, exp.operand2,
+            "    popq    %rcx\n"
+            "    andq    %rcx, %rax\n"
+        )
+
+    @visits(BitShift)
+    def generate_shift(self, exp: BitShift):
+        op = exp.operator
+        if op == TokenType.BIT_SHIFT_LEFT:
+            yield from self.generate_binary(exp.shift, exp.value,
+                "    popq    %rcx\n"
+                "    salq    %cl, %rax\n"
+            )
+
+        elif op == TokenType.BIT_SHIFT_RIGHT:
+            yield from self.generate_binary(exp.shift, exp.value,
+                "    popq    %rcx\n"
+                "    sarq    %cl, %rax\n"
+            )
+
+    @visits(AddSub)
+    def generate_add_sub(self, exp: AddSub):
+        op = exp.operator
+        if op == TokenType.ADDITION:
+            yield from self.generate_binary(exp.operand1, exp.operand2,
+                "    popq    %rcx\n"
+                "    addq    %rcx, %rax\n"
+            )
+        elif op == TokenType.SUBTRACTION:
+            yield from self.generate_binary(exp.operand2, exp.operand1,
+                "    popq    %rcx\n"
+                "    subq    %rcx, %rax\n"
+            )
+
+    @visits(MultDivMod)
+    def generate_mult_div_mod(self, exp: MultDivMod):
+        op = exp.operator
+        if op == TokenType.MULTIPLICATION:
+            yield from self.generate_binary(exp.operand1, exp.operand2,
+                "    popq    %rcx\n"
+                "    imulq    %rcx, %rax\n"
+            )
+        elif op == TokenType.DIVISION:
+            yield from self.generate_binary(exp.operand2, exp.operand1,
+                "    popq    %rcx\n"
+                "    cqo\n"
+                "    idivq    %rcx\n"
+            )
+        elif op == TokenType.MODULO:
+            yield from self.generate_binary(exp.operand2, exp.operand1,
+                "    popq    %rcx\n"
+                "    cqo\n"
+                "    idivq    %rcx\n"
+                "    movq    %rdx, %rax\n"
+            )
+
+    @visits(Increment, Decrement)
+    def generate_step(self, exp: Union[Increment, Decrement]):
+        var, _global = self.search_blocks(exp.id, exp.line)
+        step = "dec" if isinstance(exp, Decrement) else "inc"
+        address = f"_{var.id}(%rip)" if _global else f"{var.offset}(%rbp)"
+        if exp.prefix == True:
+            self.emit(
+                f"    movq    {address}, %rax\n"
+                f"    {step}    %rax\n"
+                f"    movq    %rax, {address}\n"
+            )
+        elif exp.prefix == False:   #Postfix
+            self.emit(
+                f"    movq    {address}, %rax\n"
+                "    movq    %rax, %rcx\n"
+                f"    {step}    %rcx\n"
+                f"    movq    %rcx, {address}\n"
+            )
+
+    @visits(UnOp)
+    def generate_unop(self, exp: UnOp):
+        op = exp.operator
+        if op == TokenType.BIT_COMP:
+            yield exp.operand
+            self.emit("    not    %rax\n")
+        elif op == TokenType.SUBTRACTION:
+            yield exp.operand
+            self.emit("    neg    %rax\n")
+        elif op == TokenType.LOGICAL_NEGATION:
+            yield exp.operand
+            self.emit(
+                "    cmpq   $0, %rax\n"
+                "    movq   $0, %rax\n"
+                "    sete   %al\n"
+                "    movzx    %al, %rax\n"
+            )
+
+    @visits(IntLiteral)
+    def generate_int_literal(self, exp: IntLiteral):
+        self.emit(f"    movq    ${exp.value}, %rax\n")
+
+    @visits(Var)
+    def generate_var(self, exp: Var):
+        var, _global = self.search_blocks(exp.id, exp.line)
+        if _global:
+            self.emit(f"    movq    _{var.id}(%rip), %rax\n")
         else:
-            error.report(error_msg=f"Incorrect use of {exp}", line=exp.line, type="SyntaxError")
\ No newline at end of file
+            self.emit(f"    movq    {var.offset}(%rbp), %rax\n")
+
+    @visits(Parenthesis)
+    def generate_parenthesis(self, exp: Parenthesis):
+        yield exp.exp
+
+    @visits(FunctionCall)
+    def generate_function_call(self, exp: FunctionCall):
+        params = exp.param
+        padding = self.padding(params)
+        if padding:
+            self.emit(f"    subq    ${padding}, %rsp\n")
+        for i in range(len(params)):
+            yield params[i]
+            self.emit("    pushq    %rax\n")
+        self.emit(f"    call    _{exp.name}\n")
+        if params:
+            cleanup = 8 * len(params)
+            self.emit(f"    addq    ${cleanup}, %rsp\n")
+            if padding:
+                self.emit(f"    addq    ${padding}, %rsp\n")
+
+    def generic_visit(self, exp):
+        self.error.report(error_msg=f"Incorrect use of {exp}", line=exp.line, type="SyntaxError")
+
+# Forking hands the workers of generate_parallel everything without pickling, but it is only safe on Linux
+# and while the process has no other thread, which a forked child would get a copy of the locks of but not
+# the thread itself. Anywhere else the workers are spawned, which is safe from any thread
+def start_method() -> str:
+    if sys.platform == "linux" and threading.active_count() == 1:
+        return "fork"
+    return "spawn"
+
+# The functions, forked workers only, and global table a worker of generate_parallel generates from.
+# Only ever set in a worker, by the pool's initializer, which every worker runs once as it starts
+held = None
+
+def hold(funcs: Optional[list], global_table: dict):
+    global held
+    held = (funcs, global_table)
+
+def generate_held(run: list) -> tuple:
+    funcs, global_table = held
+    return generate_functions([funcs[index] for index in run], global_table)
+
+def generate_run(data: bytes) -> tuple:
+    return generate_functions(Arena.from_bytes(data).program(), held[1])
+
+# Runs in a worker of generate_parallel. Returns the assembly of every function of the run, the positions
+# of the functions that reported errors, which must not be cached, and the errors themselves.
+def generate_functions(funcs: list, global_table: dict) -> tuple:
+    context = CompilationContext()
+    context.global_table.update(global_table)
+    generator = CodeGenerator(context=context)
+    assemblies, failed = [], set()
+    for position, func in enumerate(funcs):
+        errors = context.error.error_count
+        generator.emit_function(func)
+        assemblies.append(generator.take())
+        if context.error.error_count != errors:
+            failed.add(position)
+    return assemblies, failed, context.error.errors
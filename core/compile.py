@@ -2,38 +2,222 @@ from .lexer import Lexer as lexer
 from .parser import Parser as parser
 from .fold import Fold as fold
 from .codegen import CodeGenerator as codegen
-from core.util.error import error
+from core.util.error import ErrorManager
+from core.util.context import CompilationContext
+from core.util.cache import CompileCache, FunctionCache
+from core.util.timing import PassTimer, LineCounter
+from core.util.trace import Tracer
+from core.util.memory import MemoryReport
+from core.util.stats import Stats, InstructionCounter
+from core.data.token_buffer import TYPES
+from core.data.arena import walk
 
+import io
 import os
+import shutil
 import subprocess
+import tempfile
+from collections import Counter
+from contextlib import ExitStack, contextmanager, nullcontext
+from dataclasses import dataclass
+from typing import Optional
 
-def compile(text):
-    print("Undergoing lexical analysis...\n")
-    tokens = lexer(text).tokenise()
-    error.display("Lexing")
+# Lexes, parses, folds and generates one top level item at a time and writes each straight to out,
+# so only the tokens and AST of the function being compiled are ever held.
+# Functions found in the functions cache are copied from it instead of being generated again.
+# Every call is a compilation of its own with a new context unless one is passed in.
+# With a timer, a memory report, or a tracer or stats on the context, the whole file is lexed first so
+# lexing is measured on its own.
+# A timer is also given the tokens, nodes and lines of assembly for the rates in its report, and stats
+# the tokens by type, the nodes by class and the instructions by opcode, see Stats.
+def emit_assembly(text, out, functions: Optional[FunctionCache] = None, context: Optional[CompilationContext] = None,
+                  timer: Optional[PassTimer] = None, engine: str = "scan", mode: str = "recursive",
+                  memory: Optional[MemoryReport] = None):
+    context = context or CompilationContext()
+    error = context.error
+    stats = context.stats
+    phase = passes(timer, context.tracer, memory)
+    if timer or context.tracer or memory or stats:
+        with phase("lex"):
+            tokens = lexer(text, engine, context=context).tokenise_buffer()
+        error.display("Lexing")
+        if timer:
+            timer.count("tokens", len(tokens))
+            out = LineCounter(out, timer)
+        if stats:
+            stats.tokens.update({TYPES[code].name: count for code, count in Counter(tokens.types).items()})
+            out = InstructionCounter(out, stats)
+    else:
+        tokens = lexer(text, engine, context=context).tokenise_stream()
+    folder = fold(context=context)
+    generator = codegen(out=out, functions=functions, context=context)
+    tops = parser(tokens, mode, context=context).iter_program()
+    while True:
+        with phase("parse"):
+            top = next(tops, None)
+        error.display("Lexing")
+        error.display("Parsing")
+        if top is None:
+            break
+        if timer:
+            timer.count("nodes", sum(1 for _ in walk(top)))
+        if stats:
+            stats.nodes.update(type(node).__name__ for node in walk(top))
+        with phase("fold"):
+            top = folder.fold_top(top)
+        with phase("codegen"):
+            generator.generate_top(top)
+        error.display("Code generation")
+    with phase("codegen"):
+        generator.finish()
+    if functions is not None:
+        functions.finish()
 
-    print("...and parsing...\n")
-    ast = parser(tokens).parse_program()
-    error.display("Parsing")
+# How the passes are timed, traced and have their memory measured, nothing is done for what is missing
+def passes(timer: Optional[PassTimer], tracer: Optional[Tracer], memory: Optional[MemoryReport] = None):
+    # The memory report comes first so the snapshots it takes are outside the times and spans
+    watchers = [watch for watch in (
+        memory.phase if memory else None,
+        timer.time if timer else None,
+        (lambda name: tracer.span(name, "pass")) if tracer else None,
+    ) if watch]
+    if not watchers:
+        return untimed
+    if len(watchers) == 1:
+        return watchers[0]
+    return lambda name: watched(watchers, name)
 
-    print("...folding an optimizing...\n")
-    folded = fold(ast).start_fold()
+@contextmanager
+def watched(watchers: list, name: str):
+    with ExitStack() as stack:
+        for watch in watchers:
+            stack.enter_context(watch(name))
+        yield
 
-    print("...and generating the assembly\n")
-    assembly = codegen(folded).generate_program()
-    error.display("Code generation")
+def untimed(name: str):
+    return UNTIMED
 
-    with open("main.s", "w") as file:
-        file.write(assembly)
+UNTIMED = nullcontext()
 
-    subprocess.run(["clang", "main.s", "-o", "main"])
+@dataclass(slots=True)
+class Diagnostic:
+    message: str
+    line: Optional[int]             # None for an internal compiler error
+    type: str
 
-    result = subprocess.run(["./main"])
+@dataclass(slots=True)
+class CompileOptions:
+    engine: str = "scan"            # Lexer engine, see lexer.ENGINES
+    mode: str = "recursive"         # Parser mode, see parser.MODES
+    functions: Optional[FunctionCache] = None
+    timer: Optional[PassTimer] = None  # Adds up the timings and counts of every compilation given it
+    tracer: Optional[Tracer] = None
+    stats: Optional[Stats] = None      # Adds up the counts of every compilation given it
 
-    if os.path.exists("main.s"):
-        os.remove("main.s")
+@dataclass(slots=True)
+class CompileResult:
+    assembly: Optional[str]         # None if it was written to out or the compilation stopped
+    diagnostics: list               # Every error reported, as Diagnostics
+    stopped: Optional[str]          # The phase the errors stopped the compilation in
+    timings: dict                   # Seconds spent in each of PHASES, empty unless options has a timer
 
-    if os.path.exists("main"):
-        os.remove("main")
+    @property
+    def ok(self) -> bool:
+        return self.stopped is None
 
-    return f"Program exited with: {result.returncode}"
\ No newline at end of file
+PHASES = ("lex", "parse", "fold", "codegen")
+
+# For embedding the compiler: never prints, never touches the filesystem and never runs anything.
+# The assembly is returned, or written to out as it is generated, and errors come back as diagnostics
+# instead of being raised, a failure of the compiler itself too. The passes run as in emit_assembly
+# and give the same assembly; they are only timed if options has a timer, which streams less.
+def compile_to_assembly(text: str, options: Optional[CompileOptions] = None, out=None) -> CompileResult:
+    options = options or CompileOptions()
+    context = CompilationContext(options.tracer, options.stats)
+    timer = PassTimer() if options.timer else None
+    sink = io.StringIO() if out is None else out
+    internal = None
+    try:
+        emit_assembly(text, sink, options.functions, context, timer, options.engine, options.mode)
+    except ErrorManager.Stop:
+        pass
+    except Exception as e:  # Deep input in recursive mode, a bad option or a bug, never the caller's to catch
+        internal = Diagnostic(str(e), None, type(e).__name__)
+    if timer:
+        options.timer.add(timer)
+    diagnostics = [Diagnostic(message, line, type) for message, line, type in context.error.errors]
+    if internal:
+        diagnostics.append(internal)
+    stopped = "Internal compiler error" if internal else context.error.stopped
+    assembly = sink.getvalue() if out is None and stopped is None else None
+    return CompileResult(assembly, diagnostics, stopped, {name: timer.wall[name] for name in PHASES} if timer else {})
+
+def compile_assembly(text, cache: Optional[CompileCache] = None, path: str = "main.s", timer: Optional[PassTimer] = None,
+                     tracer: Optional[Tracer] = None, memory: Optional[MemoryReport] = None, stats: Optional[Stats] = None,
+                     parse_mode: str = "recursive"):
+    key = cache.key(text, "s") if cache else None
+    if cache and cache.fetch(key, path):
+        print("Assembly found in the compile cache...\n")
+        return
+    print("Undergoing lexical analysis, parsing, folding and code generation one function at a time...\n")
+    functions = FunctionCache(cache) if cache else None
+    try:
+        with open(path, "w") as file:
+            emit_assembly(text, file, functions, CompilationContext(tracer, stats), timer, mode=parse_mode, memory=memory)
+    except ErrorManager.Stop:
+        os.remove(path)
+        raise
+    if cache:
+        cache.store(key, path)
+        print(functions.report())
+
+# What compile() makes: run builds the program and runs it, the others stop at the assembly (s),
+# an object file (o) or the linked program (exe) and move it to output without running anything
+MODES = ("run", "s", "o", "exe")
+
+# Everything is built in a temporary directory of its own, so compilations running side by side never
+# share a file and nothing is left behind. With a cache, whatever mode asks for is reused if the same
+# source was built to it before, and the assembly is reused if only that is cached.
+# A timer is given the time of every pass, clang's and the program's included, see PassTimer,
+# a tracer records them as they happen, see Tracer, a memory report what they hold, see MemoryReport,
+# and stats count what they did, see Stats. Nothing is counted for a compilation found in the cache.
+# parse_mode is the parser's mode, see parser.MODES, not to be confused with mode
+def compile(text, cache: Optional[CompileCache] = None, mode: str = "run", output: Optional[str] = None,
+            timer: Optional[PassTimer] = None, tracer: Optional[Tracer] = None, memory: Optional[MemoryReport] = None,
+            stats: Optional[Stats] = None, parse_mode: str = "recursive"):
+    phase = passes(timer, tracer, memory)
+    if mode not in MODES:
+        raise ValueError(f"Unknown compile mode '{mode}', expected one of {MODES}")
+    if mode != "run" and output is None:
+        raise ValueError(f"Compile mode '{mode}' needs an output path")
+    with tempfile.TemporaryDirectory(prefix="compile-") as directory:
+        assembly = os.path.join(directory, "main.s")
+        if mode == "s":
+            compile_assembly(text, cache, assembly, timer, tracer, memory, stats, parse_mode)
+            shutil.move(assembly, output)
+            return f"Assembly written to {output}"
+
+        kind = "o" if mode == "o" else "exe"
+        name = "main.o" if kind == "o" else "main"
+        target = os.path.join(directory, name)
+        key = cache.key(text, kind) if cache else None
+        if cache and cache.fetch(key, target):
+            print(f"{'Object file' if kind == 'o' else 'Executable'} found in the compile cache...\n")
+        else:
+            compile_assembly(text, cache, assembly, timer, tracer, memory, stats, parse_mode)
+            flags = ["-c"] if kind == "o" else []
+            with phase("assemble"):
+                link = subprocess.run(["clang", *flags, "main.s", "-o", name], cwd=directory)
+            if link.returncode != 0 or not os.path.exists(target):
+                return f"clang exited with: {link.returncode}"
+            if cache:
+                cache.store(key, target)
+        if cache:
+            print(cache.report())
+
+        if mode == "run":
+            with phase("run"):
+                result = subprocess.run(["./main"], cwd=directory)
+            return f"Program exited with: {result.returncode}"
+        shutil.move(target, output)
+        return f"{'Object file' if kind == 'o' else 'Executable'} written to {output}"
@@ -0,0 +1,285 @@
+"""
+A flat home for a whole translation unit's AST, for batch compilation.
+Like the TokenBuffer, every node field gets its own typed array (kind, line, three children, value)
+and nodes refer to their children by index, so a node costs a couple of dozen bytes and the whole tree
+can be written out or read back in one copy of its arrays.
+Lists of nodes, such as the items of a block, are LIST entries whose children sit next to each other in items.
+Values that are not nodes are interned once in a table and a node just stores an index into it.
+
+Fold and CodeGenerator walk the arena through views. A view is a subclass of the node class that reads its
+fields straight out of the arrays, so the passes and the Visitor dispatch work on it unchanged. Views are made
+as the walk reaches them and nothing holds on to them, writing to a field writes the arrays.
+"""
+import pickle
+import struct
+from array import array
+from typing import Optional
+from core.data.nodes import *
+
+# For every node class, the fields kept as children and the fields packed into value
+LAYOUT = {
+    Program: (("init_vars", "uninit_vars", "funcs"), ()),
+    GlobalVar: (("id", "exp"), ("type", "init")),
+    Function: (("body",), ("name", "variables", "_return", "prototype", "key")),
+    Block: (("block_items",), ("symboltable",)),
+    Declare: (("id", "exp"), ("type",)),
+    Return: (("exp",), ()),
+    If: (("condition", "if_statement", "else_statement"), ()),
+    For: (("initial", "condition", "post_exp", "statement"), ("symboltable",)),
+    While: (("condition", "statement"), ()),
+    DoWhile: (("statement", "condition"), ()),
+    Break: ((), ()),
+    Continue: ((), ()),
+    ExpStatement: (("exp",), ()),
+    CommaExp: (("lhs", "rhs"), ()),
+    Assign: (("id", "exp"), ("type",)),
+    Conditional: (("condition", "if_statement", "else_statement"), ()),
+    OR: (("operand1", "operand2"), ()),
+    AND: (("operand1", "operand2"), ()),
+    Equality: (("operand1", "operand2"), ("operator",)),
+    Inequality: (("operand1", "operand2"), ("operator",)),
+    BitOR: (("operand1", "operand2"), ()),
+    BitXOR: (("operand1", "operand2"), ()),
+    BitAND: (("operand1", "operand2"), ()),
+    BitShift: (("value", "shift"), ("operator",)),
+    AddSub: (("operand1", "operand2"), ("operator",)),
+    MultDivMod: (("operand1", "operand2"), ("operator",)),
+    UnOp: (("operand",), ("operator",)),
+    IntLiteral: ((), ("value",)),
+    Decrement: ((), ("id", "prefix", "type")),
+    Increment: ((), ("id", "prefix", "type")),
+    Var: ((), ("id", "type")),
+    FunctionCall: (("param",), ("name",)),
+    Parenthesis: (("exp",), ()),
+}
+
+# Every node under node, node included, found through the children in LAYOUT.
+# Anything else in a child field, such as the 0 an uninitialised global holds, is skipped
+def walk(node):
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(reversed(node))
+            continue
+        layout = LAYOUT.get(VIEW_BASE.get(type(node), type(node)))
+        if layout is None:
+            continue
+        yield node
+        stack.extend(getattr(node, name) for name in reversed(layout[0]))
+
+# Kind codes index KINDS, 0 is a list of nodes
+LIST = 0
+KINDS = (list,) + tuple(LAYOUT)
+KIND_OF = {cls: kind for kind, cls in enumerate(KINDS)}
+# Kinds with more children than columns, these keep all their children in a LIST at child0
+PACKED = tuple(kind != LIST and len(LAYOUT[cls][0]) > 3 for kind, cls in enumerate(KINDS))
+NONE = -1   # Child index of a missing node
+
+# Written in front of the arrays by to_bytes: node count, item count, size of the value table
+HEADER = struct.Struct("<III")
+
+class Arena:
+    def __init__(self):
+        self.kinds = array('B')
+        self.lines = array('I')
+        self.child0 = array('i')
+        self.child1 = array('i')
+        self.child2 = array('i')
+        self.value_ids = array('I')  # 0 means the node has no value
+        self.items = array('i')      # Children of LIST entries
+        self.values = [None]
+        self.value_table = {}
+        self.children = (self.child0, self.child1, self.child2)
+        self.root = NONE
+
+    @classmethod
+    def from_program(cls, program: Program) -> "Arena":
+        arena = cls()
+        arena.root = arena.store(program)
+        return arena
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+    def intern(self, value) -> int:
+        if value is None:
+            return 0
+        key = (type(value), value)  # So True and 1 stay apart
+        try:
+            index = self.value_table.get(key)
+        except TypeError:   # Unhashable values such as lists are stored as they are
+            self.values.append(value)
+            return len(self.values) - 1
+        if index is None:
+            index = len(self.values)
+            self.values.append(value)
+            self.value_table[key] = index
+        return index
+
+    def add(self, kind: int, line: int = 0, child0: int = NONE, child1: int = NONE, child2: int = NONE, value_id: int = 0) -> int:
+        self.kinds.append(kind)
+        self.lines.append(line)
+        self.child0.append(child0)
+        self.child1.append(child1)
+        self.child2.append(child2)
+        self.value_ids.append(value_id)
+        return len(self.kinds) - 1
+
+    def add_list(self, indexes: list) -> int:
+        start = len(self.items)
+        self.items.extend(indexes)
+        return self.add(LIST, 0, start, len(indexes))
+
+    # Copies a node and everything below it into the arena and returns its index.
+    # Views of this arena are already in it, so they are just referred to.
+    def store(self, node) -> int:
+        if node is None:
+            return NONE
+        if isinstance(node, View) and node.arena is self:
+            return node.index
+        if isinstance(node, list):
+            return self.add_list([self.store(item) for item in node])
+        cls = VIEW_BASE.get(type(node), type(node))
+        children, scalars = LAYOUT[cls]
+        indexes = [self.store(getattr(node, name)) for name in children]
+        if len(indexes) > 3:
+            indexes = [self.add_list(indexes)]
+        indexes += [NONE] * (3 - len(indexes))
+        return self.add(KIND_OF[cls], getattr(node, "line", 0), *indexes, self.pack(node, scalars))
+
+    def pack(self, node, scalars: tuple) -> int:
+        if len(scalars) == 1:
+            return self.intern(getattr(node, scalars[0]))
+        return self.intern(tuple(getattr(node, name) for name in scalars)) if scalars else 0
+
+    # Returns a view of the node at index, a list of views for a LIST and None for a missing node
+    def load(self, index: int):
+        if index == NONE:
+            return None
+        kind = self.kinds[index]
+        if kind == LIST:
+            start = self.child0[index]
+            return [self.load(item) for item in self.items[start:start + self.child1[index]]]
+        view = VIEWS[kind].__new__(VIEWS[kind])
+        view.arena = self
+        view.index = index
+        return view
+
+    def program(self) -> Program:
+        return self.load(self.root)
+
+    # Builds ordinary node objects back out of the arena
+    def to_tree(self, index: Optional[int] = None):
+        if index is None:
+            index = self.root
+        if index == NONE:
+            return None
+        kind = self.kinds[index]
+        if kind == LIST:
+            start = self.child0[index]
+            return [self.to_tree(item) for item in self.items[start:start + self.child1[index]]]
+        cls = KINDS[kind]
+        children, scalars = LAYOUT[cls]
+        fields = {name: self.to_tree(self.child(index, slot)) for slot, name in enumerate(children)}
+        value = self.values[self.value_ids[index]]
+        if len(scalars) == 1:
+            fields[scalars[0]] = value
+        elif scalars:
+            fields.update(zip(scalars, value))
+        if issubclass(cls, Node):
+            fields["line"] = self.lines[index]
+        return cls(**fields)
+
+    def child(self, index: int, slot: int) -> int:
+        if PACKED[self.kinds[index]]:
+            return self.items[self.child0[self.child0[index]] + slot]
+        return self.children[slot][index]
+
+    def set_child(self, index: int, slot: int, child: int):
+        if PACKED[self.kinds[index]]:
+            self.items[self.child0[self.child0[index]] + slot] = child
+        else:
+            self.children[slot][index] = child
+
+    # The arrays go out as they are, only the value table is pickled
+    def to_bytes(self) -> bytes:
+        values = pickle.dumps(self.values)
+        return b"".join((
+            HEADER.pack(len(self.kinds), len(self.items), len(values)),
+            self.kinds.tobytes(), self.lines.tobytes(),
+            self.child0.tobytes(), self.child1.tobytes(), self.child2.tobytes(),
+            self.value_ids.tobytes(), self.items.tobytes(),
+            struct.pack("<i", self.root), values,
+        ))
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "Arena":
+        arena = cls()
+        nodes, items, values = HEADER.unpack_from(data)
+        view = memoryview(data)[HEADER.size:]
+        columns = [(column, nodes) for column in (arena.kinds, arena.lines, arena.child0, arena.child1, arena.child2, arena.value_ids)]
+        for column, count in columns + [(arena.items, items)]:
+            size = column.itemsize * count
+            column.frombytes(view[:size])
+            view = view[size:]
+        arena.root = struct.unpack_from("<i", view)[0]
+        arena.values = pickle.loads(view[4:4 + values])
+        for index, value in enumerate(arena.values[1:], 1):
+            try:
+                arena.value_table.setdefault((type(value), value), index)
+            except TypeError:
+                pass
+        return arena
+
+# Marks the view classes, which all share this layout
+class View:
+    __slots__ = ()
+
+def child_property(slot: int, packed: bool):
+    if packed:
+        def get(self):
+            return self.arena.load(self.arena.child(self.index, slot))
+    else:
+        def get(self):
+            return self.arena.load(self.arena.children[slot][self.index])
+    def set(self, node):
+        self.arena.set_child(self.index, slot, self.arena.store(node))
+    return property(get, set)
+
+def value_property(scalars: tuple, name: str):
+    if len(scalars) == 1:
+        def get(self):
+            return self.arena.values[self.arena.value_ids[self.index]]
+        def set(self, value):
+            self.arena.value_ids[self.index] = self.arena.intern(value)
+    else:
+        position = scalars.index(name)
+        def get(self):
+            return self.arena.values[self.arena.value_ids[self.index]][position]
+        def set(self, value):
+            packed = list(self.arena.values[self.arena.value_ids[self.index]])
+            packed[position] = value
+            self.arena.value_ids[self.index] = self.arena.intern(tuple(packed))
+    return property(get, set)
+
+def line_property():
+    def get(self):
+        return self.arena.lines[self.index]
+    def set(self, line):
+        self.arena.lines[self.index] = line
+    return property(get, set)
+
+def view_class(cls: type) -> type:
+    children, scalars = LAYOUT[cls]
+    namespace = {"__slots__": ("arena", "index"), "__qualname__": cls.__qualname__, "__module__": cls.__module__}
+    for slot, name in enumerate(children):
+        namespace[name] = child_property(slot, len(children) > 3)
+    for name in scalars:
+        namespace[name] = value_property(scalars, name)
+    if issubclass(cls, Node):
+        namespace["line"] = line_property()
+    return type(cls.__name__, (cls, View), namespace)
+
+VIEWS = (None,) + tuple(view_class(cls) for cls in LAYOUT)
+VIEW_BASE = {view: cls for view, cls in zip(VIEWS[1:], LAYOUT)}
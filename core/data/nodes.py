@@ -1,218 +1,203 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from types import GeneratorType
 from typing import Optional, Union
 from core.util.symbol_table import SymbolTable
 from core.data.token_types import TokenType
 
-# The dataclasses below represent the different types of nodes of the AST
+# The dataclasses below represent the different types of nodes of the AST.
+# They use slots so a node carries no per instance __dict__, which keeps large trees small.
 
-@dataclass
+# Base of every node that comes from a line of source. line is declared once here and is keyword
+# only, so it still comes last when a node is built and every node keeps its own field order.
+@dataclass(slots=True)
+class Node:
+    line: int = field(default=0, kw_only=True)
+
+@dataclass(slots=True)
 class Program:
     init_vars: list('GlobalVar')
     uninit_vars: list('GlobalVar')
     funcs: list('Function')
 
-@dataclass
-class GlobalVar:
+@dataclass(slots=True)
+class GlobalVar(Node):
     id: 'Var'
     type: TokenType
     exp: 'ExpStatement'
-    line: int
     init: bool
 
-@dataclass
+@dataclass(slots=True)
 class Function:
     name: str
     variables: list((TokenType, str))
     _return: TokenType
     prototype: bool
     body: Optional['Block'] = None
+    key: Optional[str] = None   # Set by the parser, see Parser.function_key
 
-@dataclass
+@dataclass(slots=True)
 class Block:
     block_items: list('BlockItem')
-    symboltable: SymbolTable
+    symboltable: Optional[SymbolTable]
 
-@dataclass
-class Declare:
+@dataclass(slots=True)
+class Declare(Node):
     id: 'Var'
     type: TokenType
     exp: 'ExpStatement'
-    line: int
 
-@dataclass
-class Return:
-    line: int
+@dataclass(slots=True)
+class Return(Node):
     exp: 'ExpStatement'
 
-@dataclass
+@dataclass(slots=True)
 class If:
     condition: 'Exp'
     if_statement: 'Statement'
     else_statement: Optional['Statement'] = None
 
-@dataclass
+@dataclass(slots=True)
 class For:
     initial: Union[Declare, 'ExpStatement']
     condition: 'Exp'
     post_exp: 'ExpStatement'
     statement: 'Statement'
-    symboltable: SymbolTable
+    symboltable: Optional[SymbolTable]
 
-@dataclass
+@dataclass(slots=True)
 class While:
     condition: 'Exp'
     statement: 'Statement'
 
-@dataclass
+@dataclass(slots=True)
 class DoWhile:
     statement: 'Statement'
     condition: 'Exp'
 
-@dataclass
-class Break:
-    line: int
+@dataclass(slots=True)
+class Break(Node):
+    pass
 
-@dataclass
-class Continue:
-    line: int
+@dataclass(slots=True)
+class Continue(Node):
+    pass
 
-@dataclass
-class ExpStatement:
-    line: int
+@dataclass(slots=True)
+class ExpStatement(Node):
     exp: Optional['Exp'] = None
 
-@dataclass
-class CommaExp:
+@dataclass(slots=True)
+class CommaExp(Node):
     lhs: 'Exp'
     rhs: 'Exp'
-    line: int
 
-@dataclass
-class Assign:
+@dataclass(slots=True)
+class Assign(Node):
     id: 'Var'
     exp: 'Exp'
-    line: int
     type: TokenType
 
-@dataclass 
-class Conditional:
+@dataclass(slots=True)
+class Conditional(Node):
     condition: 'Exp'
     if_statement: 'Exp'
     else_statement: 'Exp'
-    line: int
 
-@dataclass
-class OR:
+@dataclass(slots=True)
+class OR(Node):
     operator = TokenType.OR
     operand1: 'Exp'
     operand2: 'Exp'
-    line: int
 
-@dataclass
-class AND:
+@dataclass(slots=True)
+class AND(Node):
     operator = TokenType.AND
     operand1: 'Exp'
     operand2: 'Exp'
-    line: int
 
-@dataclass
-class Equality:
+@dataclass(slots=True)
+class Equality(Node):
     operator: TokenType
     operand1: 'Exp'
     operand2: 'Exp'
-    line: int
 
-@dataclass
-class Inequality:
+@dataclass(slots=True)
+class Inequality(Node):
     operator: TokenType
     operand1: 'Exp'
     operand2: 'Exp'
-    line: int
 
-@dataclass
-class BitOR:
+@dataclass(slots=True)
+class BitOR(Node):
     operator = TokenType.BIT_OR
     operand1: 'Exp'
     operand2: 'Exp'
-    line: int
 
-@dataclass
-class BitXOR:
+@dataclass(slots=True)
+class BitXOR(Node):
     operator = TokenType.BIT_XOR
     operand1: 'Exp'
     operand2: 'Exp'
-    line: int
 
-@dataclass
-class BitAND:
+@dataclass(slots=True)
+class BitAND(Node):
     operator = TokenType.BIT_AND
     operand1: 'Exp'
     operand2: 'Exp'
-    line: int
 
-@dataclass
-class BitShift:
+@dataclass(slots=True)
+class BitShift(Node):
     operator: TokenType
     value: 'Exp'
     shift: 'Exp'
-    line: int
 
-@dataclass
-class AddSub:
+@dataclass(slots=True)
+class AddSub(Node):
     operator: TokenType
     operand1: 'Exp'
     operand2: 'Exp'
-    line: int
 
 
-@dataclass
-class MultDivMod:
+@dataclass(slots=True)
+class MultDivMod(Node):
     operator: TokenType
     operand1: 'Exp'
     operand2: 'Exp'
-    line: int
 
-@dataclass
-class UnOp:
+@dataclass(slots=True)
+class UnOp(Node):
     operator: TokenType
     operand: 'Exp'
-    line: int
 
-@dataclass
-class IntLiteral:
+@dataclass(slots=True)
+class IntLiteral(Node):
     value: int
-    line: int
 
-@dataclass
-class Decrement:
+@dataclass(slots=True)
+class Decrement(Node):
     id: str
     prefix: bool
-    line: int
     type: TokenType
 
-@dataclass
-class Increment:
+@dataclass(slots=True)
+class Increment(Node):
     id: str
     prefix: bool
-    line: int
     type: TokenType
 
-@dataclass
-class Var:
+@dataclass(slots=True)
+class Var(Node):
     id: str
-    line: int
     type: TokenType
 
-@dataclass
-class FunctionCall:
+@dataclass(slots=True)
+class FunctionCall(Node):
     name: str
-    param: Optional[list('Exp')]
-    line: int
+    param: Optional[list['Exp']]
 
-@dataclass
-class Parenthesis:
+@dataclass(slots=True)
+class Parenthesis(Node):
     exp: 'Exp'
-    line: int
 
 
 
@@ -231,4 +216,69 @@ Statement = Union[Return, Declare, Exp, Block, ExpStatement, If, For, While, DoW
 
 BlockItem = Union[Statement, Declare]
 
-Top = Union[GlobalVar, Function]
\ No newline at end of file
+Top = Union[GlobalVar, Function]
+
+# Marks a Visitor method as the one to call for the given node classes
+def visits(*node_types):
+    def register(method):
+        method.visits = node_types
+        return method
+    return register
+
+# Base for the passes over the AST. visit() looks up the method registered with @visits for the
+# class of the node once and caches it by type(node), so each node costs one dict lookup instead
+# of a chain of isinstance checks. Node classes without a method go to generic_visit.
+# A method with children to visit may be a generator, where `value = yield child` visits child and
+# is sent back what that returned. visit() keeps those generators on a list, as Parser.run_stack
+# does, so however deeply the tree nests it costs heap memory instead of Python stack frames.
+# Any method that returns something other than a generator is done with its node there and then.
+class Visitor:
+    handlers = {}
+    dispatch = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # Handlers are stored by name so a subclass can override a method without registering it again
+        cls.handlers = dict(cls.handlers)
+        for name, attr in vars(cls).items():
+            for node_type in getattr(attr, "visits", ()):
+                cls.handlers[node_type] = name
+        cls.dispatch = {}
+
+    def visit(self, node):
+        dispatch, resolve = self.dispatch, self.resolve
+        value = (dispatch.get(type(node)) or resolve(type(node)))(self, node)
+        if type(value) is not GeneratorType:
+            return value
+        stack = [value]
+        push, pop = stack.append, stack.pop
+        send = value.send
+        value = None
+        while True:
+            try:
+                child = send(value)
+            except StopIteration as done:
+                pop()
+                if not stack:
+                    return done.value
+                send = stack[-1].send
+                value = done.value
+                continue
+            value = (dispatch.get(type(child)) or resolve(type(child)))(self, child)
+            if type(value) is GeneratorType:
+                push(value)
+                send = value.send
+                value = None
+
+    @classmethod
+    def resolve(cls, node_type: type):
+        method = cls.generic_visit
+        for base in node_type.__mro__:
+            if base in cls.handlers:
+                method = getattr(cls, cls.handlers[base])
+                break
+        cls.dispatch[node_type] = method
+        return method
+
+    def generic_visit(self, node):
+        raise TypeError(f"{type(self).__name__} has no method for {type(node).__name__}")
@@ -0,0 +1,170 @@
+"""
+A compact home for the token stream.
+Instead of one Token object per token, every field gets its own typed array (struct of arrays),
+so a token costs a handful of bytes rather than a whole Python object.
+Values are kept once in an interned table and tokens just store an index into it.
+"""
+import hashlib
+from array import array
+from typing import Optional
+from core.data.token_types import TokenType, Token
+
+# Type codes are the enum values, TYPES turns a code back into the TokenType
+TYPES = (None,) + tuple(TokenType)
+ID = TokenType.ID.value
+
+class TokenBuffer:
+    base = 0    # Absolute index of the first token held, only a TokenStream drops tokens
+
+    def __init__(self, source: Optional[str] = None):
+        self.source = source
+        self.types = array('H')
+        self.lines = array('I')
+        self.starts = array('I')
+        self.ends = array('I')
+        self.value_ids = array('I')  # 0 means the token has no value
+        self.values = [None]
+        self.value_table = {}
+
+    @classmethod
+    def from_tokens(cls, tokens, source: Optional[str] = None) -> "TokenBuffer":
+        buffer = cls(source)
+        buffer.extend(tokens)
+        return buffer
+
+    def intern(self, value: Optional[str]) -> int:
+        if value is None:
+            return 0
+        index = self.value_table.get(value)
+        if index is None:
+            index = len(self.values)
+            self.values.append(value)
+            self.value_table[value] = index
+        return index
+
+    # A token's value is cut out of the source here and interned in the value table, without going
+    # through Token.value, so the token never builds and keeps a value of its own
+    def append(self, tok: Token):
+        source = tok.source
+        if self.source is None and source is not None:
+            self.source = source
+        value = tok._value
+        if value is None and source is not None:
+            value = source[tok.start:tok.end]
+        self.types.append(tok.type.value)
+        self.lines.append(tok.line)
+        self.starts.append(tok.start)
+        self.ends.append(tok.end)
+        self.value_ids.append(self.intern(value))
+
+    def extend(self, tokens):
+        for tok in tokens:
+            self.append(tok)
+
+    def __len__(self) -> int:
+        return len(self.types)
+
+    def has(self, i: int) -> bool:
+        return i < len(self)
+
+    # A full buffer keeps every token, see TokenStream
+    def release(self, upto: int):
+        pass
+
+    # Accessors used by the parser, these never build a Token
+    def type_at(self, i: int) -> TokenType:
+        return TYPES[self.types[i]]
+
+    def line_at(self, i: int) -> int:
+        return self.lines[i]
+
+    def value_at(self, i: int) -> Optional[str]:
+        return self.values[self.value_ids[i]]
+
+    # Hash of the tokens from start up to end. Lines count from the first token,
+    # so tokens that only moved keep their hash
+    def fingerprint(self, start: int, end: int):
+        start, end = start - self.base, end - self.base
+        first_line = self.lines[start]
+        digest = hashlib.sha256(self.types[start:end].tobytes())
+        digest.update(array('I', [line - first_line for line in self.lines[start:end]]).tobytes())
+        digest.update("\0".join([self.values[v] for v in self.value_ids[start:end] if v]).encode())
+        return digest
+
+    # Names of the identifiers from start up to end
+    def ids_in(self, start: int, end: int) -> set:
+        start, end = start - self.base, end - self.base
+        return {self.values[v] for t, v in zip(self.types[start:end], self.value_ids[start:end]) if t == ID}
+
+    # Builds a Token on demand, for code that still wants the object
+    def __getitem__(self, i: int) -> Token:
+        value_id = self.value_ids[i]
+        tok = Token(TYPES[self.types[i]], self.lines[i], self.starts[i], self.ends[i], self.source if value_id else None)
+        tok._value = self.values[value_id]
+        return tok
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+# A TokenBuffer filled lazily from a token iterator, so a translation unit can be parsed one
+# top level item at a time. Indexes stay absolute, release() drops the tokens before an index
+# once the parser is done with them, so only the tokens of the current item are held.
+class TokenStream(TokenBuffer):
+    def __init__(self, tokens, source: Optional[str] = None):
+        super().__init__(source)
+        self.stream = iter(tokens)
+        self.base = 0  # absolute index of the first token still held
+        self.done = False
+
+    # Pulls tokens until index i is held, False if the stream ends first
+    def fill(self, i: int) -> bool:
+        while i >= self.base + len(self.types):
+            if self.done:
+                return False
+            tok = next(self.stream, None)
+            if tok is None:
+                self.done = True
+                return False
+            self.append(tok)
+        return True
+
+    # Negative indexes count back from the last token read so far
+    def slot(self, i: int) -> int:
+        if i < 0:
+            return i
+        if not self.fill(i):
+            raise IndexError(i)
+        return i - self.base
+
+    def __len__(self) -> int:
+        return self.base + len(self.types)
+
+    def has(self, i: int) -> bool:
+        return self.fill(i)
+
+    def release(self, upto: int):
+        drop = upto - self.base
+        if drop <= 0:
+            return
+        for column in (self.types, self.lines, self.starts, self.ends, self.value_ids):
+            del column[:drop]
+        self.base = upto
+        # Start a new value table holding only what the remaining tokens use
+        values, ids = self.values, self.value_ids
+        self.values = [None]
+        self.value_table = {}
+        self.value_ids = array('I', (self.intern(values[v]) for v in ids))
+
+    def type_at(self, i: int) -> TokenType:
+        return TYPES[self.types[self.slot(i)]]
+
+    def line_at(self, i: int) -> int:
+        return self.lines[self.slot(i)]
+
+    def value_at(self, i: int) -> Optional[str]:
+        return self.values[self.value_ids[self.slot(i)]]
+
+    def __getitem__(self, i: int) -> Token:
+        return super().__getitem__(self.slot(i))
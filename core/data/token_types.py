@@ -1,6 +1,7 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from enum import Enum, auto
 from typing import Optional
+import sys
 
 # TokenType class stores all the available token types
 class TokenType(Enum):
@@ -79,8 +80,20 @@ class TokenType(Enum):
     ERROR = auto()
 
 # Token dataclass defines what is in each token, like a struct in C
-@dataclass
+# Tokens that carry a value (ids and literals) only remember where it sits in the source,
+# the text is cut out the first time something asks for it
+@dataclass(slots=True)
 class Token:
     type: TokenType
     line: int
-    value: Optional[str] = None
\ No newline at end of file
+    start: int = 0
+    end: int = 0
+    source: Optional[str] = field(default=None, repr=False, compare=False)
+    _value: Optional[str] = field(default=None, init=False, repr=False, compare=False)
+
+    @property
+    def value(self) -> Optional[str]:
+        if self._value is None and self.source is not None:
+            text = self.source[self.start:self.end]
+            self._value = sys.intern(text) if self.type == TokenType.ID else text
+        return self._value
\ No newline at end of file
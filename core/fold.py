@@ -1,9 +1,45 @@
 from core.data.nodes import *
-
-# Evaluates constant expressions
-class Fold:
-    def __init__(self, prog_node):
+from core.util.context import CompilationContext
+from core.data.arena import walk
+
+# How each operator is evaluated when both of its operands are constant
+FOLD_OPERATORS = {
+    TokenType.OR: lambda a, b: int(a != 0 or b != 0),
+    TokenType.AND: lambda a, b: int(a != 0 and b != 0),
+    TokenType.EQUAL: lambda a, b: int(a == b),
+    TokenType.NOT_EQUAL: lambda a, b: int(a != b),
+    TokenType.GREATER_THAN: lambda a, b: int(a > b),
+    TokenType.GREATER_THAN_OR_EQUAL: lambda a, b: int(a >= b),
+    TokenType.LESS_THAN: lambda a, b: int(a < b),
+    TokenType.LESS_THAN_OR_EQUAL: lambda a, b: int(a <= b),
+    TokenType.BIT_OR: lambda a, b: a | b,
+    TokenType.BIT_XOR: lambda a, b: a ^ b,
+    TokenType.BIT_AND: lambda a, b: a & b,
+    TokenType.BIT_SHIFT_LEFT: lambda a, b: a << b,
+    TokenType.BIT_SHIFT_RIGHT: lambda a, b: a >> b,
+    TokenType.ADDITION: lambda a, b: a + b,
+    TokenType.SUBTRACTION: lambda a, b: a - b,
+    TokenType.MULTIPLICATION: lambda a, b: a * b,
+    TokenType.DIVISION: lambda a, b: a // b,
+    TokenType.MODULO: lambda a, b: a % b,
+}
+
+UNARY_FOLD_OPERATORS = {
+    TokenType.BIT_COMP: lambda a: ~a,
+    TokenType.SUBTRACTION: lambda a: -a,
+    TokenType.LOGICAL_NEGATION: lambda a: int(a == 0),
+}
+
+def count_nodes(node) -> int:
+    return sum(1 for _ in walk(node))
+
+# Evaluates constant expressions.
+# Methods with children are generators that yield each child to be folded, see Visitor, so a deeply
+# nested expression or a long else if chain folds without running out of Python stack
+class Fold(Visitor):
+    def __init__(self, prog_node: Program = None, *, context: CompilationContext):
         self.prog_node = prog_node
+        self.context = context
 
     def start_fold(self):
         new_inits = []
@@ -18,57 +54,61 @@ class Fold:
         self.prog_node.funcs = new_funcs
         return self.prog_node
 
+    # Folds a single function or global variable, for compiling one item at a time
+    def fold_top(self, top):
+        if isinstance(top, Function):
+            return self.fold_func(top)
+        if top.init:
+            return self.fold_glb_var(top)
+        return top
+
     def fold_func(self, func):
-        func.body = self.fold_block(func.body)
+        tracer = self.context.tracer
+        if tracer is None:
+            func.body = self.visit(func.body)
+            return func
+        with tracer.span(func.name, "fold", {"nodes": count_nodes(func)}) as end:
+            func.body = self.visit(func.body)
+            end["nodes"] = count_nodes(func)
         return func
 
     def fold_glb_var(self, var):
-        new_exp = self.fold_exp(var.exp)
+        new_exp = self.visit(var.exp)
         var.exp = new_exp
         return var
 
+    # Anything without a method of its own, such as a missing expression, folds to nothing
+    def generic_visit(self, node):
+        return None
+
+    @visits(Block)
     def fold_block(self, block):
         items = []
         for itm in block.block_items:
-            itm = self.fold_statement(itm)
+            itm = yield itm
             if itm:
                 items.append(itm)
         block.block_items = items
         return block
 
-    def fold_statement(self, stm):
-        if isinstance(stm, Declare):
-             return self.fold_declare(stm)
-        elif isinstance(stm, Return):
-            return self.fold_return(stm)
-        elif isinstance(stm, If):
-            return self.fold_if(stm)
-        elif isinstance(stm, For):
-            return self.fold_for(stm)
-        elif isinstance(stm, While) or isinstance(stm, DoWhile):
-            return self.fold_while(stm)
-        elif isinstance(stm, ExpStatement):
-            return self.fold_exp_statement(stm)
-        elif isinstance(stm, Block):
-            return self.fold_block(stm)
-        elif isinstance(stm, Continue) or isinstance(stm, Break):
-            return stm
-
+    @visits(Declare)
     def fold_declare(self, decl):
-        new_exp = self.fold_exp(decl.exp)
+        new_exp = yield decl.exp
         decl.exp = new_exp
         return decl
 
+    @visits(Return)
     def fold_return(self, ret):
-        new_exp = self.fold_exp(ret.exp)
+        new_exp = yield ret.exp
         ret.exp = new_exp
         return ret
 
+    @visits(If)
     def fold_if(self, _if):
-        new_cond = self.fold_exp(_if.condition)
-        new_if = self.fold_statement(_if.if_statement)
+        new_cond = yield _if.condition
+        new_if = yield _if.if_statement
         if _if.else_statement:
-            new_else = self.fold_statement(_if.else_statement)
+            new_else = yield _if.else_statement
         if isinstance(new_cond, IntLiteral):
             if new_cond.value != 0:
                 return new_if
@@ -83,238 +123,96 @@ class Fold:
             _if.else_statement = new_else if _if.else_statement else None
             return _if
 
+    @visits(For)
     def fold_for(self, _for):
-        new_init = self.fold_statement(_for.initial)
-        new_cond = self.fold_exp_statement(_for.condition)
-        new_post = self.fold_exp_statement(_for.post_exp)
-        new_stm = self.fold_statement(_for.statement)
+        new_init = yield _for.initial
+        new_cond = yield from self.fold_exp_statement(_for.condition)
+        new_post = yield from self.fold_exp_statement(_for.post_exp)
+        new_stm = yield _for.statement
         _for.initial = new_init
         _for.condition = new_cond
         _for.post_exp = new_post
         _for.statement = new_stm
         return _for
 
+    @visits(While, DoWhile)
     def fold_while(self, _while):
-        new_cond = self.fold_exp(_while.condition)
-        new_stm = self.fold_statement(_while.statement)
+        new_cond = yield _while.condition
+        new_stm = yield _while.statement
         _while.condition = new_cond
         _while.statement = new_stm
         return _while
 
+    @visits(ExpStatement)
     def fold_exp_statement(self, exp):
         if exp.exp:
-            new_exp = self.fold_exp(exp.exp)
+            new_exp = yield exp.exp
             exp.exp = new_exp
         return exp
 
-    def fold_exp(self, exp):
-        # Lowest level, can't fold more
-        if (
-            isinstance(exp, IntLiteral) or isinstance(exp, Var)
-            or isinstance(exp, Increment) or isinstance(exp, Decrement)
-            or isinstance(exp, FunctionCall)
-        ):
-            return exp
-        # Fold the rest
-        elif isinstance(exp, CommaExp):
-            new_left = self.fold_exp(exp.lhs)
-            new_right = self.fold_exp(exp.rhs)
-            exp.lhs = new_left
-            exp.rhs = new_right
-            return exp
-
-        elif isinstance(exp, Assign):
-            new_exp = self.fold_exp(exp.exp)
-            exp.exp = new_exp
-            return exp
-
-        elif isinstance(exp, Conditional):
-            new_cond = self.fold_exp(exp.cond)
-            new_if = self.fold_exp(exp.if_statement)
-            new_else = self.fold_exp(exp.else_statement)
-            if isinstance(new_cond, IntLiteral):
-                if new_cond.value != 0:
-                    return new_if
-                else:
-                    return new_else
-            else:
-                exp.condition = new_cond
-                exp.if_statement = new_if
-                exp.else_statement = new_else
-                return exp
-
-        elif isinstance(exp, OR):
-            new_op1 = self.fold_exp(exp.operand1)
-            new_op2 = self.fold_exp(exp.operand2)
-            if isinstance(new_op1, IntLiteral) and isinstance(new_op2, IntLiteral):
-                if new_op1.value != 0 or new_op2.value != 0:
-                    return IntLiteral(value=1, line=exp.line)
-                else:
-                    return IntLiteral(value=0, line=exp.line)
-            else:
-                exp.operand1 = new_op1
-                exp.operand2 = new_op2
-                return exp
-
-        elif isinstance(exp, AND):
-            new_op1 = self.fold_exp(exp.operand1)
-            new_op2 = self.fold_exp(exp.operand2)
-            if isinstance(new_op1, IntLiteral) and isinstance(new_op2, IntLiteral):
-                if new_op1.value != 0 and new_op2.value != 0:
-                    return IntLiteral(value=1, line=exp.line)
-                else:
-                    return IntLiteral(value=0, line=exp.line)
-            else:
-                exp.operand1 = new_op1
-                exp.operand2 = new_op2
-                return exp
-
-        elif isinstance(exp, Equality):
-            new_op1 = self.fold_exp(exp.operand1)
-            new_op2 = self.fold_exp(exp.operand2)
-            if isinstance(new_op1, IntLiteral) and isinstance(new_op2, IntLiteral):
-                if exp.operator == TokenType.EQUAL:
-                    if new_op1.value == new_op2.value:
-                        return IntLiteral(value=1, line=exp.line)
-                    else:
-                        return IntLiteral(value=0, line=exp.line)
-                elif exp.operator == TokenType.NOT_EQUAL:
-                    if new_op1.value != new_op2.value:
-                        return IntLiteral(value=1, line=exp.line)
-                    else:
-                        return IntLiteral(value=0, line=exp.line)
-            else:
-                exp.operand1 = new_op1
-                exp.operand2 = new_op2
-                return exp
-
-        elif isinstance(exp, Inequality):
-            new_op1 = self.fold_exp(exp.operand1)
-            new_op2 = self.fold_exp(exp.operand2)
-            if isinstance(new_op1, IntLiteral) and isinstance(new_op2, IntLiteral):
-                if exp.operator == TokenType.GREATER_THAN:
-                    if new_op1.value > new_op2.value:
-                        return IntLiteral(value=1, line=exp.line)
-                    else:
-                        return IntLiteral(value=0, line=exp.line)
-                elif exp.operator == TokenType.GREATER_THAN_OR_EQUAL:
-                    if new_op1.value >= new_op2.value:
-                        return IntLiteral(value=1, line=exp.line)
-                    else:
-                        return IntLiteral(value=0, line=exp.line)
-                elif exp.operator == TokenType.LESS_THAN:
-                    if new_op1.value < new_op2.value:
-                        return IntLiteral(value=1, line=exp.line)
-                    else:
-                        return IntLiteral(value=0, line=exp.line)
-                elif exp.operator == TokenType.LESS_THAN_OR_EQUAL:
-                    if new_op1.value <= new_op2.value:
-                        return IntLiteral(value=1, line=exp.line)
-                    else:
-                        return IntLiteral(value=0, line=exp.line)
-            else:
-                exp.operand1 = new_op1
-                exp.operand2 = new_op2
-                return exp
-
-        elif isinstance(exp, BitOR):
-            new_op1 = self.fold_exp(exp.operand1)
-            new_op2 = self.fold_exp(exp.operand2)
-            if isinstance(new_op1, IntLiteral) and isinstance(new_op2, IntLiteral):
-                value = new_op1.value | new_op2.value
-                return IntLiteral(value=value, line=exp.line)
-            else:
-                exp.operand1 = new_op1
-                exp.operand2 = new_op2
-                return exp
+    # Lowest level, can't fold more
+    @visits(IntLiteral, Var, Increment, Decrement, FunctionCall, Continue, Break)
+    def fold_leaf(self, exp):
+        return exp
 
-        elif isinstance(exp, BitXOR):
-            new_op1 = self.fold_exp(exp.operand1)
-            new_op2 = self.fold_exp(exp.operand2)
-            if isinstance(new_op1, IntLiteral) and isinstance(new_op2, IntLiteral):
-                value = new_op1.value ^ new_op2.value
-                return IntLiteral(value=value, line=exp.line)
-            else:
-                exp.operand1 = new_op1
-                exp.operand2 = new_op2
-                return exp
+    @visits(CommaExp)
+    def fold_comma(self, exp):
+        exp.lhs = yield exp.lhs
+        exp.rhs = yield exp.rhs
+        return exp
 
-        elif isinstance(exp, BitAND):
-            new_op1 = self.fold_exp(exp.operand1)
-            new_op2 = self.fold_exp(exp.operand2)
-            if isinstance(new_op1, IntLiteral) and isinstance(new_op2, IntLiteral):
-                value = new_op1.value & new_op2.value
-                return IntLiteral(value=value, line=exp.line)
-            else:
-                exp.operand1 = new_op1
-                exp.operand2 = new_op2
-                return exp
+    @visits(Assign)
+    def fold_assign(self, exp):
+        exp.exp = yield exp.exp
+        return exp
 
-        elif isinstance(exp, BitShift):
-            new_val = self.fold_exp(exp.operand1)
-            new_shift = self.fold_exp(exp.operand2)
-            if isinstance(new_val, IntLiteral) and isinstance(new_shift, IntLiteral):
-                if exp.operator == TokenType.BIT_SHIFT_LEFT:
-                    value = new_val.value << new_shift.value
-                    return IntLiteral(value=value, line=exp.line)
-                elif exp.operator == TokenType.BIT_SHIFT_RIGHT:
-                    value = new_val.value >> new_shift.value
-                    return IntLiteral(value=value, line=exp.line)
+    @visits(Conditional)
+    def fold_conditional(self, exp):
+        new_cond = yield exp.condition
+        new_if = yield exp.if_statement
+        new_else = yield exp.else_statement
+        if isinstance(new_cond, IntLiteral):
+            if new_cond.value != 0:
+                return new_if
             else:
-                exp.operand1 = new_val
-                exp.operand2 = new_shift
-                return exp
+                return new_else
+        else:
+            exp.condition = new_cond
+            exp.if_statement = new_if
+            exp.else_statement = new_else
+            return exp
 
-        elif isinstance(exp, AddSub):
-            new_op1 = self.fold_exp(exp.operand1)
-            new_op2 = self.fold_exp(exp.operand2)
-            if isinstance(new_op1, IntLiteral) and isinstance(new_op2, IntLiteral):
-                if exp.operator == TokenType.ADDITION:
-                    value = new_op1.value + new_op2.value
-                    return IntLiteral(value=value, line=exp.line)
-                elif exp.operator == TokenType.SUBTRACTION:
-                    value = new_op1.value - new_op2.value
-                    return IntLiteral(value=value, line=exp.line)
-            else:
-                exp.operand1 = new_op1
-                exp.operand2 = new_op2
-                return exp
+    @visits(OR, AND, Equality, Inequality, BitOR, BitXOR, BitAND, AddSub, MultDivMod)
+    def fold_binary(self, exp):
+        new_op1 = yield exp.operand1
+        new_op2 = yield exp.operand2
+        if isinstance(new_op1, IntLiteral) and isinstance(new_op2, IntLiteral):
+            value = FOLD_OPERATORS[exp.operator](new_op1.value, new_op2.value)
+            return IntLiteral(value=value, line=exp.line)
+        exp.operand1 = new_op1
+        exp.operand2 = new_op2
+        return exp
 
-        elif isinstance(exp, MultDivMod):
-            new_op1 = self.fold_exp(exp.operand1)
-            new_op2 = self.fold_exp(exp.operand2)
-            if isinstance(new_op1, IntLiteral) and isinstance(new_op2, IntLiteral):
-                if exp.operator == TokenType.MULTIPLICATION:
-                    value = new_op1.value * new_op2.value
-                    return IntLiteral(value=value, line=exp.line)
-                elif exp.operator == TokenType.DIVISION:
-                    value = new_op1.value // new_op2.value
-                    return IntLiteral(value=value, line=exp.line)
-                elif exp.operator == TokenType.MODULO:
-                    value = new_op1.value % new_op2.value
-                    return IntLiteral(value=value, line=exp.line)
-            else:
-                exp.operand1 = new_op1
-                exp.operand2 = new_op2
-                return exp
+    @visits(BitShift)
+    def fold_shift(self, exp):
+        new_val = yield exp.value
+        new_shift = yield exp.shift
+        if isinstance(new_val, IntLiteral) and isinstance(new_shift, IntLiteral):
+            value = FOLD_OPERATORS[exp.operator](new_val.value, new_shift.value)
+            return IntLiteral(value=value, line=exp.line)
+        exp.value = new_val
+        exp.shift = new_shift
+        return exp
 
-        elif isinstance(exp, UnOp):
-            new_op = self.fold_exp(exp.operand)
-            if isinstance(new_op, IntLiteral):
-                if exp.operator == TokenType.BITCOMP:
-                    value = ~new_op.value
-                    return IntLiteral(value=value, line=exp.line)
-                elif exp.operator == TokenType.SUBTRACTION:
-                    value = -new_op.value
-                    return IntLiteral(value=value, line=exp.line)
-                elif exp.operator == TokenType.LOGICAL_NEGATION:
-                    if new_op.value != 0:
-                        return IntLiteral(value=0, line=exp.line)
-                    else:
-                        return IntLiteral(value=1, line=exp.line)
-            else:
-                exp.operand = new_op
-                return exp
+    @visits(UnOp)
+    def fold_unop(self, exp):
+        new_op = yield exp.operand
+        if isinstance(new_op, IntLiteral):
+            value = UNARY_FOLD_OPERATORS[exp.operator](new_op.value)
+            return IntLiteral(value=value, line=exp.line)
+        exp.operand = new_op
+        return exp
 
-        elif isinstance(exp, Parenthesis):
-            return self.fold_exp(exp.exp)
\ No newline at end of file
+    @visits(Parenthesis)
+    def fold_parenthesis(self, exp):
+        return (yield exp.exp)
@@ -6,37 +6,123 @@ Types can be stores in an enum class which basically numbers each type to make t
 The tokens are stored in a dataclass.
 """
 from core.data.token_types import *
-from core.util.error import error
+from core.data.token_buffer import TokenBuffer, TokenStream
+from core.util.context import CompilationContext
 from typing import Optional
+import re
+from itertools import accumulate, compress, islice, repeat
+from operator import mul, sub
+
+# A dict is used here to differentiate keywords from ID 
+KEYWORDS = {
+    "int": TokenType.INT,
+    "char": TokenType.CHAR,
+    "float": TokenType.FLOAT,
+    "void": TokenType.VOID,
+    "return": TokenType.RETURN,
+    "if": TokenType.IF,
+    "else": TokenType.ELSE,
+    "for": TokenType.FOR,
+    "while": TokenType.WHILE,
+    "do": TokenType.DO,
+    "break": TokenType.BREAK,
+    "continue": TokenType.CONTINUE
+}
+
+# Spelling of every operator and delimiter the lexer understands
+OPERATORS = {
+    "{": TokenType.OPEN_BRACE, "}": TokenType.CLOSE_BRACE,
+    "(": TokenType.OPEN_PARENTHESIS, ")": TokenType.CLOSE_PARENTHESIS,
+    ";": TokenType.SEMICOLON, ":": TokenType.COLON, ",": TokenType.COMMA,
+    "?": TokenType.QUESTION_MARK, "~": TokenType.BIT_COMP, ".": TokenType.DOT,
+    "+": TokenType.ADDITION, "++": TokenType.INCREMENT, "+=": TokenType.ASSIGN_ADD,
+    "-": TokenType.SUBTRACTION, "--": TokenType.DECREMENT, "-=": TokenType.ASSIGN_SUB,
+    "*": TokenType.MULTIPLICATION, "*=": TokenType.ASSIGN_MULT,
+    "/": TokenType.DIVISION, "/=": TokenType.ASSIGN_DIV,
+    "%": TokenType.MODULO, "%=": TokenType.ASSIGN_MOD,
+    "=": TokenType.ASSIGNMENT, "==": TokenType.EQUAL,
+    "!": TokenType.LOGICAL_NEGATION, "!=": TokenType.NOT_EQUAL,
+    "<": TokenType.LESS_THAN, "<=": TokenType.LESS_THAN_OR_EQUAL,
+    "<<": TokenType.BIT_SHIFT_LEFT, "<<=": TokenType.ASSIGN_LEFT_SHIFT,
+    ">": TokenType.GREATER_THAN, ">=": TokenType.GREATER_THAN_OR_EQUAL,
+    ">>": TokenType.BIT_SHIFT_RIGHT, ">>=": TokenType.ASSIGN_RIGHT_SHIFT,
+    "&": TokenType.BIT_AND, "&&": TokenType.AND, "&=": TokenType.ASSIGN_BIT_AND,
+    "|": TokenType.BIT_OR, "||": TokenType.OR, "|=": TokenType.ASSIGN_BIT_OR,
+    "^": TokenType.BIT_XOR, "^=": TokenType.ASSIGN_BIT_XOR,
+}
+
+WHITESPACE = {' ', '\t', '\r', '\n', '\f', '\v'}
+PUNCTUATION = {
+    '!', '%', '^', '&', '*', '(', ')', '-', '+', '=',
+    '[', ']', '{', '}', '|', '\\', ';', ':', "'", '"',
+    '<', '>', ',', '.', '/', '?'
+}
+
+# Builds one master regex for the "regex" engine, each alternative is a named group.
+# Operators are sorted longest first so that '<<=' wins over '<<' and '<'.
+# Whitespace has no group, finditer simply skips over anything that does not match.
+# Comments must come before the operators so '//' and '/*' are not read as division.
+def build_pattern() -> re.Pattern:
+    delimiters = re.escape("".join(sorted(WHITESPACE | PUNCTUATION)))
+    operators = "|".join(re.escape(op) for op in sorted(OPERATORS, key=len, reverse=True))
+    return re.compile("|".join([
+        rf"(?P<ID>[^\W\d_]\w*)(?P<ID_TAIL>[^{delimiters}]+)?",
+        rf"(?P<NUMBER>\d+(?:\.\d+)?)(?P<NUMBER_TAIL>(?:[^{delimiters}]|\.)+)?",
+        r"(?P<LINE_COMMENT>//[^\n]*)",
+        r"(?P<BLOCK_COMMENT>/\*[\s\S]*?\*/)",
+        r"(?P<OPEN_COMMENT>/\*[\s\S]*)",
+        rf"(?P<OPERATOR>{operators})",
+        r'(?P<STRING>"[^\W_]*)(?P<STRING_END>[^\n])?',
+        rf"(?P<INVALID>[^ \t\r\n\f\v][^{delimiters}]*)",
+    ]))
+
+TOKEN_PATTERN = build_pattern()
+ENGINES = ("scan", "regex")
+
+# The "regex" engine's pattern for a whole TokenBuffer. Each match is one lexeme together with the
+# whitespace in front of it, and has no groups, so findall hands back plain strings instead of a
+# Match per token. A name or number runs on over any ill-formed tail and '/*' without its '*/' is a
+# lexeme of its own, the catch-all takes stray characters and strings with no end on their line.
+# Lexemes like those have no token of their own here, their line is lexed by iter_regex_tokens,
+# see Lexer.regex_buffer. A string ends with the character after its run of letters and digits,
+# as STRING_END takes it in TOKEN_PATTERN, the lookahead keeps the run from giving one back.
+def build_lexeme_pattern() -> re.Pattern:
+    delimiters = re.escape("".join(sorted(WHITESPACE | PUNCTUATION)))
+    operators = "|".join(re.escape(op) for op in sorted(OPERATORS, key=len, reverse=True))
+    return re.compile(r"[ \t\r\n\f\v]*(?:" + "|".join([
+        rf"[^\W\d_][^{delimiters}]*",
+        rf"\d(?:[^{delimiters}]|\.)*",
+        r"//[^\n]*",
+        r"/\*[\s\S]*?\*/",
+        r"/\*",
+        operators,
+        r'"[^\W_]*(?![^\W_])[^\n]',
+        r"[^ \t\r\n\f\v]",
+    ]) + ")")
+
+LEXEME_PATTERN = build_lexeme_pattern()
+NAME_PATTERN = re.compile(r"[^\W\d_]\w*")
+NUMBER_PATTERN = re.compile(r"\d+(?:\.\d+)?")
+# regex_buffer finds lexemes this many characters at a time, rounded up to a whole line, so a line
+# lexed a token at a time only costs the rest of its chunk
+REGEX_CHUNK = 1 << 16
+# Type codes of the lexemes that are a token with no value
+FIXED_CODES = {spelling: type.value for spelling, type in (OPERATORS | KEYWORDS).items()}
 
 class Lexer:
-    def __init__(self, text: str):
+    def __init__(self, text: str, engine: str = "scan", *, context: CompilationContext):
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown lexer engine '{engine}', expected one of {ENGINES}")
+        self.context = context
+        self.error = self.context.error
         self.text = text
+        self.engine = engine
         self.start = 0
         self.current = 0
         self.line = 1
-
-        # A dict is used here to differentiate keywords from ID 
-        self.keywords = {
-            "int": TokenType.INT,
-            "char": TokenType.CHAR,
-            "float": TokenType.FLOAT,
-            "void": TokenType.VOID,
-            "return": TokenType.RETURN,
-            "if": TokenType.IF,
-            "else": TokenType.ELSE,
-            "for": TokenType.FOR,
-            "while": TokenType.WHILE,
-            "do": TokenType.DO,
-            "break": TokenType.BREAK,
-            "continue": TokenType.CONTINUE
-        }
-        self.whitespace = {' ', '\t', '\r', '\n', '\f', '\v'}
-        self.punctuation = {
-            '!', '%', '^', '&', '*', '(', ')', '-', '+', '=',
-            '[', ']', '{', '}', '|', '\\', ';', ':', "'", '"',
-            '<', '>', ',', '.', '/', '?'
-        }
+        self.keywords = KEYWORDS
+        self.whitespace = WHITESPACE
+        self.punctuation = PUNCTUATION
         self.tokens = []
 
     def at_end(self) -> bool:
@@ -45,11 +131,9 @@ class Lexer:
     def peek(self) -> Optional[str]:
         return self.text[self.current] if not self.at_end() else None
     
-    def peek_next() -> Optional[str]:
-        self.current += 1
-        if self.at_end():
+    def peek_next(self) -> Optional[str]:
+        if self.current + 1 >= len(self.text):
             return None
-        self.current -= 1
         return self.text[self.current + 1]
 
     def consume(self) -> Optional[str]:
@@ -60,7 +144,6 @@ class Lexer:
         return now
 
     def match(self, word) -> bool:
-        self.peek()
         if self.at_end() or self.text[self.current] != word: 
             return False
         else:
@@ -69,68 +152,245 @@ class Lexer:
     
     # Finds end of id
     def identifier(self) -> None:
-        while self.peek().isalnum() or self.peek() == '_':
+        while not self.at_end() and (self.peek().isalnum() or self.peek() == '_'):
             self.consume()
         return
 
     # Finds end of number and returns if it is a float
     def number(self) -> bool:
         dotted = False
-        while self.peek().isdigit():
-            c = self.consume()
-            if not dotted and self.peek() == '.' and self.peek_next().isdigit():
-                c = self.consume()
-                dotted == True
+        while not self.at_end() and self.peek().isdecimal():
+            self.consume()
+        if self.peek() == '.' and self.peek_next() is not None and self.peek_next().isdecimal():
+            self.consume()
+            dotted = True
+            while not self.at_end() and self.peek().isdecimal():
+                self.consume()
         return dotted
 
     def make_str(self) -> str:
-        s = ""
-        for i in range(self.start, self.current):
-            s += self.text[i]
-        return s
+        return self.text[self.start:self.current]
 
     def ill_formed(self) -> bool:
         ill = False
-        while self.peek() not in self.whitespace and self.peek() not in self.punctuation:
+        while not self.at_end() and self.peek() not in self.whitespace and self.peek() not in self.punctuation:
             ill = True
             self.consume()
         return ill
 
+    # Returns the whole token list, kept for callers that want everything at once
     def tokenise(self) -> list:
-        if self.at_end():
-            return self.tokens
+        self.tokens.extend(self.iter_tokens())
+        return self.tokens
+
+    # Same tokens packed into a TokenBuffer, each Token only lives until it is copied in.
+    # The regex engine fills the columns straight from its lexemes
+    def tokenise_buffer(self) -> TokenBuffer:
+        if self.engine == "regex":
+            return self.regex_buffer()
+        return TokenBuffer.from_tokens(self.iter_tokens(), source=self.text)
+
+    # Lexes the rest of the text into a TokenBuffer without a Token or a Match per token.
+    # A lexeme iter_regex_tokens has to look at, one it reports or a string with no end, is lexed by it
+    # with the rest of its line, so its tokens and errors are the same as the other engines', and the
+    # columns carry on from the line after. A chunk only ends on a line end, so the one lexeme it can
+    # cut is a block comment, whose '/*' then goes to iter_regex_tokens too
+    def regex_buffer(self) -> TokenBuffer:
+        text = self.text
+        end = len(text)
+        buffer = TokenBuffer(text)
+        # What each distinct lexeme is, kept across chunks
+        seen = ({}, {}, {}, {})
+        while self.current < end:
+            limit = text.find('\n', self.current + REGEX_CHUNK) + 1 or end
+            lexemes = LEXEME_PATTERN.findall(text, self.current, limit)
+            count = self.regex_columns(buffer, lexemes, *seen)
+            if count == len(lexemes):
+                self.line += text.count('\n', self.current, limit)
+                self.current = limit
+                continue
+            lexeme = lexemes[count]
+            stop = text.find('\n', self.current + len(lexeme) - len(lexeme.lstrip(" \t\r\n\f\v")))
+            buffer.extend(self.iter_regex_tokens(end if stop == -1 else stop))
+        return buffer
+
+    # Fills the columns from the lexemes up to the first one regex_buffer has to hand on, moves the
+    # lexer on to it and returns how many lexemes came before it.
+    # A source repeats the same few lexemes over and over, so each distinct lexeme is looked at
+    # once, for its type code, value and newlines, and the columns come out of map and accumulate
+    def regex_columns(self, buffer: TokenBuffer, lexemes: list, codes: dict, value_ids: dict, sizes: dict, newlines: dict) -> int:
+        ID, INT_LITERAL, FLOAT_LIT = TokenType.ID.value, TokenType.INT_LITERAL.value, TokenType.FLOAT_LIT.value
+        STRING_LIT = TokenType.STRING_LIT.value
+        skipped = strings = False
+        for lexeme in dict.fromkeys(lexemes):
+            code = codes.get(lexeme)
+            if code is None:
+                word = lexeme.lstrip(" \t\r\n\f\v")
+                code = FIXED_CODES.get(word)
+                if code is None:
+                    if word.startswith("//") or (word.startswith("/*") and len(word) > 2):
+                        code = 0
+                    elif NAME_PATTERN.fullmatch(word):
+                        code = ID
+                    elif NUMBER_PATTERN.fullmatch(word):
+                        code = FLOAT_LIT if '.' in word else INT_LITERAL
+                    elif word[0] == '"' and len(word) > 1:
+                        # Its value leaves out the character that ended it
+                        code, word = STRING_LIT, word[:-1]
+                    else:
+                        # Lexemes only become distinct in the order they first appear, so this is the first
+                        lexemes = lexemes[:lexemes.index(lexeme)]
+                        break
+                    if code:
+                        value_ids[lexeme] = buffer.intern(word)
+                        sizes[lexeme] = len(word)
+                codes[lexeme] = code
+                # A token is on the line after the newlines in front of it, a comment moves on past its own
+                count = lexeme.count('\n', 0, len(lexeme) - len(word)) if code else lexeme.count('\n')
+                if count:
+                    newlines[lexeme] = count
+            skipped = skipped or not code
+            strings = strings or code == STRING_LIT
+        types = list(map(codes.__getitem__, lexemes))
+        ids = list(map(value_ids.get, lexemes, repeat(0)))
+        lines = list(islice(accumulate(map(newlines.get, lexemes, repeat(0)), initial=self.line), 1, None))
+        offsets = list(accumulate(map(len, lexemes), initial=self.current))
+        # Only tokens with a value keep their span, the rest stay at 0 as scan_token leaves them
+        ends = list(map(mul, islice(offsets, 1, None), map(bool, ids)))
+        if strings:
+            ends = list(map(sub, ends, map(STRING_LIT.__eq__, types)))
+        starts = list(map(sub, ends, map(sizes.get, lexemes, repeat(0))))
+        if skipped:
+            lines, ids, starts, ends = (list(compress(column, types)) for column in (lines, ids, starts, ends))
+            types = list(compress(types, types))
+        buffer.types.fromlist(types)
+        buffer.lines.fromlist(lines)
+        buffer.starts.fromlist(starts)
+        buffer.ends.fromlist(ends)
+        buffer.value_ids.fromlist(ids)
+        self.line += self.text.count('\n', self.current, offsets[-1])
+        self.current = offsets[-1]
+        return len(lexemes)
+
+    # Tokens are only lexed as the parser asks for them
+    def tokenise_stream(self) -> TokenStream:
+        return TokenStream(self.iter_tokens(), source=self.text)
+
+    # Yields tokens one at a time so the stack stays flat no matter how long the file is
+    def iter_tokens(self):
+        if self.engine == "regex":
+            yield from self.iter_regex_tokens()
+            return
+        while not self.at_end():
+            tok = self.scan_token()
+            if tok is not None:
+                yield tok
+
+    # Table driven engine, walks TOKEN_PATTERN matches instead of single characters.
+    # Works a line at a time so whitespace and newlines never need a match of their own,
+    # only block comments can carry the scan over to a later line. With stop it ends with the line stop is on.
+    # Gives the same tokens and errors as scan_token.
+    def iter_regex_tokens(self, stop: Optional[int] = None):
+        text = self.text
+        end = len(text)
+        stop = end if stop is None else stop
+        finditer = TOKEN_PATTERN.finditer
+        keywords = self.keywords
+        operators = OPERATORS
+        ID, INT_LITERAL, FLOAT_LIT, ERROR = TokenType.ID, TokenType.INT_LITERAL, TokenType.FLOAT_LIT, TokenType.ERROR
+        pos = self.current
+        line = self.line
+        while pos < end and pos <= stop:
+            eol = text.find('\n', pos)
+            if eol == -1:
+                eol = end
+            for m in finditer(text, pos, eol):
+                kind = m.lastgroup
+                if kind == "OPERATOR":
+                    yield Token(operators[m.group()], line)
+                elif kind == "ID":
+                    id = m.group()
+                    if id in keywords:
+                        yield Token(keywords[id], line)
+                    else:
+                        yield Token(ID, line, m.start(), m.end(), text)
+                elif kind == "NUMBER":
+                    num = m.group()
+                    yield Token(FLOAT_LIT if '.' in num else INT_LITERAL, line, m.start(), m.end(), text)
+                elif kind == "LINE_COMMENT" or kind == "BLOCK_COMMENT":
+                    continue
+                elif kind == "OPEN_COMMENT":
+                    close = text.find("*/", m.start() + 2)
+                    if close == -1:
+                        self.error.report(error_msg=f"Unterminated comment starting from {line}", line=line, type="IlligalSyntax")
+                        line += text.count('\n', m.start())
+                        pos = eol = end
+                    else:
+                        line += text.count('\n', m.start(), close)
+                        pos = close + 2
+                    break
+                elif kind == "NUMBER_TAIL":
+                    num = m.group("NUMBER")
+                    if m.group("NUMBER_TAIL").strip('.'):
+                        self.error.report(error_msg=f"Ill-formed number {m.group()}", line=line, type="InvalidSyntax")
+                        yield Token(ERROR, line)
+                    else:
+                        yield Token(FLOAT_LIT if '.' in num else INT_LITERAL, line, m.start(), m.end("NUMBER"), text)
+                elif kind == "ID_TAIL":
+                    self.error.report(error_msg=f"Ill-formed identifier: {m.group()}", line=line, type="InvalidSyntax")
+                    yield Token(ERROR, line)
+                elif kind == "STRING_END":
+                    yield Token(TokenType.STRING_LIT, line, m.start(), m.end("STRING"), text)
+                elif kind == "STRING":
+                    if m.end() == end:
+                        self.error.report(error_msg="Non-terminated string", line=line, type="IlligalSyntax")
+                    else:
+                        self.error.report(error_msg="Invalid multiline string", line=line, type="IlligalSyntax")
+                    yield Token(ERROR, line)
+                else:
+                    self.error.report(error_msg=f"Ill-formed identifier {m.group()}", line=line, type="InvalidSyntax")
+                    yield Token(ERROR, line)
+            else:
+                pos = eol + 1
+                if eol < end:
+                    line += 1
+        self.current = min(pos, end)
+        self.line = line
+
+    # Scans a single lexeme, returns None for whitespace and comments
+    def scan_token(self) -> Optional[Token]:
         self.start = self.current
         c = self.consume()
 
         # Single characters
-        if c == '{': self.tokens.append(Token(type=TokenType.OPEN_BRACE, line=self.line))
-        elif c == '}': self.tokens.append(Token(type=TokenType.CLOSE_BRACE, line=self.line))
-        elif c == '(': self.tokens.append(Token(type=TokenType.OPEN_PARENTHESIS, line=self.line))
-        elif c == ')': self.tokens.append(Token(type=TokenType.CLOSE_PARENTHESIS, line=self.line))
-        elif c == ';': self.tokens.append(Token(type=TokenType.SEMICOLON, line=self.line))
-        elif c == ':': self.tokens.append(Token(type=TokenType.COLON, line=self.line))
-        elif c == ',': self.tokens.append(Token(type=TokenType.COMMA, line=self.line))
-        elif c == '?': self.tokens.append(Token(type=TokenType.QUESTION_MARK, line=self.line))
-        elif c == '~': self.tokens.append(Token(type=TokenType.BIT_COMP, line=self.line))
-        elif c == '.': self.tokens.append(Token(type=TokenType.DOT, line=self.line))
+        if c == '{': return Token(type=TokenType.OPEN_BRACE, line=self.line)
+        elif c == '}': return Token(type=TokenType.CLOSE_BRACE, line=self.line)
+        elif c == '(': return Token(type=TokenType.OPEN_PARENTHESIS, line=self.line)
+        elif c == ')': return Token(type=TokenType.CLOSE_PARENTHESIS, line=self.line)
+        elif c == ';': return Token(type=TokenType.SEMICOLON, line=self.line)
+        elif c == ':': return Token(type=TokenType.COLON, line=self.line)
+        elif c == ',': return Token(type=TokenType.COMMA, line=self.line)
+        elif c == '?': return Token(type=TokenType.QUESTION_MARK, line=self.line)
+        elif c == '~': return Token(type=TokenType.BIT_COMP, line=self.line)
+        elif c == '.': return Token(type=TokenType.DOT, line=self.line)
 
         # Compound characters
         elif c == '+':
             if self.match('+'):
-                self.tokens.append(Token(type=TokenType.INCREMENT, line=self.line))
+                return Token(type=TokenType.INCREMENT, line=self.line)
             elif self.match('='):
-                self.tokens.append(Token(type=TokenType.ASSIGN_ADD, line=self.line))
+                return Token(type=TokenType.ASSIGN_ADD, line=self.line)
             else:
-                self.tokens.append(Token(type=TokenType.ADDITION, line=self.line))
+                return Token(type=TokenType.ADDITION, line=self.line)
         elif c == '-':
             if self.match('-'):
-                self.tokens.append(Token(type=TokenType.DECREMENT, line=self.line))
+                return Token(type=TokenType.DECREMENT, line=self.line)
             elif self.match('='):
-                self.tokens.append(Token(type=TOkenType.ASSIGN_SUB, line=self.line))
+                return Token(type=TokenType.ASSIGN_SUB, line=self.line)
             else:
-                self.tokens.append(Token(type=TokenType.SUBTRACTION, line=self.line))
+                return Token(type=TokenType.SUBTRACTION, line=self.line)
         elif c == '*':
-            self.tokens.append(
+            return (
                 Token(type=TokenType.ASSIGN_MULT, line=self.line)
                 if self.match('=') else
                 Token(type=TokenType.MULTIPLICATION, line=self.line)
@@ -140,92 +400,80 @@ class Lexer:
                 while not self.at_end() and self.peek() != '\n': self.consume()
             elif self.match('*'):
                 start_line = self.line
-                while not self.at_end() and self.peek() != '*' and self.peek_next() != '/':
+                while not self.at_end() and not (self.peek() == '*' and self.peek_next() == '/'):
                     if self.peek() == '\n':
                         self.line += 1
                     self.consume()
                 if self.at_end():
-                    error.report(error_msg=f"Unterminated comment starting from {start_line}", line=start_line, type="IlligalSyntax")
+                    self.error.report(error_msg=f"Unterminated comment starting from {start_line}", line=start_line, type="IlligalSyntax")
+                else:
+                    self.consume()
+                    self.consume()
             else:
-                self.tokens.append(
+                return (
                     Token(type=TokenType.ASSIGN_DIV, line = self.line)
                     if self.match('=') else
                     Token(type=TokenType.DIVISION, line=self.line)
                 )
         elif c == '%':
-            self.tokens.append(
+            return (
                 Token(type=TokenType.ASSIGN_MOD, line=self.line)
                 if self.match('=') else
                 Token(type=TokenType.MODULO, line=self.line)
             )
         elif c == '=':
-            self.tokens.append(
+            return (
                 Token(type=TokenType.EQUAL, line=self.line)
                 if self.match('=') else
                 Token(type=TokenType.ASSIGNMENT, line=self.line)
             )
         elif c == '!':
-            self.tokens.append(
+            return (
                 Token(type=TokenType.NOT_EQUAL, line=self.line)
                 if self.match('=') else
                 Token(type=TokenType.LOGICAL_NEGATION, line=self.line)
             )
         elif c == '<':
             if self.match('='):
-                self.tokens.append(Token(type=TokenType.LESS_THAN_OR_EQUAL, line=self.line))
+                return Token(type=TokenType.LESS_THAN_OR_EQUAL, line=self.line)
             elif self.match('<'):
-                self.tokens.append(Token(type=TokenType.ASSIGN_LEFT_SHIFT, line=self.line)
+                return (Token(type=TokenType.ASSIGN_LEFT_SHIFT, line=self.line)
                 if self.match('=') else
                 Token(type=TokenType.BIT_SHIFT_LEFT, line=self.line)
                 )
             else:
-                self.tokens.append(Token(type=TokenType.LESS_THAN, line=self.line))
+                return Token(type=TokenType.LESS_THAN, line=self.line)
         elif c == '>':
             if self.match('='):
-                self.tokens.append(Token(type=TokenType.GREATER_THAN_OR_EQUAL, line=self.line))
+                return Token(type=TokenType.GREATER_THAN_OR_EQUAL, line=self.line)
             elif self.match('>'):
-                self.tokens.append(Token(type=TokenType.ASSIGN_RIGHT_SHIFT, line=self.line)
+                return (Token(type=TokenType.ASSIGN_RIGHT_SHIFT, line=self.line)
                 if self.match('=') else
                 Token(type=TokenType.BIT_SHIFT_RIGHT, line=self.line)
                 )
             else:
-                self.tokens.append(Token(type=TokenType.GREATER_THAN, line=self.line))
+                return Token(type=TokenType.GREATER_THAN, line=self.line)
         elif c == '&':
             if self.match('='):
-                self.tokens.append(Token(type=TokenType.ASSIGN_ADD, line=self.line))
+                return Token(type=TokenType.ASSIGN_BIT_AND, line=self.line)
             elif self.match('&'):
-                self.tokens.append(Token(type=TokenType.AND, line=self.line))
+                return Token(type=TokenType.AND, line=self.line)
             else:
-                self.tokens.append(Token(type=TokenType.BIT_AND, line=self.line))
+                return Token(type=TokenType.BIT_AND, line=self.line)
         elif c == '|':
             if self.match('='):
-                self.tokens.append(Token(type=TokenType.ASSIGN_OR, line=self.line))
+                return Token(type=TokenType.ASSIGN_BIT_OR, line=self.line)
             elif self.match('|'):
-                self.tokens.append(Token(type=TokenType.OR, line=self.line))
+                return Token(type=TokenType.OR, line=self.line)
             else:
-                self.tokens.append(Token(type=TokenType.BIT_OR, line=self.line))
+                return Token(type=TokenType.BIT_OR, line=self.line)
         elif c == '^':
-            self.tokens.append(
+            return (
                 Token(type=TokenType.ASSIGN_BIT_XOR, line=self.line)
                 if self.match('=') else
                 Token(type=TokenType.BIT_XOR, line=self.line)
             )
 
-        # Identifier
-        elif not self.at_end() and c.isalpha():
-            self.identifier()
-            id = self.make_str()
-            ill = self.ill_formed()
-            if ill:
-                ill_id = self.make_str()
-                error.report(error_msg=f"Ill-formed identifier: {ill_id}", line=self.line, type="InvalidSyntax")
-                self.tokens.append(Token(type=TokenType.ERROR, line=self.line))
-            elif id in self.keywords:
-                keyword = self.keywords[id]
-                self.tokens.append(Token(type=keyword, line=self.line))
-            else:
-                self.tokens.append(Token(type=TokenType.ID, line=self.line, value=id))
-
         # Char - implement later
 
         # String
@@ -233,32 +481,48 @@ class Lexer:
             while not self.at_end() and self.peek().isalnum():
                 self.consume()
             if self.at_end():
-                error.report(error_msg="Non-terminated string", line=self.line, type="IlligalSyntax")
-                self.tokens.append(Token(type=TokenType.ERROR, line=self.line))
-            elif self.peek == '\n':
-                error.report(error_msg="Invalid multiline string", line=self.line, type="IlligalSyntax")
-                self.tokens.append(Token(type=TokenType.ERROR, line=self.line))
+                self.error.report(error_msg="Non-terminated string", line=self.line, type="IlligalSyntax")
+                return Token(type=TokenType.ERROR, line=self.line)
+            elif self.peek() == '\n':
+                self.error.report(error_msg="Invalid multiline string", line=self.line, type="IlligalSyntax")
+                return Token(type=TokenType.ERROR, line=self.line)
             else:
-                s = self.make_str()
-                self.tokens.append(Token(type=TokenType.STRING_LIT, line=self.line, value=s))
+                end = self.current
                 self.consume()
+                return Token(type=TokenType.STRING_LIT, line=self.line, start=self.start, end=end, source=self.text)
         
         # Number
-        elif not self.at_end() and c.isdigit():
+        elif c.isdecimal():
             dotted = self.number()
-            num = self.make_str()
+            end = self.current
             ill = self.ill_formed()
             while self.peek() == '.':   # '.' does not act as delimeter so need keep going
                 self.consume()
-                ill = self.ill_formed()
+                ill = self.ill_formed() or ill
             if ill:
                 ill_num = self.make_str()
-                error.report(error_msg=f"Ill-formed number {ill_num}", line=self.line, type="InvalidSyntax")
-                self.tokens.append(Token(type=TokenType.ERROR, line=self.line))
+                self.error.report(error_msg=f"Ill-formed number {ill_num}", line=self.line, type="InvalidSyntax")
+                return Token(type=TokenType.ERROR, line=self.line)
             elif dotted:
-                self.tokens.append(Token(type=TokenType.FLOAT_LIT, line=self.line, value=num))
+                return Token(type=TokenType.FLOAT_LIT, line=self.line, start=self.start, end=end, source=self.text)
             else:
-                self.tokens.append(Token(type=TokenType.INT_LITERAL, line=self.line, value=num))
+                return Token(type=TokenType.INT_LITERAL, line=self.line, start=self.start, end=end, source=self.text)
+
+        # Identifier
+        elif c.isalnum():   # decimals are taken by the number branch above
+            self.identifier()
+            end = self.current
+            id = self.make_str()
+            ill = self.ill_formed()
+            if ill:
+                ill_id = self.make_str()
+                self.error.report(error_msg=f"Ill-formed identifier: {ill_id}", line=self.line, type="InvalidSyntax")
+                return Token(type=TokenType.ERROR, line=self.line)
+            elif id in self.keywords:
+                keyword = self.keywords[id]
+                return Token(type=keyword, line=self.line)
+            else:
+                return Token(type=TokenType.ID, line=self.line, start=self.start, end=end, source=self.text)
 
         # Newline
         elif c == '\n':
@@ -269,7 +533,6 @@ class Lexer:
             if c not in self.whitespace:
                 self.ill_formed()
                 ill_string = self.make_str()
-                error.report(error_msg=f"Ill-formed identifier {ill_string}", line=self.line, type="InvalidSyntax")
-                self.tokens.append(Token(type=TokenType.ERROR, line=self.line))
-        
-        return self.tokenise()
\ No newline at end of file
+                self.error.report(error_msg=f"Ill-formed identifier {ill_string}", line=self.line, type="InvalidSyntax")
+                return Token(type=TokenType.ERROR, line=self.line)
+        return None
\ No newline at end of file
@@ -5,54 +5,150 @@ To read more about each function and their relationships, refer to the parser do
  """
 from typing import Optional
 from core.data.token_types import *
+from core.data.token_buffer import TokenBuffer
 from core.data.nodes import *
-from core.util.symbol_table import SymbolTable, SymbolEntry, global_table, GlobalEntry
-from core.util.error import error
+from core.util.symbol_table import SymbolTable, ScopedSymbolTable, CountingScopedSymbolTable, SymbolEntry, GlobalEntry, FunctionEntry
+from core.util.context import CompilationContext
+
+# Binary operators from loosest to tightest binding, with how to build the node for each.
+# Operands are built left to right and take the line of the left hand side.
+BINARY_OPERATORS = {
+    TokenType.OR: (1, lambda op, lhs, rhs: OR(operand1=lhs, operand2=rhs, line=lhs.line)),
+    TokenType.AND: (2, lambda op, lhs, rhs: AND(operand1=lhs, operand2=rhs, line=lhs.line)),
+    TokenType.EQUAL: (3, lambda op, lhs, rhs: Equality(operator=op, operand1=lhs, operand2=rhs, line=lhs.line)),
+    TokenType.NOT_EQUAL: (3, lambda op, lhs, rhs: Equality(operator=op, operand1=lhs, operand2=rhs, line=lhs.line)),
+    TokenType.LESS_THAN: (4, lambda op, lhs, rhs: Inequality(operator=op, operand1=lhs, operand2=rhs, line=lhs.line)),
+    TokenType.LESS_THAN_OR_EQUAL: (4, lambda op, lhs, rhs: Inequality(operator=op, operand1=lhs, operand2=rhs, line=lhs.line)),
+    TokenType.GREATER_THAN: (4, lambda op, lhs, rhs: Inequality(operator=op, operand1=lhs, operand2=rhs, line=lhs.line)),
+    TokenType.GREATER_THAN_OR_EQUAL: (4, lambda op, lhs, rhs: Inequality(operator=op, operand1=lhs, operand2=rhs, line=lhs.line)),
+    TokenType.BIT_OR: (5, lambda op, lhs, rhs: BitOR(operand1=lhs, operand2=rhs, line=lhs.line)),
+    TokenType.BIT_XOR: (6, lambda op, lhs, rhs: BitXOR(operand1=lhs, operand2=rhs, line=lhs.line)),
+    TokenType.BIT_AND: (7, lambda op, lhs, rhs: BitAND(operand1=lhs, operand2=rhs, line=lhs.line)),
+    TokenType.BIT_SHIFT_LEFT: (8, lambda op, lhs, rhs: BitShift(operator=op, value=lhs, shift=rhs, line=lhs.line)),
+    TokenType.BIT_SHIFT_RIGHT: (8, lambda op, lhs, rhs: BitShift(operator=op, value=lhs, shift=rhs, line=lhs.line)),
+    TokenType.ADDITION: (9, lambda op, lhs, rhs: AddSub(operator=op, operand1=lhs, operand2=rhs, line=lhs.line)),
+    TokenType.SUBTRACTION: (9, lambda op, lhs, rhs: AddSub(operator=op, operand1=lhs, operand2=rhs, line=lhs.line)),
+    TokenType.MULTIPLICATION: (10, lambda op, lhs, rhs: MultDivMod(operator=op, operand1=lhs, operand2=rhs, line=lhs.line)),
+    TokenType.DIVISION: (10, lambda op, lhs, rhs: MultDivMod(operator=op, operand1=lhs, operand2=rhs, line=lhs.line)),
+    TokenType.MODULO: (10, lambda op, lhs, rhs: MultDivMod(operator=op, operand1=lhs, operand2=rhs, line=lhs.line)),
+}
+
+# Assignment operators and the binary operator a compound assignment stands for
+ASSIGN_OPERATORS = {
+    TokenType.ASSIGNMENT: None,
+    TokenType.ASSIGN_ADD: TokenType.ADDITION,
+    TokenType.ASSIGN_SUB: TokenType.SUBTRACTION,
+    TokenType.ASSIGN_MULT: TokenType.MULTIPLICATION,
+    TokenType.ASSIGN_DIV: TokenType.DIVISION,
+    TokenType.ASSIGN_MOD: TokenType.MODULO,
+    TokenType.ASSIGN_BIT_AND: TokenType.BIT_AND,
+    TokenType.ASSIGN_BIT_OR: TokenType.BIT_OR,
+    TokenType.ASSIGN_BIT_XOR: TokenType.BIT_XOR,
+    TokenType.ASSIGN_LEFT_SHIFT: TokenType.BIT_SHIFT_LEFT,
+    TokenType.ASSIGN_RIGHT_SHIFT: TokenType.BIT_SHIFT_RIGHT,
+}
+
+# "recursive" walks the grammar on the Python call stack, "stack" keeps the nesting on
+# an explicit work stack so there is no depth limit
+MODES = ("recursive", "stack")
 
 class Parser:
-    def __init__(self, tokens: list):
+    def __init__(self, tokens, mode: str = "recursive", *, context: CompilationContext):
+        if mode not in MODES:
+            raise ValueError(f"Unknown parser mode '{mode}', expected one of {MODES}")
+        self.mode = mode
+        self.context = context
+        self.error = self.context.error
+        self.global_table = self.context.global_table
+        # Lists of Token still work, they are packed into a TokenBuffer first
+        if not isinstance(tokens, TokenBuffer):
+            tokens = TokenBuffer.from_tokens(tokens)
         self.tokens = tokens
         self.pos = 0
-        self.table_stack = []
+        self.scopes = ScopedSymbolTable()
         self.keywords = {
             TokenType.INT, TokenType.FLOAT,
             TokenType.CHAR, TokenType.VOID
         }
+        if self.context.stats:
+            self.count_hot_paths()
+
+    # With stats, the hot paths of this parser are swapped for versions that count, so a parser
+    # without stats runs exactly the code it always did. An assignment lookahead turns back when an
+    # expression starts with a name but is not an assignment, where a backtracking parser would rewind
+    def count_hot_paths(self):
+        stats = self.context.stats
+        self.scopes = CountingScopedSymbolTable(stats.lookups)
+        consume, search_blocks, parse_assign_head = self.consume, self.search_blocks, self.parse_assign_head
+
+        def counted_consume(*expected_type: TokenType) -> Token:
+            stats.parser["consume"] += 1
+            return consume(*expected_type)
+
+        def counted_search_blocks(id: str):
+            stats.lookups["search_blocks"] += 1
+            return search_blocks(id)
+
+        def counted_parse_assign_head() -> Optional[tuple]:
+            stats.parser["assign lookaheads"] += 1
+            head = parse_assign_head()
+            if head is None and self.peek_type() == TokenType.ID:
+                stats.parser["assign backtracks"] += 1
+            return head
+
+        self.consume, self.search_blocks, self.parse_assign_head = counted_consume, counted_search_blocks, counted_parse_assign_head
     
     # Returns the next token to be parsed
     def peek(self) -> Optional[Token]:
-        if self.pos < len(self.tokens):
-            return self.tokens[self.pos]
-        error.report(error_msg="Incomplete code", line=self.tokens[-1].line, type="Syntax")
-        error.display("Parsing")
+        if self.tokens.has(self.pos):
+            tok = self.tokens[self.pos]
+            if tok.type is TokenType.ERROR:
+                self.error.display("Lexing")
+            return tok
+        self.incomplete()
+
+    # Returns the type of the next token, without building the Token itself.
+    # Tokens may be lexed as they are parsed, an ERROR token is a lexing error that has been reported
+    # already, so the compilation stops at Lexing just as it does when the file is lexed first
+    def peek_type(self) -> TokenType:
+        try:
+            _type = self.tokens.type_at(self.pos)
+        except IndexError:
+            self.incomplete()
+        if _type is TokenType.ERROR:
+            self.error.display("Lexing")
+        return _type
+
+    # Every parse error is displayed as soon as it is reported, so an error already there when the
+    # tokens run out is the lexer's, an unterminated comment say
+    def incomplete(self):
+        self.error.display("Lexing")
+        self.error.report(error_msg="Incomplete code", line=self.tokens.line_at(-1), type="Syntax")
+        self.error.display("Parsing")
     
     # Returns token if the expected token is the next one
     def consume(self, *expected_type: TokenType) -> Token:
-        for e in expected_type:
-            tok = self.peek()
-            if tok.type == e:
-                self.pos += 1
-                return tok
-        error.report(
-            error_msg=f"Expected {[t.name for t in expected_type]}, got '{tok.type.name}'",
-            line=tok.line, type="SyntaxError"
+        _type = self.peek_type()
+        if _type in expected_type:
+            tok = self.tokens[self.pos]
+            self.pos += 1
+            return tok
+        self.error.report(
+            error_msg=f"Expected {[t.name for t in expected_type]}, got '{_type.name}'",
+            line=self.tokens.line_at(self.pos), type="SyntaxError"
             )
-        error.display("Parsing")
+        self.error.display("Parsing")
 
     def search_blocks(self, id: str) -> bool:
-        i = -1
-        while -i <= len(self.table_stack):
-            symbol = self.table_stack[i]
-            if id in symbol.table:
-                return symbol.get(id)
-            else:
-                i -= 1
-        if id in global_table and isinstance(global_table[id], GlobalEntry):
-            return global_table[id]
+        entry = self.scopes.get(id)
+        if entry:
+            return entry
+        if id in self.global_table and isinstance(self.global_table[id], GlobalEntry):
+            return self.global_table[id]
         return None
 
     def next_is_block(self):
-        return self.peek().type == TokenType.OPEN_BRACE
+        return self.peek_type() == TokenType.OPEN_BRACE
 
     def remove_declare(self, init_set, uninits):
         trimmed = []
@@ -68,8 +164,7 @@ class Parser:
         uninits = []
         funcs = []
         init_set = set()
-        while self.pos < len(self.tokens):
-            top = self.parse_global()
+        for top in self.iter_program():
             if isinstance(top, Function):
                 funcs.append(top)
             elif isinstance(top, GlobalVar):
@@ -81,13 +176,36 @@ class Parser:
             uninits = self.remove_declare(init_set, uninits)
         return Program(init_vars=inits, uninit_vars=uninits, funcs=funcs)
 
+    # Yields each function and global variable as soon as it is parsed, prototypes yield nothing.
+    # The tokens of an item are released once it is parsed, so a TokenStream is never held whole.
+    def iter_program(self):
+        while self.tokens.has(self.pos):
+            start = self.pos
+            if self.mode == "stack":
+                top = self.run_stack(self.stack_global())
+            else:
+                top = self.parse_global()
+            if isinstance(top, Function):
+                top.key = self.function_key(start)
+            self.tokens.release(self.pos)
+            if top is not None:
+                yield top
+
+    # Identifies what a function folds and generates to: its tokens, and for every name in it what that
+    # name is globally. The code generator caches the assembly of functions by this key
+    def function_key(self, start: int) -> str:
+        digest = self.tokens.fingerprint(start, self.pos)
+        for name in sorted(self.tokens.ids_in(start, self.pos)):
+            digest.update(f"\0{name}:{type(self.global_table.get(name)).__name__}".encode())
+        return digest.hexdigest()
+
     def parse_global(self) -> Top:
         _type = self.consume(
             TokenType.INT, TokenType.FLOAT,
             TokenType.CHAR, TokenType.VOID
             )
         name = self.consume(TokenType.ID)
-        if self.peek().type == TokenType.ASSIGNMENT or self.peek().type == TokenType.SEMICOLON:
+        if self.peek_type() == TokenType.ASSIGNMENT or self.peek_type() == TokenType.SEMICOLON:
             return self.parse_global_var(_type=_type, id=name)
         else:
             return self.parse_function(return_type=_type, name=name)
@@ -95,38 +213,51 @@ class Parser:
     def parse_global_var(self, _type: TokenType, id: TokenType) -> Top:
         val = 0
         init = False
-        if self.peek().type == TokenType.ASSIGNMENT:
+        if self.peek_type() == TokenType.ASSIGNMENT:
             init = True
             self.consume(TokenType.ASSIGNMENT)
             val = self.parse_assignment()
+        return self.declare_global_var(_type, id, init, val)
+
+    def declare_global_var(self, _type: Token, id: Token, init: bool, val) -> Top:
         entry = GlobalEntry(id=id.value, type=_type.type, initialised=init, line=id.line)
         variable = Var(id=id.value, line=id.line, type=_type.type)
 
-        if id.value in global_table:
-            if not isinstance(global_table[id.value], GlobalEntry):
-                error.report(
+        if id.value in self.global_table:
+            if not isinstance(self.global_table[id.value], GlobalEntry):
+                self.error.report(
                     error_msg=f"Cannot declare global variable '{id.value}', a function has that name already",
                     line=id.line, type="SyntaxError"
                 )
-            elif global_table[id.value].initialised and init == True:
-                error.report(
+            elif self.global_table[id.value].initialised and init == True:
+                self.error.report(
                     error_msg=f"Global variable '{id.value}' already declared and initialised",
                     line=id.line, type="SyntaxError"
                 )
-            elif not global_table[id.value].initialised and init == True:
-                global_table[id.value].initialised == True
-                global_table[id.value].exp = val
+            elif not self.global_table[id.value].initialised and init == True:
+                self.global_table[id.value].initialised == True
+                self.global_table[id.value].exp = val
         else:
-            global_table[id.value] = entry
+            self.global_table[id.value] = entry
         self.consume(TokenType.SEMICOLON)
-        error.display("Parsing")
+        self.error.display("Parsing")
         return GlobalVar(id=variable, type=_type.type, exp=val, line=id.line, init=init)
     
     def parse_function(self, return_type: TokenType, name: TokenType) -> Top:
+        signature = self.parse_signature(return_type, name)
+        if signature is None:
+            return
+        func, symbol = signature
+        func.body = self.parse_block(symbol)
+        return func
+
+    # Parses the parameters and registers the function.
+    # Returns None for a prototype, otherwise the Function and the table holding its parameters
+    def parse_signature(self, return_type: TokenType, name: TokenType) -> Optional[tuple]:
         self.consume(TokenType.OPEN_PARENTHESIS)
         args = []
         param_set = set()
-        while self.peek().type in self.keywords:
+        while self.peek_type() in self.keywords:
             arg_name = None
             _type = self.consume(
                 TokenType.INT, TokenType.FLOAT,
@@ -134,44 +265,44 @@ class Parser:
                 )
             if _type.type == TokenType.VOID:
                 break
-            if self.peek().type == TokenType.ID:
+            if self.peek_type() == TokenType.ID:
                 arg_name = self.consume(TokenType.ID)
                 if arg_name.value in param_set:
-                    error.report(
+                    self.error.report(
                         error_msg=f"Cannot have duplicate parameters '{arg_name.value}' in function '{name.value}'",
                         line=name.line, type="SyntaxError"
                         )
                 param_set.add(arg_name.value)
             args.append((_type.type, arg_name.value) if arg_name else (_type.type, None))
-            if self.peek().type == TokenType.COMMA:
+            if self.peek_type() == TokenType.COMMA:
                 self.consume(TokenType.COMMA)
-                if self.peek().type not in self.keywords:
-                    error.report(error_msg=f"Misplaced comma in function {name.value}", line=name.line, type="SyntaxError")
+                if self.peek_type() not in self.keywords:
+                    self.error.report(error_msg=f"Misplaced comma in function {name.value}", line=name.line, type="SyntaxError")
 
         self.consume(TokenType.CLOSE_PARENTHESIS)
-        if self.peek().type == TokenType.SEMICOLON:
+        if self.peek_type() == TokenType.SEMICOLON:
             self.consume(TokenType.SEMICOLON)
-            func = Function(name=name.value, variables=args, _return=return_type.type, prototype=True)
-            if name.value in global_table:
-                declared = global_table[name.value]
+            func = FunctionEntry(id=name.value, variables=args, return_type=return_type.type, prototype=True)
+            if name.value in self.global_table:
+                declared = self.global_table[name.value]
                 if isinstance(declared, GlobalEntry):
-                    error.report(
+                    self.error.report(
                         error_msg=f"Cannot declare function '{name.value}' a global variable already has that name",
                         line=name.line, type="SyntaxError"
                         )
                 elif declared.prototype:
-                    error.report(
+                    self.error.report(
                         error_msg="Cannot declare two functions of the same name",
                         line=name.line, type="SyntaxError"
                         )
                 elif len(declared.variables) != len(func.variables):
-                    error.report(
+                    self.error.report(
                         error_msg=f"Mismatch parameter count in function {name.value}",
                         line=name.line, type="SyntaxError"
                     )
             else:
-                global_table[name.value] = func
-            error.display("Parsing")
+                self.global_table[name.value] = func
+            self.error.display("Parsing")
             return
 
         symbol = SymbolTable(fun_name=name.value, args=args, return_type=return_type.type)
@@ -186,69 +317,70 @@ class Parser:
             name=name.value, variables=args,
             _return=return_type.type, prototype=False
             )
-        if name.value in global_table:
-            declared = global_table[name.value]
+        if name.value in self.global_table:
+            declared = self.global_table[name.value]
             if isinstance(declared, GlobalEntry):
-                    error.report(
+                    self.error.report(
                         error_msg=f"Cannot declare function '{name.value}' a global variable already has that name",
                         line=name.line, type="SyntaxError"
                         )
             elif not declared.prototype:
-                error.report(
+                self.error.report(
                     error_msg="Cannot declare two functions of the same name",
                     line=name.line, type="SyntaxError"
                     )
             elif len(declared.variables) != len(func.variables):
-                error.report(
+                self.error.report(
                     error_msg=f"Mismatch parameter count in function {name.value}",
                     line=name.line, type="SyntaxError"
                 )
         else:
-            global_table[name.value] = func
-        error.display("Parsing")
+            # Only the signature is kept, so the body can be freed once the function is compiled
+            self.global_table[name.value] = FunctionEntry(id=name.value, variables=args, return_type=return_type.type, prototype=False)
+        self.error.display("Parsing")
+        return func, symbol
 
-        block = self.parse_block(symbol)
-        func.body = block
-        return func
-
-    def parse_block(self, global_table: SymbolTable = None) -> BlockItem:
-        if not global_table:
-            global_table = SymbolTable()
-        self.table_stack.append(global_table)
+    def parse_block(self, table: SymbolTable = None) -> BlockItem:
+        self.open_block(table)
         blk_itms = []
-        self.consume(TokenType.OPEN_BRACE)
-        while self.peek().type != TokenType.CLOSE_BRACE:
-            if self.peek().type in self.keywords:
+        while self.peek_type() != TokenType.CLOSE_BRACE:
+            if self.peek_type() in self.keywords:
                 blk_itms.append(self.parse_declare())
             elif self.next_is_block():
                 blk_itms.append(self.parse_block())
             else:
                 blk_itms.append(self.parse_statement())
+        return self.close_block(blk_itms)
+
+    def open_block(self, table: SymbolTable = None):
+        self.scopes.push(table)
+        self.consume(TokenType.OPEN_BRACE)
 
+    # The block only has a table if something was declared in it
+    def close_block(self, items: list) -> Block:
         self.consume(TokenType.CLOSE_BRACE)
-        self.table_stack.pop()
-        return Block(block_items=blk_itms, symboltable=global_table)      
+        return Block(block_items=items, symboltable=self.scopes.pop())
 
     def parse_statement(self) -> Statement:
-        if self.peek().type == TokenType.RETURN:
+        if self.peek_type() == TokenType.RETURN:
             ret = self.parse_return()
             self.consume(TokenType.SEMICOLON)
             return ret
-        elif self.peek().type == TokenType.IF:
+        elif self.peek_type() == TokenType.IF:
             return self.parse_if()
-        elif self.peek().type == TokenType.FOR:
+        elif self.peek_type() == TokenType.FOR:
             return self.parse_for()
-        elif self.peek().type == TokenType.WHILE:
+        elif self.peek_type() == TokenType.WHILE:
             return self.parse_while()
-        elif self.peek().type == TokenType.DO:
+        elif self.peek_type() == TokenType.DO:
             do_while = self.parse_do_while()
             self.consume(TokenType.SEMICOLON)
             return do_while
-        elif self.peek().type == TokenType.BREAK:
+        elif self.peek_type() == TokenType.BREAK:
             br = self.consume(TokenType.BREAK)
             self.consume(TokenType.SEMICOLON)
             return Break(line=br.line)
-        elif self.peek().type == TokenType.CONTINUE:
+        elif self.peek_type() == TokenType.CONTINUE:
             cn = self.consume(TokenType.CONTINUE)
             self.consume(TokenType.SEMICOLON)
             return Continue(line=cn.line)
@@ -258,32 +390,38 @@ class Parser:
             return exp
 
     def parse_declare(self) -> Declare:
-        symbol = self.table_stack[-1]
+        _type, id = self.parse_declare_head()
+        val = None
+        init = False
+        if self.peek_type() == TokenType.ASSIGNMENT:
+            init = True
+            self.consume(TokenType.ASSIGNMENT)
+            val = self.parse_assignment()
+        return self.declare_local(_type, id, init, val)
+
+    def parse_declare_head(self) -> tuple:
         _type = self.consume(
                 TokenType.INT, TokenType.FLOAT,
                 TokenType.CHAR, TokenType.VOID
                 )
         id = self.consume(TokenType.ID)
-        if id.value in symbol.table:
-            error.report(
+        if self.scopes.declared_in_scope(id.value):
+            self.error.report(
                 error_msg=f"Cannot declare variable of same name {id.value} again in same scope",
                 line=id.line, type="SyntaxError"
             )
-        val = None
-        init = False
-        if self.peek().type == TokenType.ASSIGNMENT:
-            init = True
-            self.consume(TokenType.ASSIGNMENT)
-            val = self.parse_assignment()
+        return _type, id
+
+    def declare_local(self, _type: Token, id: Token, init: bool, val) -> Declare:
         entry = SymbolEntry(id=id.value, type=_type.type, initialised=init, line=id.line)
         variable = Var(id=id.value, type=_type.type, line=id.line)
-        symbol.insert(id.value, entry)
+        self.scopes.insert(id.value, entry)
         self.consume(TokenType.SEMICOLON)
         return Declare(id=variable, type=_type.type, exp=val, line=id.line)
 
     def parse_return(self) -> Statement:
         ret = self.consume(TokenType.RETURN)
-        if self.peek().type == TokenType.SEMICOLON:
+        if self.peek_type() == TokenType.SEMICOLON:
             return Return(line=ret.line)
         else:
             exp = self.parse_assignment()
@@ -299,10 +437,10 @@ class Parser:
         else:
             if_stm = self.parse_statement()
         
-        if self.peek().type != TokenType.ELSE:
+        if self.peek_type() != TokenType.ELSE:
             return If(condition=cond, if_statement=if_stm)
         self.consume(TokenType.ELSE)
-        if self.peek().type == TokenType.IF:
+        if self.peek_type() == TokenType.IF:
             else_stm = self.parse_if()
         elif self.next_is_block():
             else_stm = self.parse_block()
@@ -314,9 +452,8 @@ class Parser:
         self.consume(TokenType.FOR)
         self.consume(TokenType.OPEN_PARENTHESIS)
         symbol = None
-        if self.peek().type == TokenType.INT:
-            symbol = SymbolTable()
-            self.table_stack.append(symbol)
+        if self.peek_type() == TokenType.INT:
+            self.scopes.push()
             init = self.parse_declare()
         else:
             init = self.parse_exp_statement()
@@ -334,7 +471,7 @@ class Parser:
             stm = self.parse_statement()
         
         if isinstance(init, Declare):
-            self.table_stack.pop()
+            symbol = self.scopes.pop()
         return For(initial=init, condition=control, post_exp=post_exp, statement=stm, symboltable=(symbol if symbol else None))
 
     def parse_while(self) -> Statement:
@@ -362,9 +499,9 @@ class Parser:
         
     def parse_exp_statement(self) -> Statement:
         null_stm = self.peek()
-        if self.peek().type == TokenType.SEMICOLON:
+        if self.peek_type() == TokenType.SEMICOLON:
             return ExpStatement(line=null_stm.line)
-        elif self.peek().type == TokenType.CLOSE_PARENTHESIS:
+        elif self.peek_type() == TokenType.CLOSE_PARENTHESIS:
             return ExpStatement(line=null_stm.line)
         else:
             exp = self.parse_assignment()
@@ -372,80 +509,58 @@ class Parser:
     
     def parse_comma_exp(self) -> Exp:
         exp = self.parse_assignment()
-        while self.peek().type == TokenType.COMMA:
+        while self.peek_type() == TokenType.COMMA:
             self.consume(TokenType.COMMA)
             rhs_exp = self.parse_assignment()
             exp = CommaExp(lhs=exp, rhs=rhs_exp, line=exp.line)       
         return exp
 
     def parse_assignment(self) -> Exp:
-        if self.peek().type != TokenType.ID:
+        head = self.parse_assign_head()
+        if head is None:
             return self.parse_conditional()
-        
-        self.pos += 1
-        if self.peek().type not in (
-            TokenType.ASSIGNMENT, TokenType.ASSIGN_ADD, TokenType.ASSIGN_SUB, 
-            TokenType.ASSIGN_MULT, TokenType.ASSIGN_DIV, TokenType.ASSIGN_MOD,
-            TokenType.ASSIGN_BIT_AND, TokenType.ASSIGN_BIT_OR, TokenType.ASSIGN_BIT_XOR,
-            TokenType.ASSIGN_LEFT_SHIFT, TokenType.ASSIGN_RIGHT_SHIFT
-            ):
-            self.pos -= 1
-            return self.parse_conditional()
-        self.pos -= 1
+        assign = self.parse_assignment()
+        return self.build_assign(*head, assign)
+
+    # Consumes the variable and the operator of an assignment, or nothing when the
+    # expression ahead is not an assignment
+    def parse_assign_head(self) -> Optional[tuple]:
+        if self.peek_type() != TokenType.ID:
+            return None
+        if not self.tokens.has(self.pos + 1) or self.tokens.type_at(self.pos + 1) not in ASSIGN_OPERATORS:
+            return None
         var = self.consume(TokenType.ID)
 
-        if not self.search_blocks(var.value):
-            error.report(error_msg=f"Cannot assign a value to undeclared variable {var.value}", line=var.line, type="SyntaxError")
-        
-        symbol = self.table_stack[-1]
-        if self.peek().type != TokenType.ASSIGNMENT and not symbol.get(var.value).initialised:
-            error.report(
-                error_msg=f"Cannot perform operation {self.peek().type.name} on uninitialised variable {var.value}",
+        declared = self.search_blocks(var.value)
+        if not declared:
+            self.error.report(error_msg=f"Cannot assign a value to undeclared variable {var.value}", line=var.line, type="SyntaxError")
+            self.error.display("Parsing")
+        if self.peek_type() != TokenType.ASSIGNMENT and not declared.initialised:
+            self.error.report(
+                error_msg=f"Cannot perform operation {self.peek_type().name} on uninitialised variable {var.value}",
                 line=var.line, type="SyntaxError"
                 )
-        declared = symbol.get(var.value)
+        operation = self.consume(*ASSIGN_OPERATORS)
+        # Only a local is initialised by being assigned. A global's entry records whether its declaration
+        # has an initialiser, which a later declaration of it is checked against
+        if operation.type == TokenType.ASSIGNMENT and not isinstance(declared, GlobalEntry):
+            declared.initialised = True
+        return var, declared, operation
+
+    def build_assign(self, var: Token, declared: SymbolEntry, operation: Token, assign: Exp) -> Assign:
         _type = declared.type
-        operation = self.consume(
-            TokenType.ASSIGNMENT, TokenType.ASSIGN_ADD, TokenType.ASSIGN_SUB, 
-            TokenType.ASSIGN_MULT, TokenType.ASSIGN_DIV, TokenType.ASSIGN_MOD,
-            TokenType.ASSIGN_BIT_AND, TokenType.ASSIGN_BIT_OR, TokenType.ASSIGN_BIT_XOR,
-            TokenType.ASSIGN_LEFT_SHIFT, TokenType.ASSIGN_RIGHT_SHIFT
-            )
-        if self.peek().type == TokenType.ID:
-            assign = self.parse_assignment()
-            if isinstance(assign, Assign):
-                assign = assign.id  # Assign.id is a Var
-        else:
-            assign = self.parse_conditional()
-
         variable = Var(id=var.value, line=var.line, type=_type)
 
-        if operation.type == TokenType.ASSIGN_ADD:
-            assign = AddSub(operator=TokenType.ADDITION, operand1=variable, operand2=assign, line=var.line)
-        elif operation.type == TokenType.ASSIGN_SUB:
-            assign = AddSub(operator=TokenType.SUBTRACTION, operand1=variable, operand2=assign, line=var.line)
-        elif operation.type == TokenType.ASSIGN_MULT:
-            assign = MultDivMod(operator=TokenType.MULTIPLICATION, operand1=variable, operand2=assign, line=var.line)
-        elif operation.type == TokenType.ASSIGN_DIV:
-            assign = MultDivMod(operator=TokenType.DIVISION, operand1=variable, operand2=assign, line=var.line)
-        elif operation.type == TokenType.ASSIGN_MOD:
-            assign = MultDivMod(operator=TokenType.MODULO, operand1=variable, operand2=assign, line=var.line)
-        elif operation.type == TokenType.ASSIGN_BIT_AND:
-            assign = BitAND(operand1=variable, operand2=assign, line=var.line)
-        elif operation.type == TokenType.ASSIGN_BIT_OR:
-            assign = BitOR(operand1=variable, operand2=assign, line=var.line)
-        elif operation.type == TokenType.ASSIGN_BIT_OR:
-            assigne = BitXOR(operand1=variable, operand2=assign, line=var.line)
-        elif operation.type == TokenType.ASSIGN_RIGHT_SHIFT:
-            assign = BitShift(operator=TokenType.BIT_SHIFT_RIGHT, operand1=variable, operand2=assign, line=var.line)
-        elif operation.type == TokenType.ASSIGN_LEFT_SHIFT:
-            assign = BitShift(operator=TokenType.BIT_SHIFT_LEFT, operand1=variable, operand2=assign, line=var.line)
+        # Compound assignment is desugared, x += y becomes x = x + y
+        if operation.type != TokenType.ASSIGNMENT:
+            operator = ASSIGN_OPERATORS[operation.type]
+            assign = BINARY_OPERATORS[operator][1](operator, variable, assign)
 
         return Assign(id=variable, exp=assign, line=var.line, type=_type)
 
     def parse_conditional(self) -> Exp:
-        cond = self.parse_or()
-        if self.peek().type != TokenType.QUESTION_MARK:
+        cond = self.parse_binary()
+        if self.peek_type() != TokenType.QUESTION_MARK:
             return cond
         self.consume(TokenType.QUESTION_MARK)
         if_stm = self.parse_assignment()
@@ -453,96 +568,46 @@ class Parser:
         else_stm = self.parse_conditional()
         return Conditional(condition=cond, if_statement=if_stm, else_statement=else_stm, line=cond.line)
 
-    def parse_or(self) -> Exp:
-        exp = self.parse_and()
-        while self.peek().type == TokenType.OR:
-            self.pos += 1
-            next_exp = self.parse_and()
-            exp = OR(operand1=exp, operand2=next_exp, line=exp.line)
-        return exp
-    
-    def parse_and(self) -> Exp:
-        exp = self.parse_equality()
-        while self.peek().type == TokenType.AND:
-            self.pos += 1
-            next_exp = self.parse_equality()
-            exp = AND(operand1=exp, operand2=next_exp, line=exp.line)
-        return exp
-
-    def parse_equality(self) -> Exp:
-        exp = self.parse_inequality()
-        while self.peek().type == TokenType.EQUAL or self.peek().type == TokenType.NOT_EQUAL:
-            op = self.consume(TokenType.EQUAL, TokenType.NOT_EQUAL)
-            next_exp = self.parse_inequality()
-            exp = Equality(operator=op.type, operand1=exp, operand2=next_exp, line=exp.line)
-        return exp
-
-    def parse_inequality(self) -> Exp:
-        exp = self.parse_bit_or()
-        while (self.peek().type == TokenType.LESS_THAN or self.peek().type == TokenType.LESS_THAN_OR_EQUAL
-        or self.peek().type == TokenType.GREATER_THAN or self.peek().type == TokenType.GREATER_THAN_OR_EQUAL):
-            op = self.consume(
-                TokenType.LESS_THAN, TokenType.LESS_THAN_OR_EQUAL,
-                TokenType.GREATER_THAN, TokenType.GREATER_THAN_OR_EQUAL
-                )
-            next_exp = self.parse_bit_or()
-            exp = Inequality(operator=op.type, operand1=exp, operand2=next_exp, line=exp.line)
-        return exp
-
-    def parse_bit_or(self) -> Exp:
-        exp = self.parse_bit_xor()
-        while self.peek().type == TokenType.BIT_OR:
+    # Precedence climbing over BINARY_OPERATORS, every operator is left associative.
+    # Only operators that bind at least as tightly as min_precedence are taken here,
+    # the right hand side is parsed one level higher so equal operators group to the left.
+    def parse_binary(self, min_precedence: int = 1) -> Exp:
+        exp = self.parse_fact()
+        while True:
+            operator = self.peek_type()
+            entry = BINARY_OPERATORS.get(operator)
+            if entry is None or entry[0] < min_precedence:
+                return exp
+            precedence, make = entry
             self.pos += 1
-            next_exp = self.parse_bit_xor()
-            exp = BitOR(operand1=exp, operand2=next_exp, line=exp.line)
-        return exp
+            rhs = self.parse_binary(precedence + 1)
+            exp = make(operator, exp, rhs)
 
-    def parse_bit_xor(self) -> Exp:
-        exp = self.parse_bit_and()
-        while self.peek().type == TokenType.BIT_XOR:
+    def parse_fact(self) -> Exp:
+        # Literals and plain variables are by far the most common, they are read
+        # straight from the buffer without building a Token
+        _type = self.peek_type()
+        if _type == TokenType.INT_LITERAL:
             self.pos += 1
-            next_exp = self.parse_bit_and()
-            exp = BitXOR(operand1=exp, operand2=next_exp, line=exp.line)
-        return exp
-    
-    def parse_bit_and(self) -> Exp:
-        exp = self.parse_bit_shift()
-        while self.peek().type == TokenType.BIT_AND:
+            return IntLiteral(value=int(self.tokens.value_at(self.pos - 1)), line=self.tokens.line_at(self.pos - 1))
+        elif _type == TokenType.ID:
+            tok_pos = self.pos
             self.pos += 1
-            next_exp = self.parse_bit_shift()
-            exp = BitAND(operand1=exp, operand2=next_exp, line=exp.line)
-        return exp
-
-    def parse_bit_shift(self) -> Exp:
-        exp = self.parse_addsub()
-        while self.peek().type == TokenType.BIT_SHIFT_LEFT or self.peek().type == TokenType.BIT_SHIFT_RIGHT:
-            op = self.consume(TokenType.BIT_SHIFT_LEFT, TokenType.BIT_SHIFT_RIGHT)
-            shift_amount = self.parse_addsub()
-            exp = BitShift(operator=op.type, value=exp, shift=shift_amount, line=exp.line)
-        return exp
-
-    def parse_addsub(self) -> Exp:
-        term = self.parse_term()
-        while self.peek().type == TokenType.ADDITION or self.peek().type == TokenType.SUBTRACTION:
-            op = self.consume(TokenType.ADDITION, TokenType.SUBTRACTION)
-            next_term = self.parse_term()
-            term = AddSub(operator=op.type, operand1=term, operand2=next_term, line=term.line)
-        return term
-    
-    def parse_term(self) -> Exp:
-        fact = self.parse_fact()
-        while (
-            self.peek().type == TokenType.MULTIPLICATION
-            or self.peek().type == TokenType.DIVISION
-            or self.peek().type == TokenType.MODULO
-            ):
-            op = self.consume(TokenType.MULTIPLICATION, TokenType.DIVISION, TokenType.MODULO)
-            next_fact = self.parse_fact()
-            fact = MultDivMod(operator=op.type, operand1=fact, operand2=next_fact, line=fact.line)
-        return fact
-    
-
-    def parse_fact(self) -> Exp:
+            if self.peek_type() == TokenType.OPEN_PARENTHESIS:
+                return self.parse_func_call(self.tokens[tok_pos])
+            name, line = self.tokens.value_at(tok_pos), self.tokens.line_at(tok_pos)
+            declared = self.search_blocks(name)
+            if not declared:
+                self.error.report(error_msg=f"Variable {name} not declared at this scope", line=line, type="SyntaxError")
+                self.error.display("Parsing")
+            _type = declared.type
+            if self.peek_type() == TokenType.INCREMENT:
+                self.consume(TokenType.INCREMENT)
+                return Increment(id=name, prefix=False, line=line, type=_type)
+            elif self.peek_type() == TokenType.DECREMENT:
+                self.consume(TokenType.DECREMENT)
+                return Decrement(id=name, prefix=False, line=line, type=_type)
+            return Var(id=name, line=line, type=_type)
         tok = self.consume(
             TokenType.OPEN_PARENTHESIS,
             TokenType.INT_LITERAL,
@@ -558,9 +623,6 @@ class Parser:
             self.consume(TokenType.CLOSE_PARENTHESIS)
             return Parenthesis(exp=tok, line=tok.line)
         
-        elif tok.type == TokenType.INT_LITERAL:
-            return IntLiteral(value=int(tok.value), line=tok.line)
-        
         elif (
             tok.type == TokenType.BIT_COMP or tok.type == TokenType.SUBTRACTION 
             or tok.type == TokenType.LOGICAL_NEGATION 
@@ -570,52 +632,263 @@ class Parser:
 
         elif tok.type == TokenType.INCREMENT or tok.type == TokenType.DECREMENT:
             id = self.consume(TokenType.ID)
-            declared = self.search_blocks(tok.value)
+            declared = self.search_blocks(id.value)
             if not declared:
-                error.report(error_msg=f"Variable {tok.value} not declared at this scope", line=tok.line, type="SyntaxError")
-            _type = declared.type 
+                self.error.report(error_msg=f"Variable {id.value} not declared at this scope", line=id.line, type="SyntaxError")
+                self.error.display("Parsing")
+            _type = declared.type
             if tok.type == TokenType.INCREMENT:
                 return Increment(id=id.value, prefix=True, line=tok.line, type=_type)
             elif tok.type == TokenType.DECREMENT:
                 return Decrement(id=id.value, prefix=True, line=tok.line, type=_type)
 
-        
-        elif tok.type == TokenType.ID:
-            if self.peek().type == TokenType.OPEN_PARENTHESIS:
-                return self.parse_func_call(tok)
-            declared = self.search_blocks(tok.value)
-            if not declared:
-                error.report(error_msg=f"Variable {tok.value} not declared at this scope", line=tok.line, type="SyntaxError")
-            _type = declared.type
-            if self.peek().type == TokenType.INCREMENT:
-                self.consume(TokenType.INCREMENT)
-                return Increment(id=tok.value, prefix=False, line=tok.line, type=_type)
-            elif self.peek().type == TokenType.DECREMENT:
-                self.consume(TokenType.DECREMENT)
-                return Decrement(id=tok.value, prefix=False, line=tok.line, type=_type)
-                
-            else:
-                return Var(id=tok.value, line=tok.line, type=_type)
-
     def parse_func_call(self, name: Token):
-        if name.value not in global_table:
-            error.report(error_msg=f"Cannot call undeclared function {name.value}", line=name.line, type="SyntaxError")
-            error.display("Parsing")
-        self.consume(TokenType.OPEN_PARENTHESIS)
+        self.parse_call_head(name)
         params = []
-        while self.peek().type != TokenType.CLOSE_PARENTHESIS:
+        while self.peek_type() != TokenType.CLOSE_PARENTHESIS:
             arg = self.parse_conditional()
             params.append(arg)
-            if self.peek().type == TokenType.COMMA:
+            if self.peek_type() == TokenType.COMMA:
                 self.consume(TokenType.COMMA)
+        return self.build_call(name, params)
+
+    def parse_call_head(self, name: Token):
+        if name.value not in self.global_table:
+            self.error.report(error_msg=f"Cannot call undeclared function {name.value}", line=name.line, type="SyntaxError")
+            self.error.display("Parsing")
+        self.consume(TokenType.OPEN_PARENTHESIS)
 
-        func = global_table[name.value] 
+    def build_call(self, name: Token, params: list) -> FunctionCall:
+        func = self.global_table[name.value]
         if isinstance(func, GlobalEntry):
-            error.report(error_msg=f"'{func.id}' is not a function", line=name.line, type="SyntaxError")  
+            self.error.report(error_msg=f"'{func.id}' is not a function", line=name.line, type="SyntaxError")  
         elif len(func.variables) != len(params):
-            error.report(
+            self.error.report(
                 error_msg=f"Incorrect parameter count in calling function {name.value}",
                 line=name.line, type="SyntanError"
             )
         self.consume(TokenType.CLOSE_PARENTHESIS)
-        return FunctionCall(name=name.value, param=params, line=name.line)
\ No newline at end of file
+        return FunctionCall(name=name.value, param=params, line=name.line)
+    # Stack mode.
+    # The stack_* methods mirror the parse_* methods above but are generators, where
+    # a parse_* method would recurse they yield the generator for the inner construct
+    # and are sent back what it built. run_stack keeps those generators on a list,
+    # so nesting depth costs heap memory instead of Python stack frames.
+    # Anything that cannot nest (literals, variables, the heads of declarations and
+    # assignments) is shared with the recursive mode.
+    def run_stack(self, gen):
+        stack = [gen]
+        value = None
+        while stack:
+            try:
+                child = stack[-1].send(value)
+            except StopIteration as done:
+                stack.pop()
+                value = done.value
+            else:
+                stack.append(child)
+                value = None
+        return value
+
+    def stack_global(self):
+        _type = self.consume(
+            TokenType.INT, TokenType.FLOAT,
+            TokenType.CHAR, TokenType.VOID
+            )
+        name = self.consume(TokenType.ID)
+        if self.peek_type() == TokenType.ASSIGNMENT or self.peek_type() == TokenType.SEMICOLON:
+            val = 0
+            init = False
+            if self.peek_type() == TokenType.ASSIGNMENT:
+                init = True
+                self.consume(TokenType.ASSIGNMENT)
+                val = yield self.stack_assignment()
+            return self.declare_global_var(_type, name, init, val)
+        signature = self.parse_signature(return_type=_type, name=name)
+        if signature is None:
+            return
+        func, symbol = signature
+        func.body = yield self.stack_block(symbol)
+        return func
+
+    def stack_block(self, table: SymbolTable = None):
+        self.open_block(table)
+        items = []
+        while self.peek_type() != TokenType.CLOSE_BRACE:
+            if self.peek_type() in self.keywords:
+                items.append((yield self.stack_declare()))
+            elif self.next_is_block():
+                items.append((yield self.stack_block()))
+            else:
+                items.append((yield self.stack_statement()))
+        return self.close_block(items)
+
+    # A block or a single statement, as allowed after if, else, for, while and do
+    def stack_body(self):
+        if self.next_is_block():
+            return (yield self.stack_block())
+        return (yield self.stack_statement())
+
+    def stack_statement(self):
+        if self.peek_type() == TokenType.RETURN:
+            ret = self.consume(TokenType.RETURN)
+            if self.peek_type() == TokenType.SEMICOLON:
+                stm = Return(line=ret.line)
+            else:
+                exp = yield self.stack_assignment()
+                stm = Return(exp=exp, line=ret.line)
+            self.consume(TokenType.SEMICOLON)
+            return stm
+        elif self.peek_type() == TokenType.IF:
+            return (yield self.stack_if())
+        elif self.peek_type() == TokenType.FOR:
+            return (yield self.stack_for())
+        elif self.peek_type() == TokenType.WHILE:
+            self.consume(TokenType.WHILE)
+            self.consume(TokenType.OPEN_PARENTHESIS)
+            control = yield self.stack_assignment()
+            self.consume(TokenType.CLOSE_PARENTHESIS)
+            stm = yield self.stack_body()
+            return While(condition=control, statement=stm)
+        elif self.peek_type() == TokenType.DO:
+            self.consume(TokenType.DO)
+            stm = yield self.stack_body()
+            self.consume(TokenType.WHILE)
+            self.consume(TokenType.OPEN_PARENTHESIS)
+            control = yield self.stack_assignment()
+            self.consume(TokenType.CLOSE_PARENTHESIS)
+            self.consume(TokenType.SEMICOLON)
+            return DoWhile(statement=stm, condition=control)
+        elif self.peek_type() == TokenType.BREAK or self.peek_type() == TokenType.CONTINUE:
+            return self.parse_statement()
+        else:
+            exp = yield self.stack_exp_statement()
+            self.consume(TokenType.SEMICOLON)
+            return exp
+
+    def stack_declare(self):
+        _type, id = self.parse_declare_head()
+        val = None
+        init = False
+        if self.peek_type() == TokenType.ASSIGNMENT:
+            init = True
+            self.consume(TokenType.ASSIGNMENT)
+            val = yield self.stack_assignment()
+        return self.declare_local(_type, id, init, val)
+
+    def stack_if(self):
+        self.consume(TokenType.IF)
+        self.consume(TokenType.OPEN_PARENTHESIS)
+        cond = yield self.stack_assignment()
+        self.consume(TokenType.CLOSE_PARENTHESIS)
+        if_stm = yield self.stack_body()
+        if self.peek_type() != TokenType.ELSE:
+            return If(condition=cond, if_statement=if_stm)
+        self.consume(TokenType.ELSE)
+        if self.peek_type() == TokenType.IF:
+            else_stm = yield self.stack_if()
+        else:
+            else_stm = yield self.stack_body()
+        return If(condition=cond, if_statement=if_stm, else_statement=else_stm)
+
+    def stack_for(self):
+        self.consume(TokenType.FOR)
+        self.consume(TokenType.OPEN_PARENTHESIS)
+        symbol = None
+        if self.peek_type() == TokenType.INT:
+            self.scopes.push()
+            init = yield self.stack_declare()
+        else:
+            init = yield self.stack_exp_statement()
+            self.consume(TokenType.SEMICOLON)
+        control = yield self.stack_exp_statement()
+        self.consume(TokenType.SEMICOLON)
+        if not control.exp:
+            control = ExpStatement(line=control.line, exp=IntLiteral(value=1, line=control.line))
+        post_exp = yield self.stack_exp_statement()
+        self.consume(TokenType.CLOSE_PARENTHESIS)
+        stm = yield self.stack_body()
+        if isinstance(init, Declare):
+            symbol = self.scopes.pop()
+        return For(initial=init, condition=control, post_exp=post_exp, statement=stm, symboltable=(symbol if symbol else None))
+
+    def stack_exp_statement(self):
+        if self.peek_type() == TokenType.SEMICOLON or self.peek_type() == TokenType.CLOSE_PARENTHESIS:
+            return self.parse_exp_statement()
+        exp = yield self.stack_assignment()
+        return ExpStatement(line=exp.line, exp=exp)
+
+    def stack_comma_exp(self):
+        exp = yield self.stack_assignment()
+        while self.peek_type() == TokenType.COMMA:
+            self.consume(TokenType.COMMA)
+            rhs_exp = yield self.stack_assignment()
+            exp = CommaExp(lhs=exp, rhs=rhs_exp, line=exp.line)
+        return exp
+
+    def stack_assignment(self):
+        head = self.parse_assign_head()
+        if head is None:
+            return (yield self.stack_conditional())
+        assign = yield self.stack_assignment()
+        return self.build_assign(*head, assign)
+
+    def stack_conditional(self):
+        cond = yield self.stack_binary()
+        if self.peek_type() != TokenType.QUESTION_MARK:
+            return cond
+        self.consume(TokenType.QUESTION_MARK)
+        if_stm = yield self.stack_assignment()
+        self.consume(TokenType.COLON)
+        else_stm = yield self.stack_conditional()
+        return Conditional(condition=cond, if_statement=if_stm, else_statement=else_stm, line=cond.line)
+
+    def stack_binary(self, min_precedence: int = 1):
+        if self.operand_nests():
+            exp = yield self.stack_fact()
+        else:
+            exp = self.parse_fact()
+        while True:
+            operator = self.peek_type()
+            entry = BINARY_OPERATORS.get(operator)
+            if entry is None or entry[0] < min_precedence:
+                return exp
+            precedence, make = entry
+            self.pos += 1
+            rhs = yield self.stack_binary(precedence + 1)
+            exp = make(operator, exp, rhs)
+
+    # Whether the operand ahead can contain other expressions, the rest are parsed
+    # directly without going through the work stack
+    def operand_nests(self) -> bool:
+        _type = self.peek_type()
+        if _type == TokenType.ID:
+            return self.tokens.has(self.pos + 1) and self.tokens.type_at(self.pos + 1) == TokenType.OPEN_PARENTHESIS
+        return _type not in (TokenType.INT_LITERAL, TokenType.INCREMENT, TokenType.DECREMENT)
+
+    def stack_fact(self):
+        _type = self.peek_type()
+        if _type == TokenType.OPEN_PARENTHESIS:
+            self.consume(TokenType.OPEN_PARENTHESIS)
+            exp = yield self.stack_comma_exp()
+            self.consume(TokenType.CLOSE_PARENTHESIS)
+            return Parenthesis(exp=exp, line=exp.line)
+        elif (
+            _type == TokenType.BIT_COMP or _type == TokenType.SUBTRACTION
+            or _type == TokenType.LOGICAL_NEGATION
+        ):
+            tok = self.consume(_type)
+            inner_exp = yield self.stack_fact()
+            return UnOp(operator=tok.type, operand=inner_exp, line=tok.line)
+        elif _type == TokenType.ID and self.operand_nests():
+            name = self.consume(TokenType.ID)
+            self.parse_call_head(name)
+            params = []
+            while self.peek_type() != TokenType.CLOSE_PARENTHESIS:
+                arg = yield self.stack_conditional()
+                params.append(arg)
+                if self.peek_type() == TokenType.COMMA:
+                    self.consume(TokenType.COMMA)
+            return self.build_call(name, params)
+        # Everything left is a leaf
+        return self.parse_fact()
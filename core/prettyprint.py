@@ -2,95 +2,108 @@ import sys
 import os
 from .lexer import Lexer as lexer
 from .parser import Parser as parser
+from core.util.context import CompilationContext
 from core.data.nodes import *
 
-class PrettyPrinter:
+class PrettyPrinter(Visitor):
     def __init__(self, ast: Program):
         self.ast = ast
 
-    def print_exp(self, exp: Exp) -> str:
-        if (
-            isinstance(exp, OR) or isinstance(exp, AND)
-            or isinstance(exp, BitOR) or isinstance(exp, BitXOR) or isinstance(exp, BitAND)
-            or isinstance(exp, AddSub) or isinstance(exp, MultDivMod)
-            or isinstance(exp, Inequality) or isinstance(exp, Equality)
-         ):
-            return f"{self.print_exp(exp.operand1)}{exp.operator}{self.print_exp(exp.operand2)}"
-        
-        elif isinstance(exp, BitShift):
-            return f"{self.print_exp(exp.value)}{exp.operator}{self.print_exp(exp.shift)}"
-        
-        elif isinstance(exp, Parenthesis):
-            return f"({self.print_exp(exp.exp)})"
-            
-        elif isinstance(exp, UnOp):
-            return f"{exp.operator}{self.print_exp(exp.operand)}"
-        
-        elif isinstance(exp, Increment):
-            if exp.prefix:
-                return f"++{exp.id}"
-            else:
-                return f"{exp.id}++"
-        
-        elif isinstance(exp, Decrement):
-            if exp.prefix:
-                return f"--{exp.id}"
-            else:
-                return f"{exp.id}--"
-            
-        elif isinstance(exp, IntLiteral):
-            return str(exp.value)
-        
-        elif isinstance(exp, Var):
-            return exp.id
-
-        elif isinstance(exp, CommaExp):
-            return f"({self.print_exp(exp.lhs)}, {self.print_exp(exp.rhs)})"
-
-        elif isinstance(exp, Assign):
-            return f"{exp.id.id} = {self.print_exp(exp.exp)}"
-    
-    def print_statement(self, stm: Statement) -> str:
-        if isinstance(stm, Declare):
-            return (
+    # Nodes without a method of their own print nothing
+    def generic_visit(self, node):
+        return None
+
+    @visits(OR, AND, BitOR, BitXOR, BitAND, AddSub, MultDivMod, Inequality, Equality)
+    def print_binary(self, exp: Exp) -> str:
+        return f"{self.visit(exp.operand1)}{exp.operator}{self.visit(exp.operand2)}"
+
+    @visits(BitShift)
+    def print_shift(self, exp: BitShift) -> str:
+        return f"{self.visit(exp.value)}{exp.operator}{self.visit(exp.shift)}"
+
+    @visits(Parenthesis)
+    def print_parenthesis(self, exp: Parenthesis) -> str:
+        return f"({self.visit(exp.exp)})"
+
+    @visits(UnOp)
+    def print_unop(self, exp: UnOp) -> str:
+        return f"{exp.operator}{self.visit(exp.operand)}"
+
+    @visits(Increment)
+    def print_increment(self, exp: Increment) -> str:
+        if exp.prefix:
+            return f"++{exp.id}"
+        else:
+            return f"{exp.id}++"
+
+    @visits(Decrement)
+    def print_decrement(self, exp: Decrement) -> str:
+        if exp.prefix:
+            return f"--{exp.id}"
+        else:
+            return f"{exp.id}--"
+
+    @visits(IntLiteral)
+    def print_int_literal(self, exp: IntLiteral) -> str:
+        return str(exp.value)
+
+    @visits(Var)
+    def print_var(self, exp: Var) -> str:
+        return exp.id
+
+    @visits(CommaExp)
+    def print_comma(self, exp: CommaExp) -> str:
+        return f"({self.visit(exp.lhs)}, {self.visit(exp.rhs)})"
+
+    @visits(Assign)
+    def print_assign(self, exp: Assign) -> str:
+        return f"{exp.id.id} = {self.visit(exp.exp)}"
+
+    @visits(Declare)
+    def print_declare(self, stm: Declare) -> str:
+        return (
             f"{stm.type} {stm.id.id}"
-            + (f"={self.print_exp(stm.exp)}" if stm.exp != None else "")
+            + (f"={self.visit(stm.exp)}" if stm.exp != None else "")
         )
 
-        elif isinstance(stm, Return):
-            return f"RETURN {self.print_exp(stm.exp)}"
+    @visits(Return)
+    def print_return(self, stm: Return) -> str:
+        return f"RETURN {self.visit(stm.exp)}"
+
+    @visits(ExpStatement)
+    def print_exp_statement(self, stm: ExpStatement) -> str:
+        return self.visit(stm.exp)
 
-        elif isinstance(stm, ExpStatement):
-            return self.print_exp(stm.exp)
-    
     def print_function(self, func: Function) -> str:
             fun = f"FUNC INT {func.name}:\n    params: ()\n    body:\n"
-            for s in func.body: 
-                fun += f"           {self.print_statement(s)}\n"
+            for s in func.body.block_items:
+                fun += f"           {self.visit(s)}\n"
             return fun
-    
+
     def print_program(self) -> str:
-        return self.print_function(self.ast.function)
-    
-  
-if len(sys.argv) < 2:
-    print("Usage: python3 prettyprint.py <c_file>")
-    sys.exit(1)
+        return "".join(self.print_function(func) for func in self.ast.funcs if not func.prototype)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python3 -m core.prettyprint <c_file>")
+        sys.exit(1)
 
-path = sys.argv[1]
-if not os.path.exists(path):
-    print(f"Error: file '{path}' could not be found")
-    sys.exit(1)
+    path = sys.argv[1]
+    if not os.path.exists(path):
+        print(f"Error: file '{path}' could not be found")
+        sys.exit(1)
 
-with open(path, "r") as file:
-    text = file.read()
+    with open(path, "r") as file:
+        text = file.read()
 
-tokens = lexer(text).tokenise()
+    context = CompilationContext()
+    tokens = lexer(text, context=context).tokenise_buffer()
 
-ast = parser(tokens).parse_program()
+    ast = parser(tokens, context=context).parse_program()
 
-pretty = PrettyPrinter(ast)
-tree = pretty.print_program()
+    pretty = PrettyPrinter(ast)
+    tree = pretty.print_program()
 
-print(tree)
-print(ast)
\ No newline at end of file
+    print(tree)
+    print(ast)
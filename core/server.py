@@ -0,0 +1,96 @@
+"""
+A compile server that keeps the compiler loaded between compilations.
+Clients connect over a Unix domain socket and send requests made of source text and options, see
+core/util/protocol.py, and get back the assembly, the diagnostics and how long each phase took.
+Every connection is served on a thread of its own and every request is a compilation of its own with a new
+CompilationContext, so requests never see each other's errors or globals. The function cache is the only
+thing requests share: a function compiled for one request is copied out for the next. It holds a bounded
+number of functions and locks around every lookup, so it stays the same size however long the server runs.
+Start it with: python3 main.py --serve [--socket PATH]
+"""
+import os
+import socket
+import socketserver
+import stat
+import time
+from dataclasses import asdict
+from typing import Optional
+from core.compile import CompileOptions, compile_to_assembly
+from core.util.cache import CompileCache, FunctionCache
+from core.util.timing import PassTimer
+from core.util.protocol import DEFAULT_SOCKET, make_socket_dir, send, receive
+
+# Options a request may carry, fields of CompileOptions
+OPTIONS = ("engine", "mode")
+
+def compile_request(request: dict, functions: Optional[FunctionCache] = None) -> dict:
+    start = time.perf_counter()
+    options = request.get("options", {})
+    unknown = sorted(set(options) - set(OPTIONS))
+    if unknown:
+        return {"assembly": None, "diagnostics": [], "stopped": f"Unknown options {unknown}", "timings": {}}
+    try:
+        result = compile_to_assembly(request["text"], CompileOptions(**options, functions=functions, timer=PassTimer()))
+    except Exception as e:  # The server outlives a request the compiler cannot handle
+        return {"assembly": None, "diagnostics": [], "stopped": f"Internal compiler error: {e!r}", "timings": {}}
+    timings = dict(result.timings, compile=time.perf_counter() - start)
+    return {
+        "assembly": result.assembly,
+        "diagnostics": [asdict(diagnostic) for diagnostic in result.diagnostics],
+        "stopped": result.stopped,
+        "timings": timings,
+    }
+
+class CompileHandler(socketserver.BaseRequestHandler):
+    # A client may send any number of requests on one connection
+    def handle(self):
+        while True:
+            request = receive(self.request)
+            if request is None:
+                return
+            send(self.request, compile_request(request, self.server.functions))
+
+class CompileServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path: str = DEFAULT_SOCKET, cache: Optional[CompileCache] = None):
+        make_socket_dir(path)
+        remove_stale_socket(path)
+        self.path = path
+        self.functions = FunctionCache(cache)
+        super().__init__(path, CompileHandler)
+
+    # Only the user that runs the server may connect to it
+    def server_bind(self):
+        super().server_bind()
+        os.chmod(self.path, 0o600)
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+# A socket left behind by a server that did not shut down cleanly is in the way. Only that is removed,
+# anything else at the path, or a socket a server still answers on, is left alone and reported
+def remove_stale_socket(path: str):
+    try:
+        mode = os.lstat(path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise FileExistsError(f"'{path}' exists and is not a socket")
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(path)
+        except ConnectionRefusedError:
+            os.remove(path)
+            return
+    raise FileExistsError(f"A compile server is already listening on '{path}'")
+
+def serve(path: str = DEFAULT_SOCKET, cache: Optional[CompileCache] = None):
+    with CompileServer(path, cache) as server:
+        print(f"Compile server listening on {path}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,234 @@
+# On disk cache of compiler outputs, addressed by a hash of everything that decides the output:
+# the source text, the compiler's own source, the clang version and the options.
+# Entries are written to a temporary file and renamed into place, so concurrent writers never leave
+# a half written entry behind and a reader sees either the whole file or nothing.
+# The cache is kept under max_size by evicting the least recently used entries, a hit refreshes the
+# modification time of its entry so that is what eviction goes by. Writes keep a running total of the size
+# instead of scanning the directory, which is only scanned once the total goes over max_size, and every
+# RECOUNT_EVERY writes so the total takes in what other processes wrote and evicted.
+import hashlib
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Optional
+
+CORE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Hash of the compiler's own source, so a change to the compiler never reuses old outputs
+@lru_cache(maxsize=None)
+def compiler_version() -> str:
+    digest = hashlib.sha256()
+    for folder, dirs, files in sorted(os.walk(CORE)):
+        dirs.sort()
+        for name in sorted(files):
+            if name.endswith(".py"):
+                path = os.path.join(folder, name)
+                digest.update(os.path.relpath(path, CORE).encode())
+                with open(path, "rb") as file:
+                    digest.update(file.read())
+    return digest.hexdigest()
+
+@lru_cache(maxsize=None)
+def clang_version() -> str:
+    try:
+        return subprocess.run(["clang", "--version"], capture_output=True, text=True).stdout
+    except OSError:
+        return ""
+
+# Kinds of output that clang produced
+CLANG_KINDS = ("o", "exe")
+
+RECOUNT_EVERY = 256
+
+class CompileCache:
+    def __init__(self, directory: str, max_size: int = 256 * 1024 * 1024):
+        self.directory = directory
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.size = None    # Bytes held as of the last scan plus what was written since, None before the first scan
+        self.writes = 0
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    # Only outputs that went through clang depend on its version
+    def key(self, text: str, kind: str, options: Optional[dict] = None) -> str:
+        digest = hashlib.sha256()
+        for part in (
+            compiler_version(), clang_version() if kind in CLANG_KINDS else "",
+            kind, repr(sorted((options or {}).items())), text
+        ):
+            digest.update(part.encode())
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key)
+
+    # Copies the entry for key to dest, returns False if there is none
+    def fetch(self, key: str, dest: str) -> bool:
+        path = self.path(key)
+        try:
+            shutil.copy(path, dest)
+        except FileNotFoundError:   # Never stored, or evicted by another process
+            self.misses += 1
+            return False
+        self.hits += 1
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return True
+
+    def store(self, key: str, src: str):
+        self.replace(key, lambda temp: shutil.copy(src, temp))
+
+    # Unlike fetch, reading text is not counted, whoever reads it keeps their own counts
+    def read(self, key: str) -> Optional[str]:
+        path = self.path(key)
+        try:
+            with open(path) as file:
+                text = file.read()
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return text
+
+    # Many small writes in a row can leave eviction to one trim at the end
+    def write(self, key: str, text: str, evict: bool = True):
+        def write_text(temp: str):
+            with open(temp, "w") as file:
+                file.write(text)
+        self.replace(key, write_text, evict)
+
+    # Fills a temporary file next to the entry and renames it into place
+    def replace(self, key: str, fill, evict: bool = True):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        os.close(fd)
+        try:
+            fill(temp)
+            grown = os.path.getsize(temp) - self.size_of(path)
+            os.replace(temp, path)
+        except BaseException:
+            os.remove(temp)
+            raise
+        self.account(grown, evict)
+
+    @staticmethod
+    def size_of(path: str) -> int:
+        try:
+            return os.path.getsize(path)
+        except FileNotFoundError:
+            return 0
+
+    # Adds a write to the running total, a write that does not evict leaves it to the next trim
+    def account(self, grown: int, evict: bool = True):
+        with self.lock:
+            self.writes += 1
+            if self.size is None or self.writes % RECOUNT_EVERY == 0:
+                self.size = None
+            else:
+                self.size += grown
+        if evict:
+            self.trim()
+
+    # Evicts if the cache went over max_size, or if its size has to be counted again
+    def trim(self):
+        with self.lock:
+            if self.size is not None and self.size <= self.max_size:
+                return
+        self.evict()
+
+    def entries(self) -> list:
+        entries = []
+        for shard in os.scandir(self.directory):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.startswith(".tmp-"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    # Removes the least recently used entries until the cache fits in max_size
+    def evict(self):
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:   # Another process evicted it first
+                pass
+            total -= size
+        with self.lock:
+            self.size = total
+
+    def report(self) -> str:
+        return f"Compile cache: {self.hits} hits, {self.misses} misses"
+
+# Assembly of single functions, by CodeGenerator's function_key, so recompiling a file only generates the
+# functions that changed. Fragments are kept in memory and, with a CompileCache, on disk for the next run.
+# At most max_fragments are kept in memory, the least recently used go first, and a lock guards them so
+# one cache can be shared by compilations running on different threads, as the compile server does.
+class FunctionCache:
+    def __init__(self, disk: Optional[CompileCache] = None, max_fragments: int = 4096):
+        self.fragments = OrderedDict()
+        self.max_fragments = max_fragments
+        self.disk = disk
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[str]:
+        with self.lock:
+            assembly = self.fragments.get(key)
+            if assembly is not None:
+                self.fragments.move_to_end(key)
+                self.hits += 1
+                return assembly
+        if self.disk:
+            assembly = self.disk.read(self.disk.key(key, "function"))
+        with self.lock:
+            if assembly is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.remember(key, assembly)
+        return assembly
+
+    # Fragments are written as they are generated but only evicted for once per compilation, see finish
+    def put(self, key: str, assembly: str):
+        with self.lock:
+            self.remember(key, assembly)
+        if self.disk:
+            self.disk.write(self.disk.key(key, "function"), assembly, evict=False)
+
+    # Called once a compilation has put all its functions
+    def finish(self):
+        if self.disk:
+            self.disk.trim()
+
+    # Called with the lock held
+    def remember(self, key: str, assembly: str):
+        self.fragments[key] = assembly
+        self.fragments.move_to_end(key)
+        if len(self.fragments) > self.max_fragments:
+            self.fragments.popitem(last=False)
+
+    def report(self) -> str:
+        return f"Function cache: {self.hits} hits, {self.misses} misses"
@@ -0,0 +1,16 @@
+# Everything a single compilation collects as it goes: the errors reported so far and the table of
+# global variables and functions. Every pass of a compilation is given the same context and every
+# compilation gets a new one, so nothing carries over from one translation unit to the next.
+# Parser, Fold and CodeGenerator must be given the context, so passes chained by hand always share one.
+# A tracer, if the compilation is traced, and stats, if it is counted, go here too so every pass can reach them.
+from typing import Optional
+from core.util.error import ErrorManager
+from core.util.trace import Tracer
+from core.util.stats import Stats
+
+class CompilationContext:
+    def __init__(self, tracer: Optional[Tracer] = None, stats: Optional[Stats] = None):
+        self.error = ErrorManager()
+        self.global_table = {}
+        self.tracer = tracer
+        self.stats = stats
@@ -2,6 +2,7 @@ class ErrorManager:
     def __init__(self):
         self.errors = []
         self.error_count = 0
+        self.stopped = None     # The step display stopped the compilation at
 
     def report(self, error_msg: str, line: int, type: str):
         self.error_count += 1
@@ -18,10 +19,9 @@ class ErrorManager:
         for error in self.errors:
             msg += f"{error[2]}: {error[0]} on line {error[1]}\n"
 
+        self.stopped = step
         raise ErrorManager.Stop(msg)
         
     class Stop(Exception):
         def __init__(self, message: str):
             super().__init__(message)
-
-error = ErrorManager()
\ No newline at end of file
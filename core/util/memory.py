@@ -0,0 +1,102 @@
+# Where a compilation's memory goes, for --mem-report. While a report is running tracemalloc traces every
+# allocation and for each pass the report keeps the highest peak it reached and what was still held when it
+# last finished. Whenever a pass finishes holding clearly more than at the last look, it also takes a
+# snapshot: the allocations still held, grouped by the core module that made them, and the live AST nodes
+# and Tokens, so the report shows what filled memory at its fullest.
+import dataclasses
+import gc
+import os
+import tracemalloc
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from core.data import nodes
+from core.data.token_types import Token
+
+HERE = os.path.abspath(__file__)
+CORE = os.path.dirname(os.path.dirname(HERE))
+ROOT = os.path.dirname(CORE)
+
+# Only snapshot again once memory grew by this much, snapshots cost as much as everything they count
+GROWTH = 1.1
+
+# Classes whose live objects are counted, every AST node class and Token
+COUNTED = tuple(
+    cls for cls in vars(nodes).values()
+    if isinstance(cls, type) and cls.__module__ == nodes.__name__ and dataclasses.is_dataclass(cls)
+) + (Token,)
+
+class MemoryReport:
+    def __init__(self, sites: int = 5):
+        self.sites = sites
+        self.peak = defaultdict(int)
+        self.retained = {}
+        self.snapshot = None    # (memory held, bytes by module, top lines by module, live objects by class)
+        self.started = False
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started = True
+
+    def stop(self):
+        if self.started:
+            tracemalloc.stop()
+            self.started = False
+
+    @contextmanager
+    def phase(self, name: str):
+        tracemalloc.reset_peak()
+        try:
+            yield
+        finally:
+            current, peak = tracemalloc.get_traced_memory()
+            self.peak[name] = max(self.peak[name], peak)
+            self.retained[name] = current
+            if self.snapshot is None or current > self.snapshot[0] * GROWTH:
+                self.take_snapshot(current)
+
+    def take_snapshot(self, current: int):
+        by_module, by_line = Counter(), defaultdict(Counter)
+        for stat in tracemalloc.take_snapshot().statistics("lineno"):
+            path = stat.traceback[0].filename
+            if not path.startswith(CORE) or path == HERE:
+                continue
+            module = os.path.splitext(os.path.relpath(path, ROOT))[0].replace(os.sep, ".")
+            by_module[module] += stat.size
+            by_line[module][f"{os.path.relpath(path, ROOT)}:{stat.traceback[0].lineno}"] += stat.size
+        live = Counter(type(obj).__name__ for obj in gc.get_objects() if isinstance(obj, COUNTED))
+        self.snapshot = (current, by_module, by_line, live)
+
+    def to_dict(self) -> dict:
+        data = {
+            "passes": {name: {"peak": self.peak[name], "retained": self.retained[name]} for name in self.peak},
+            "snapshot": None,
+        }
+        if self.snapshot:
+            current, by_module, by_line, live = self.snapshot
+            data["snapshot"] = {
+                "held": current,
+                "modules": {
+                    module: {"size": size, "sites": dict(by_line[module].most_common(self.sites))}
+                    for module, size in by_module.most_common()
+                },
+                "live": dict(live.most_common()),
+            }
+        return data
+
+    def report(self) -> str:
+        data = self.to_dict()
+        lines = ["Memory by pass:", f"    {'pass':<10}{'peak MB':>12}{'retained MB':>14}"]
+        for name, spent in data["passes"].items():
+            lines.append(f"    {name:<10}{spent['peak'] / 1e6:>12.2f}{spent['retained'] / 1e6:>14.2f}")
+        snapshot = data["snapshot"]
+        if snapshot:
+            lines.append(f"Allocations held by core at {snapshot['held'] / 1e6:.2f} MB:")
+            for module, held in snapshot["modules"].items():
+                lines.append(f"    {module:<32}{held['size'] / 1e6:>10.2f} MB")
+                for site, size in held["sites"].items():
+                    lines.append(f"        {site:<36}{size / 1e6:>10.2f} MB")
+            lines.append("Live objects:")
+            for name, count in snapshot["live"].items():
+                lines.append(f"    {name:<20}{count:>10}")
+        return "\n".join(lines) + "\n"
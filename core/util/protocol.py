@@ -0,0 +1,73 @@
+# Messages between the compile server and its clients. Each message is a JSON object sent as its length
+# in 4 bytes followed by its UTF-8 text. Only the standard library is imported here, so a client that
+# uses this module does not pay for importing the compiler.
+import json
+import os
+import socket
+import stat
+import struct
+import tempfile
+from typing import Optional
+
+LENGTH = struct.Struct(">I")
+
+# Whatever answers on the socket has its assembly run by client.py, so the socket lives in a directory
+# only its user can write to: $XDG_RUNTIME_DIR, or one named after the uid under the temp dir
+def socket_dir() -> str:
+    return os.environ.get("XDG_RUNTIME_DIR") or os.path.join(tempfile.gettempdir(), f"c-compiler-{os.getuid()}")
+
+# Where the server listens unless told otherwise
+DEFAULT_SOCKET = os.environ.get("COMPILE_SERVER") or os.path.join(socket_dir(), "c-compiler.sock")
+
+# Makes the directory the server's socket goes in, readable by its user alone. A directory that is there
+# already has to belong to the user and be closed to everyone else's writes, or another user could swap
+# the socket for one of their own
+def make_socket_dir(path: str):
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    info = os.stat(directory)
+    if info.st_uid != os.getuid() or info.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        raise PermissionError(f"'{directory}' can be written by other users, the socket cannot go there")
+
+# A client only talks to a server run by its own user
+def check_socket(path: str):
+    info = os.lstat(path)
+    if not stat.S_ISSOCK(info.st_mode):
+        raise PermissionError(f"'{path}' is not a socket")
+    if info.st_uid != os.getuid():
+        raise PermissionError(f"'{path}' belongs to another user")
+
+def send(sock: socket.socket, message: dict):
+    data = json.dumps(message).encode()
+    sock.sendall(LENGTH.pack(len(data)) + data)
+
+# Returns None once the other side has closed the connection
+def receive(sock: socket.socket) -> Optional[dict]:
+    header = read_exactly(sock, LENGTH.size)
+    if header is None:
+        return None
+    data = read_exactly(sock, LENGTH.unpack(header)[0])
+    if data is None:
+        raise ConnectionError("Connection closed in the middle of a message")
+    return json.loads(data)
+
+def read_exactly(sock: socket.socket, size: int) -> Optional[bytes]:
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+# Sends one request on a new connection and waits for its response
+def request(text: str, options: Optional[dict] = None, path: str = DEFAULT_SOCKET) -> dict:
+    check_socket(path)
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(path)
+        send(sock, {"text": text, "options": options or {}})
+        response = receive(sock)
+    if response is None:
+        raise ConnectionError("The compile server closed the connection without answering")
+    return response
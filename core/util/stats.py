@@ -0,0 +1,65 @@
+# Counts of what the compiler did, for --stats: the tokens of each type, the AST nodes of each class,
+# symbol lookups and how far they walked, tokens consumed and assignment lookaheads in the parser,
+# the labels made and the instructions written for each opcode.
+# Stats go on the CompilationContext and are only counted when a compilation is given them, the parser
+# and code generator swap in counting versions of their hot paths, so without stats nothing is counted.
+# Stats add up like a PassTimer, across compilations and across the workers of a batch.
+import json
+from collections import Counter
+
+# Every group of counters, in the order they are reported
+GROUPS = ("tokens", "nodes", "lookups", "parser", "labels", "opcodes")
+# Groups whose counts all count the same thing, so their total is reported too
+TOTALLED = ("tokens", "nodes", "labels", "opcodes")
+
+class Stats:
+    def __init__(self):
+        self.tokens = Counter()     # Tokens by TokenType name
+        self.nodes = Counter()      # AST nodes by class, as parsed
+        self.lookups = Counter()    # search_blocks calls, and the scopes and bindings each lookup walked
+        self.parser = Counter()     # Tokens consumed, assignment lookaheads and the ones that turned back
+        self.labels = Counter()     # Labels made by LabelGen, by name
+        self.opcodes = Counter()    # Instructions written, by opcode
+
+    def add(self, other: "Stats"):
+        for group in GROUPS:
+            getattr(self, group).update(getattr(other, group))
+
+    def to_dict(self) -> dict:
+        return {group: dict(getattr(self, group).most_common()) for group in GROUPS}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Stats":
+        stats = cls()
+        for group in GROUPS:
+            getattr(stats, group).update(data.get(group, {}))
+        return stats
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), indent=2)
+
+    def report(self) -> str:
+        lines = ["Compiler stats:"]
+        for group, counts in self.to_dict().items():
+            lines.append(f"    {group} ({sum(counts.values())}):" if group in TOTALLED else f"    {group}:")
+            for name, count in counts.items():
+                lines.append(f"        {name:<24}{count:>10}")
+        return "\n".join(lines) + "\n"
+
+# Passes the assembly on to out counting the instructions on the way. Labels end in a colon and directives
+# start with a dot, every other line is an instruction starting with its opcode
+class InstructionCounter:
+    def __init__(self, out, stats: Stats):
+        self.out = out
+        self.stats = stats
+
+    # A label may share its line with an instruction, which is counted as if it had a line of its own
+    def write(self, text: str):
+        opcodes = self.stats.opcodes
+        for line in text.splitlines():
+            words = line.split(None, 1)
+            while words and words[0].endswith(":"):
+                words = words[1].split(None, 1) if len(words) > 1 else None
+            if words and not words[0].startswith("."):
+                opcodes[words[0]] += 1
+        return self.out.write(text)
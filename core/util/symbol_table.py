@@ -1,5 +1,6 @@
 # For inserting and retrieving entries to and from the symbol table. More will be explained in the documents
 from core.data.token_types import TokenType
+from collections import Counter
 from typing import Optional
 class SymbolEntry:
     def __init__(self, id: str, type: TokenType, initialised: bool, line: int, offset: Optional[int] = None):
@@ -14,6 +15,14 @@ class GlobalEntry(SymbolEntry):
         super().__init__(id, type, initialised, line)
         self.exp = None
 
+# What the rest of the unit needs to know about a function, its body is not kept
+class FunctionEntry:
+    def __init__(self, id: str, variables: list[tuple], return_type: TokenType, prototype: bool):
+        self.id = id
+        self.variables = variables
+        self.return_type = return_type
+        self.prototype = prototype
+
 class LabelEntry:
     def __init__(self, id: str, name: str):
         self.id = id
@@ -33,4 +42,85 @@ class SymbolTable:
     def get(self, id: str) -> SymbolEntry:
         return self.table[id]
 
-global_table = {}
\ No newline at end of file
+# All scopes that are open at once, with constant time lookup however deeply they nest.
+# Every name maps to a stack of its bindings with the innermost last, and the names bound are
+# logged in order so closing a scope only has to undo what that scope bound.
+# A scope only gets a SymbolTable once something is declared in it, empty blocks never get one.
+class ScopedSymbolTable:
+    def __init__(self):
+        self.bindings = {}  # id -> [(depth, entry), ...]
+        self.log = []       # ids in the order they were bound
+        self.marks = []     # length of the log when each open scope was entered
+        self.tables = []    # table of each open scope, None until something is declared in it
+
+    def push(self, table: SymbolTable = None):
+        self.marks.append(len(self.log))
+        self.tables.append(table)
+        if table:
+            for id, entry in table.table.items():
+                self.bind(id, entry)
+
+    # Closes the innermost scope and returns its table, None if nothing was declared in it
+    def pop(self) -> Optional[SymbolTable]:
+        mark = self.marks.pop()
+        for id in self.log[mark:]:
+            shadows = self.bindings[id]
+            shadows.pop()
+            if not shadows:
+                del self.bindings[id]
+        del self.log[mark:]
+        return self.tables.pop()
+
+    # Makes an entry visible in the innermost scope without recording it in its table
+    def bind(self, id: str, entry):
+        self.bindings.setdefault(id, []).append((len(self.marks), entry))
+        self.log.append(id)
+
+    # Declares an entry in the innermost scope, its table is created on the first declaration
+    def insert(self, id: str, entry: SymbolEntry):
+        table = self.tables[-1]
+        if table is None:
+            table = self.tables[-1] = SymbolTable()
+        table.insert(id=id, entry=entry)
+        self.bind(id, entry)
+
+    def current(self) -> Optional[SymbolTable]:
+        return self.tables[-1]
+
+    def declared_in_scope(self, id: str) -> bool:
+        shadows = self.bindings.get(id)
+        return shadows is not None and shadows[-1][0] == len(self.marks)
+
+    # Returns the innermost entry for id. Given a line, entries declared after that line are
+    # skipped in favour of an outer one, the way a block's table already holds later declarations
+    def get(self, id: str, line: int = None):
+        shadows = self.bindings.get(id)
+        if shadows is None:
+            return None
+        if not line:
+            return shadows[-1][1]
+        for depth, entry in reversed(shadows):
+            if line >= entry.line:
+                return entry
+        return None
+
+
+# A ScopedSymbolTable that counts its lookups, for Stats. For every name found it counts how many scopes out
+# from the innermost one it was bound and how many of the name's bindings were looked at to find it
+class CountingScopedSymbolTable(ScopedSymbolTable):
+    def __init__(self, counts: Counter):
+        super().__init__()
+        self.counts = counts
+
+    def get(self, id: str, line: int = None):
+        counts = self.counts
+        shadows = self.bindings.get(id, ())
+        for walked, (depth, entry) in enumerate(reversed(shadows), 1):
+            if not line or line >= entry.line:
+                counts["scope hits"] += 1
+                counts["scope depth walked"] += len(self.marks) - depth
+                counts["bindings walked"] += walked
+                return entry
+        counts["scope misses"] += 1
+        counts["bindings walked"] += len(shadows)
+        return None
@@ -0,0 +1,85 @@
+# Wall and CPU time of each pass of a compilation, with counts of what the passes handled, for --time-passes.
+# CPU time includes the time of finished child processes, so clang and the program are counted too.
+# A timer can be given to any number of compilations and adds them all up.
+import json
+import os
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+# Passes in the order they run, with the count each one's rate is given in
+PASSES = {
+    "lex": "tokens",
+    "parse": "nodes",
+    "fold": None,
+    "codegen": "lines",
+    "assemble": None,
+    "run": None,
+}
+
+# os.times only counts in clock ticks, good enough for child processes that run for a while but not for passes
+def cpu_time() -> float:
+    times = os.times()
+    return time.process_time() + times.children_user + times.children_system
+
+class PassTimer:
+    def __init__(self):
+        self.wall = defaultdict(float)
+        self.cpu = defaultdict(float)
+        self.counts = defaultdict(int)
+
+    @contextmanager
+    def time(self, name: str):
+        wall, cpu = time.perf_counter(), cpu_time()
+        try:
+            yield
+        finally:
+            self.wall[name] += time.perf_counter() - wall
+            self.cpu[name] += cpu_time() - cpu
+
+    def count(self, name: str, amount: int = 1):
+        self.counts[name] += amount
+
+    def add(self, other: "PassTimer"):
+        for mine, theirs in ((self.wall, other.wall), (self.cpu, other.cpu), (self.counts, other.counts)):
+            for name, value in theirs.items():
+                mine[name] += value
+
+    # Handled per second of the pass that handled them, such as tokens per second of lexing
+    def rates(self) -> dict:
+        return {
+            f"{count}/s": self.counts[count] / self.wall[name]
+            for name, count in PASSES.items() if count and self.wall.get(name)
+        }
+
+    def to_dict(self) -> dict:
+        names = [name for name in PASSES if name in self.wall] + [name for name in self.wall if name not in PASSES]
+        return {
+            "passes": {name: {"wall": self.wall[name], "cpu": self.cpu[name]} for name in names},
+            "total": {"wall": sum(self.wall.values()), "cpu": sum(self.cpu.values())},
+            "counts": dict(self.counts),
+            "rates": self.rates(),
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), indent=2)
+
+    def report(self) -> str:
+        data = self.to_dict()
+        total = data["total"]["wall"] or 1
+        lines = ["Pass timings:", f"    {'pass':<10}{'wall ms':>12}{'cpu ms':>12}{'share':>9}"]
+        for name, spent in list(data["passes"].items()) + [("total", data["total"])]:
+            lines.append(f"    {name:<10}{spent['wall'] * 1e3:>12.2f}{spent['cpu'] * 1e3:>12.2f}{spent['wall'] / total:>9.1%}")
+        for name, rate in data["rates"].items():
+            lines.append(f"    {name:<10}{rate:>12.0f}")
+        return "\n".join(lines) + "\n"
+
+# Passes the assembly on to out counting its lines on the way
+class LineCounter:
+    def __init__(self, out, timer: PassTimer):
+        self.out = out
+        self.timer = timer
+
+    def write(self, text: str):
+        self.timer.count("lines", text.count("\n"))
+        return self.out.write(text)
@@ -0,0 +1,42 @@
+# Records what a compilation did and when as Chrome trace events, for chrome://tracing or Perfetto.
+# Every pass, and every function inside folding and code generation, is a span: a begin event and an end
+# event on the thread that ran it. Arguments given when a span starts go on its begin event and whatever
+# is put in the dict it yields goes on its end event, the viewer shows both together.
+# A compilation is only traced if its CompilationContext has a tracer, without one nothing is recorded.
+# Tracers from the workers of a batch add up into one trace, every event keeps the process it came from.
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+class Tracer:
+    def __init__(self):
+        self.events = []
+        self.pid = os.getpid()
+
+    def event(self, phase: str, name: str, category: str, args: dict):
+        self.events.append({
+            "name": name, "cat": category, "ph": phase, "ts": time.perf_counter_ns() / 1000,
+            "pid": self.pid, "tid": threading.get_ident(), "args": args,
+        })
+
+    @contextmanager
+    def span(self, name: str, category: str, args: Optional[dict] = None):
+        self.event("B", name, category, args or {})
+        end = {}
+        try:
+            yield end
+        finally:
+            self.event("E", name, category, end)
+
+    def add(self, other: "Tracer"):
+        self.events.extend(other.events)
+
+    def to_dict(self) -> dict:
+        return {"traceEvents": self.events, "displayTimeUnit": "ms"}
+
+    def write(self, path: str):
+        with open(path, "w") as file:
+            json.dump(self.to_dict(), file)
@@ -1,22 +1,187 @@
+import argparse
 import os
 import sys
 from core.compile import compile
+from core.batch import compile_many
+from core.build import build_many
+from core.parser import MODES as PARSE_MODES
+from core.server import serve
+from core.util.cache import CompileCache
+from core.util.protocol import DEFAULT_SOCKET
+from core.util.timing import PassTimer
+from core.util.trace import Tracer
+from core.util.memory import MemoryReport
+from core.util.stats import Stats
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compile C files to x86-64 assembly")
+    parser.add_argument("files", nargs="*", metavar="c_file")
+    emit = parser.add_mutually_exclusive_group()
+    emit.add_argument("-S", dest="mode", action="store_const", const="s", help="only write the assembly (default: <name>.s)")
+    emit.add_argument("-c", dest="mode", action="store_const", const="o", help="only assemble to an object file (default: <name>.o)")
+    parser.add_argument("-o", dest="output", metavar="PATH", help="write the output here, on its own: link here without running")
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=None,
+        help="compile the files to .s in this many processes (default: one per CPU) instead of running one"
+    )
+    parser.add_argument("--out-dir", help="where the .s files of a batch go (default: next to each file)")
+    parser.add_argument(
+        "--build", action="store_true",
+        help="link and run every file, running clang and each program while the next file compiles"
+    )
+    parser.add_argument(
+        "--max-procs", type=int, default=None,
+        help="with --build, run at most this many clang and program processes at a time (default: one per CPU)"
+    )
+    parser.add_argument(
+        "--time-passes", action="store_true",
+        help="after compiling, print how long each pass took to stderr, added up over a batch"
+    )
+    parser.add_argument("--time-passes-format", choices=("text", "json"), default="text", help="how --time-passes prints")
+    parser.add_argument(
+        "--trace", metavar="PATH", help="write a Chrome trace of the compilation, or of every file of a batch, to PATH"
+    )
+    parser.add_argument(
+        "--mem-report", action="store_true",
+        help="after compiling, print the memory each pass held and what held it to stderr"
+    )
+    parser.add_argument(
+        "--stats", action="store_true",
+        help="after compiling, print counts of tokens, nodes, lookups, labels and instructions to stderr"
+    )
+    parser.add_argument("--stats-format", choices=("text", "json"), default="text", help="how --stats prints")
+    parser.add_argument(
+        "--parse-mode", choices=PARSE_MODES, default="recursive",
+        help="how the parser follows nesting: on the Python stack, or on a stack of its own with no depth limit"
+    )
+    parser.add_argument("--serve", action="store_true", help="run a compile server for client.py instead of compiling")
+    parser.add_argument(
+        "--socket", metavar="PATH", help=f"with --serve, the Unix socket to listen on (default: {DEFAULT_SOCKET})"
+    )
+    args = parser.parse_args()
+    if args.serve and args.files:
+        parser.error("--serve takes no c_file, give the socket with --socket")
+    if args.socket and not args.serve:
+        parser.error("--socket can only be used with --serve")
+    if not args.files and not args.serve:
+        parser.error("no c_file given")
+    batch = not args.build and (len(args.files) > 1 or args.jobs is not None)
+    # A batch only writes assembly and a build always runs, neither has another output to choose
+    if (args.mode or args.output) and (args.build or args.jobs is not None):
+        parser.error("-S, -c and -o cannot be used with --build or -j")
+    if (args.mode or args.output) and len(args.files) != 1:
+        parser.error("-S, -c and -o take a single c_file")
+    if args.build and args.jobs is not None:
+        parser.error("-j cannot be used with --build, limit its processes with --max-procs")
+    if args.out_dir and not batch:
+        parser.error("--out-dir only applies to a batch, more than one c_file or -j, without --build")
+    if args.max_procs is not None and not args.build:
+        parser.error("--max-procs can only be used with --build")
+    # A build overlaps compiling with clang and the programs, so its passes cannot be timed one by one
+    if args.build and args.time_passes:
+        parser.error("--time-passes cannot be used with --build")
+    if args.build and args.trace:
+        parser.error("--trace cannot be used with --build")
+    if args.build and args.stats:
+        parser.error("--stats cannot be used with --build")
+    # tracemalloc only sees this process, not the workers of a batch or the clang and programs of a build
+    if args.mem_report and (args.build or args.jobs is not None or len(args.files) > 1):
+        parser.error("--mem-report takes a single c_file and cannot be used with -j or --build")
+    return args
 
 def main():
-    if len(sys.argv) < 2:
-        print("Usage: python3 main.py <c_file>")
-        sys.exit(1)
+    args = parse_args()
+    # Outputs are cached on disk when COMPILE_CACHE_DIR is set
+    cache_dir = os.environ.get("COMPILE_CACHE_DIR")
+
+    if args.serve:
+        try:
+            serve(args.socket or DEFAULT_SOCKET, CompileCache(cache_dir) if cache_dir else None)
+        except (FileExistsError, PermissionError) as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        return
+
+    for path in args.files:
+        if not os.path.exists(path):
+            print(f"Error: File '{path}' not found")
+            sys.exit(1)
 
-    path = sys.argv[1]
-    if not os.path.exists(path):
-        print(f"Error: File '{path}' not found")
-        sys.exit(1)
+    if args.build:
+        failed = 0
+        cache = CompileCache(cache_dir) if cache_dir else None
+        for result in build_many(args.files, args.max_procs, cache=cache, parse_mode=args.parse_mode):
+            if result.error:
+                failed += 1
+                print(f"{result.path}: {result.error}")
+            else:
+                print(f"{result.path}: Program exited with: {result.returncode}")
+        sys.exit(1 if failed else 0)
 
-    with open(path, "r") as file:
+    # More than one file, or --jobs, compiles a batch to assembly
+    if len(args.files) > 1 or args.jobs is not None:
+        failed = 0
+        stats = Stats() if args.stats else None
+        timer = PassTimer() if args.time_passes else None
+        tracer = Tracer() if args.trace else None
+        results = compile_many(
+            args.files, args.jobs, args.out_dir, cache_dir, args.stats, args.time_passes, bool(args.trace), args.parse_mode
+        )
+        for result in results:
+            if result.error:
+                failed += 1
+                print(f"{result.path}: {result.error}")
+            else:
+                print(f"{result.path} -> {result.output} ({result.seconds * 1e3:.1f}ms)")
+            if result.stats:
+                stats.add(result.stats)
+            if result.timer:
+                timer.add(result.timer)
+            if result.tracer:
+                tracer.add(result.tracer)
+        if stats:
+            print_stats(stats, args.stats_format)
+        if timer:
+            print_timer(timer, args.time_passes_format)
+        if tracer:
+            tracer.write(args.trace)
+        sys.exit(1 if failed else 0)
+
+    with open(args.files[0], "r") as file:
         text = file.read()
 
-    source = compile(text)
+    # -S and -c stop early, -o on its own links without running
+    mode = args.mode or ("exe" if args.output else "run")
+    output = args.output
+    if mode in ("s", "o") and output is None:
+        output = os.path.splitext(os.path.basename(args.files[0]))[0] + "." + mode
+    timer = PassTimer() if args.time_passes else None
+    tracer = Tracer() if args.trace else None
+    memory = MemoryReport() if args.mem_report else None
+    stats = Stats() if args.stats else None
+    if memory:
+        memory.start()
+    try:
+        cache = CompileCache(cache_dir) if cache_dir else None
+        source = compile(text, cache, mode, output, timer, tracer, memory, stats, args.parse_mode)
+    finally:
+        if memory:
+            memory.stop()
     print(source)
+    if memory:
+        print(memory.report(), file=sys.stderr)
+    if timer:
+        print_timer(timer, args.time_passes_format)
+    if stats:
+        print_stats(stats, args.stats_format)
+    if tracer:
+        tracer.write(args.trace)
+
+def print_timer(timer: PassTimer, format: str):
+    print(timer.to_json() if format == "json" else timer.report(), file=sys.stderr)
+
+def print_stats(stats: Stats, format: str):
+    print(stats.to_json() if format == "json" else stats.report(), file=sys.stderr)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
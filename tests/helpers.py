@@ -0,0 +1,19 @@
+# Helpers shared by the tests
+import io
+from core.compile import emit_assembly
+from core.lexer import Lexer
+from core.parser import Parser
+from core.codegen import CodeGenerator
+from core.util.context import CompilationContext
+
+# The assembly emit_assembly writes for text, anything after out is passed on to it
+def emitted(text: str, *args, **kwargs) -> str:
+    out = io.StringIO()
+    emit_assembly(text, out, *args, **kwargs)
+    return out.getvalue()
+
+# The assembly of the whole program generated at once, with the passes chained by hand
+def generated(text: str) -> str:
+    context = CompilationContext()
+    program = Parser(Lexer(text, context=context).tokenise_buffer(), context=context).parse_program()
+    return CodeGenerator(program, context=context).generate_program()
@@ -0,0 +1,59 @@
+import re
+import unittest
+from core.lexer import Lexer as lexer
+from core.parser import Parser as parser
+from core.fold import Fold
+from core.codegen import CodeGenerator
+from core.data.arena import Arena
+from core.data.nodes import *
+from core.util.context import CompilationContext
+
+CODE = """
+int g = 2;
+int add(int a, int b) { return a + b; }
+int main(void) {
+    int x = 1 + 2 * 3;
+    for (int i = 0; i < 10; i++) { x += i << 1; if (x > 20) break; }
+    do x--; while (x > 3 && !0);
+    return add(x, g) ? ~x : -x;
+}
+"""
+
+def parse(code: str, context: CompilationContext = None) -> Program:
+    context = context or CompilationContext()
+    return parser(lexer(code, context=context).tokenise_buffer(), context=context).parse_program()
+
+# Symbol tables are compared by their address in the repr, leave them out
+def shape(tree) -> str:
+    return re.sub(r"symboltable=<[^>]*>", "", repr(tree))
+
+class TestArena(unittest.TestCase):
+    def test_round_trip(self):
+        tree = parse(CODE)
+        arena = Arena.from_program(tree)
+        self.assertEqual(shape(arena.to_tree()), shape(tree))
+        self.assertEqual(shape(arena.program()), shape(tree))
+        loaded = Arena.from_bytes(arena.to_bytes())
+        self.assertEqual(shape(loaded.to_tree()), shape(tree))
+        self.assertEqual(len(loaded), len(arena))
+
+    def test_passes_walk_the_arena(self):
+        context = CompilationContext()
+        expected = CodeGenerator(Fold(parse(CODE, context), context=context).start_fold(), context=context).generate_program()
+        context = CompilationContext()
+        arena = Arena.from_program(parse(CODE, context))
+        program = Fold(arena.program(), context=context).start_fold()
+        self.assertEqual(CodeGenerator(program, context=context).generate_program(), expected)
+        # Folding wrote the new literal into the arena
+        declare = arena.program().funcs[1].body.block_items[0]
+        self.assertIsInstance(declare.exp, IntLiteral)
+        self.assertEqual((declare.exp.value, declare.exp.line), (7, 5))
+
+    def test_bools_stay_apart_from_ints(self):
+        arena = Arena.from_program(parse("int main(void) { int a = 1; a++; ++a; return a; }"))
+        steps = arena.program().funcs[0].body.block_items[1:3]
+        self.assertIs(steps[0].exp.prefix, False)
+        self.assertIs(steps[1].exp.prefix, True)
+
+if __name__ == '__main__':
+    unittest.main()
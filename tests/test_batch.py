@@ -0,0 +1,70 @@
+import glob
+import os
+import tempfile
+import unittest
+from core.batch import compile_many
+from tests.helpers import emitted
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+class TestBatch(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.root = self.dir.name
+
+    def test_compile_many_in_order(self):
+        paths = sorted(glob.glob(os.path.join(SRC, "*.c")))
+        bad = os.path.join(self.root, "bad.c")
+        with open(bad, "w") as file:
+            file.write("int main(void) { return x; }")
+        paths.insert(1, bad)
+        out_dir = os.path.join(self.root, "out")
+        for jobs in (1, 2):
+            with self.subTest(jobs=jobs):
+                results = compile_many(paths, jobs, out_dir)
+                self.assertEqual([result.path for result in results], paths)
+                self.assertIsNone(results[1].output)
+                self.assertIn("Errors are", results[1].error)
+                self.assertFalse(os.path.exists(os.path.join(out_dir, "bad.s")))
+                for result in results[:1] + results[2:]:
+                    self.assertIsNone(result.error)
+                    with open(result.output) as file, open(result.path) as source:
+                        self.assertEqual(file.read(), emitted(source.read()))
+
+    def test_crash_is_that_files_error(self):
+        paths = sorted(glob.glob(os.path.join(SRC, "*.c")))[:2]
+        deep = os.path.join(self.root, "deep.c")
+        with open(deep, "w") as file:
+            file.write("int main(void) { return " + "(" * 3000 + "1" + ")" * 3000 + "; }")
+        paths.insert(1, deep)
+        for jobs in (1, 2):
+            with self.subTest(jobs=jobs):
+                results = compile_many(paths, jobs, os.path.join(self.root, "out"))
+                self.assertIn("RecursionError", results[1].error)
+                self.assertIsNone(results[1].output)
+                self.assertIsNone(results[0].error)
+                self.assertIsNone(results[2].error)
+                # The stack parser has no depth limit, in the workers too
+                results = compile_many(paths, jobs, os.path.join(self.root, "stack"), parse_mode="stack")
+                self.assertEqual([result.error for result in results], [None] * 3)
+                with open(results[1].output) as file:
+                    self.assertIn("    ret\n", file.read())
+
+    def test_cached_batch(self):
+        paths = sorted(glob.glob(os.path.join(SRC, "*.c")))[:3]
+        out_dir = os.path.join(self.root, "out")
+        cache_dir = os.path.join(self.root, "cache")
+        first = compile_many(paths, 1, out_dir, cache_dir)
+        outputs = []
+        for result in first:
+            with open(result.output) as file:
+                outputs.append(file.read())
+            os.remove(result.output)
+        again = compile_many(paths, 1, out_dir, cache_dir)
+        for result, expected in zip(again, outputs):
+            with open(result.output) as file:
+                self.assertEqual(file.read(), expected)
+
+if __name__ == "__main__":
+    unittest.main()
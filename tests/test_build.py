@@ -0,0 +1,85 @@
+import os
+import stat
+import tempfile
+import unittest
+from unittest import mock
+from core.build import build_many
+from core.util.cache import CompileCache
+from tests.helpers import emitted
+
+# Stands in for clang: the program it makes exits with the number of lines in its main.s,
+# so a program that was linked from another file's assembly shows up
+FAKE_CLANG = """#!/bin/sh
+test -f main.s && test ! -e main || exit 1
+printf '#!/bin/sh\\nexit %s\\n' $(($(wc -l < main.s) % 256)) > "$3"
+chmod +x "$3"
+"""
+
+def lines(text: str) -> int:
+    return emitted(text).count("\n") % 256
+
+class TestBuild(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.root = self.dir.name
+        bin = os.path.join(self.root, "bin")
+        os.mkdir(bin)
+        clang = os.path.join(bin, "clang")
+        with open(clang, "w") as file:
+            file.write(FAKE_CLANG)
+        os.chmod(clang, os.stat(clang).st_mode | stat.S_IEXEC)
+        patch = mock.patch.dict(os.environ, {"PATH": bin + os.pathsep + os.environ["PATH"]})
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def source(self, name: str, text: str) -> str:
+        path = os.path.join(self.root, name)
+        with open(path, "w") as file:
+            file.write(text)
+        return path
+
+    def test_build_many(self):
+        texts = ["".join(f"int f{i}(void) {{ return {i}; }}" for i in range(n)) + "int main(void) { return 0; }" for n in range(6)]
+        paths = [self.source(f"unit{n}.c", text) for n, text in enumerate(texts)]
+        paths.insert(2, self.source("bad.c", "int main(void) { return x; }"))
+        paths.append(os.path.join(self.root, "missing.c"))
+        temp = tempfile.gettempdir()
+        before = set(os.listdir(temp))
+        results = build_many(paths, max_procs=2)
+        self.assertEqual([result.path for result in results], paths)
+        self.assertIn("Errors are", results[2].error)
+        self.assertIsNotNone(results[-1].error)
+        for result, text in zip(results[:2] + results[3:-1], texts):
+            self.assertIsNone(result.error)
+            self.assertEqual(result.returncode, lines(text))
+        # Every build directory is gone and nothing was left in the current directory
+        self.assertEqual(set(os.listdir(temp)) - before, set())
+        self.assertFalse(os.path.exists("main.s"))
+
+    def test_failures_leave_nothing_behind(self):
+        good = self.source("good.c", "int main(void) { return 2; }")
+        deep = self.source("deep.c", "int main(void) { return " + "(" * 3000 + "1" + ")" * 3000 + "; }")
+        temp = tempfile.gettempdir()
+        before = set(os.listdir(temp))
+        results = build_many([deep, good])
+        self.assertIn("RecursionError", results[0].error)
+        self.assertEqual(results[1].returncode, lines("int main(void) { return 2; }"))
+        self.assertIsNone(build_many([deep], parse_mode="stack")[0].error)
+        # An error outside any one file stops the build, its directories are still removed
+        cache = CompileCache(os.path.join(self.root, "cache"))
+        with mock.patch.object(cache, "fetch", side_effect=RuntimeError("broken cache")):
+            with self.assertRaises(RuntimeError):
+                build_many([good, good], cache=cache)
+        self.assertEqual(set(os.listdir(temp)) - before, set())
+
+    def test_cached_build(self):
+        cache = CompileCache(os.path.join(self.root, "cache"))
+        paths = [self.source("unit.c", "int main(void) { return 2; }")]
+        self.assertIsNone(build_many(paths, run=False, cache=cache)[0].error)
+        self.assertEqual((cache.hits, cache.misses), (0, 1))
+        self.assertEqual(build_many(paths, cache=cache)[0].returncode, lines("int main(void) { return 2; }"))
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,150 @@
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+from unittest import mock
+from core.compile import compile, emit_assembly
+from concurrent.futures import ThreadPoolExecutor
+from core.util.cache import CompileCache, FunctionCache
+from tests.helpers import emitted
+
+CODE = "int main(void) { return 2 + 3; }"
+
+class TestCompileCache(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.root = self.dir.name
+
+    def write(self, name: str, data: bytes) -> str:
+        path = os.path.join(self.root, name)
+        with open(path, "wb") as file:
+            file.write(data)
+        return path
+
+    def test_keys(self):
+        cache = CompileCache(os.path.join(self.root, "cache"))
+        key = cache.key(CODE, "s")
+        self.assertEqual(key, cache.key(CODE, "s"))
+        self.assertNotEqual(key, cache.key(CODE + " ", "s"))
+        self.assertNotEqual(key, cache.key(CODE, "exe"))
+        self.assertNotEqual(key, cache.key(CODE, "s", {"opt": 1}))
+
+    def test_store_fetch_and_counts(self):
+        cache = CompileCache(os.path.join(self.root, "cache"))
+        dest = os.path.join(self.root, "out")
+        self.assertFalse(cache.fetch("ab" * 32, dest))
+        cache.store("ab" * 32, self.write("src", b"assembly"))
+        self.assertTrue(cache.fetch("ab" * 32, dest))
+        with open(dest, "rb") as file:
+            self.assertEqual(file.read(), b"assembly")
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        self.assertEqual(cache.report(), "Compile cache: 1 hits, 1 misses")
+
+    def test_least_recently_used_is_evicted(self):
+        cache = CompileCache(os.path.join(self.root, "cache"), max_size=250)
+        src = self.write("src", b"x" * 100)
+        for n, key in enumerate(("aa" * 32, "bb" * 32)):
+            cache.store(key, src)
+            os.utime(cache.path(key), (n, n))
+        # Reading aa makes bb the least recently used
+        self.assertTrue(cache.fetch("aa" * 32, os.path.join(self.root, "out")))
+        cache.store("cc" * 32, src)
+        self.assertTrue(os.path.exists(cache.path("aa" * 32)))
+        self.assertFalse(os.path.exists(cache.path("bb" * 32)))
+        self.assertTrue(os.path.exists(cache.path("cc" * 32)))
+        self.assertEqual([entry for entry in os.listdir(cache.path("cc" * 32)[:-64]) if entry.startswith(".tmp-")], [])
+
+    def test_directory_is_only_scanned_when_over_budget(self):
+        cache = CompileCache(os.path.join(self.root, "cache"), max_size=250)
+        src = self.write("src", b"x" * 100)
+        with mock.patch.object(cache, "entries", wraps=cache.entries) as entries:
+            cache.store("aa" * 32, src)     # The first write counts what is already there
+            cache.store("aa" * 32, src)     # Replacing an entry does not grow the cache
+            cache.store("bb" * 32, src)
+            self.assertEqual(entries.call_count, 1)
+            cache.store("cc" * 32, src)
+            self.assertEqual(entries.call_count, 2)
+        self.assertEqual(cache.size, 200)
+
+    def test_function_fragments_are_evicted_once_per_compilation(self):
+        cache = CompileCache(os.path.join(self.root, "cache"), max_size=1)
+        text = "".join(f"int f{n}(void) {{ return {n}; }}\n" for n in range(20)) + "int main(void) { return f0(); }\n"
+        with mock.patch.object(cache, "entries", wraps=cache.entries) as entries:
+            emit_assembly(text, io.StringIO(), FunctionCache(cache))
+        self.assertEqual(entries.call_count, 1)
+        self.assertLessEqual(cache.size, 1)
+
+    def test_hit_skips_compiling_and_linking(self):
+        cache = CompileCache(os.path.join(self.root, "cache"))
+        def run(args, cwd=None):
+            if args[0] == "clang":
+                with open(os.path.join(cwd, args[-1]), "wb") as file:
+                    file.write(b"executable")
+            return mock.Mock(returncode=0)
+
+        cwd = os.getcwd()
+        os.chdir(self.root)
+        self.addCleanup(os.chdir, cwd)
+        for _ in range(2):
+            with mock.patch("core.compile.subprocess") as subprocess, \
+                 mock.patch("core.compile.emit_assembly", wraps=emit_assembly) as emit, \
+                 contextlib.redirect_stdout(io.StringIO()):
+                subprocess.run.side_effect = run
+                compile(CODE, cache)
+        # The second compile only runs the cached executable
+        self.assertEqual([call.args[0] for call in subprocess.run.call_args_list], [["./main"]])
+        emit.assert_not_called()
+        self.assertEqual(cache.hits, 1)
+        # and nothing was built in the current directory
+        self.assertEqual(sorted(os.listdir(self.root)), ["cache"])
+
+    def test_output_modes(self):
+        cache = CompileCache(os.path.join(self.root, "cache"))
+        def run(args, cwd=None):
+            with open(os.path.join(cwd, args[-1]), "w") as file:
+                file.write(" ".join(args[1:-2]))
+            return mock.Mock(returncode=0)
+
+        expected = emitted(CODE)
+        for mode, flags in (("s", None), ("o", "-c main.s"), ("exe", "main.s")):
+            for cached in (None, cache):
+                with self.subTest(mode=mode, cached=cached is not None), \
+                     mock.patch("core.compile.subprocess") as subprocess, \
+                     contextlib.redirect_stdout(io.StringIO()):
+                    subprocess.run.side_effect = run
+                    output = os.path.join(self.root, f"out.{mode}")
+                    self.assertIn(f"written to {output}", compile(CODE, cached, mode, output))
+                    with open(output) as file:
+                        self.assertEqual(file.read(), expected if flags is None else flags)
+                    # Nothing is ever run
+                    self.assertNotIn(["./main"], [call.args[0] for call in subprocess.run.call_args_list])
+        with self.assertRaises(ValueError):
+            compile(CODE, mode="s")
+
+class TestFunctionCache(unittest.TestCase):
+    def test_least_recently_used_fragment_is_dropped(self):
+        functions = FunctionCache(max_fragments=2)
+        functions.put("a", "A")
+        functions.put("b", "B")
+        self.assertEqual(functions.get("a"), "A")
+        functions.put("c", "C")
+        self.assertEqual(list(functions.fragments), ["a", "c"])
+        self.assertIsNone(functions.get("b"))
+        self.assertEqual((functions.hits, functions.misses), (1, 1))
+
+    def test_shared_between_threads(self):
+        functions = FunctionCache(max_fragments=64)
+        def work(thread: int):
+            for n in range(500):
+                key = str((thread * 7 + n) % 200)
+                if functions.get(key) is None:
+                    functions.put(key, key)
+        with ThreadPoolExecutor(8) as pool:
+            list(pool.map(work, range(8)))
+        self.assertEqual(len(functions.fragments), 64)
+        self.assertEqual(functions.hits + functions.misses, 8 * 500)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,22 +1,25 @@
+import io
 import unittest
-from core.codegen import CodeGenerator as gen
-from core.data.nodes import IntLiteral, AddSub, Program, Function, Return
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+from core.codegen import CodeGenerator as gen, FLUSH_EVERY, start_method
+from core.lexer import Lexer as lexer
+from core.parser import Parser as parser
+from core.util.cache import FunctionCache
+from core.util.context import CompilationContext
+from core.data.nodes import IntLiteral, AddSub, Program, Function, Block, Return
+from core.data.token_types import TokenType
+from tests.helpers import emitted, generated
 
 class TestCodeGen(unittest.TestCase):
 
     def test_input(self):
-        tree = Program(
-            function=Function(
-                name="main",
-                body=[Return(exp=AddSub('+', IntLiteral(1), IntLiteral(2)))]
-                )
-            )
-        
-
-        output = gen(tree).generate_program()
+        body = Block([Return(AddSub(TokenType.ADDITION, IntLiteral(1), IntLiteral(2)))], None)
+        tree = Program([], [], [Function("main", [], TokenType.INT, False, body)])
+        output = gen(tree, context=CompilationContext()).generate_program()
         expected = (
-            ".section __TEXT,__text\n"
-            ".globl   _main\n"
+            "    .section __TEXT,__text\n"
+            "    .globl    _main\n"
             "_main:\n"
             "    pushq    %rbp\n"
             "    movq    %rsp, %rbp\n"
@@ -31,7 +34,84 @@ class TestCodeGen(unittest.TestCase):
         )
         self.assertIn(expected, output)
 
-        
+    def test_emit_assembly_streams_items(self):
+        code = "int g; int two(void) { return 2; } int g = 5; int h; int main(void) { return two() + g + h; }"
+        assembly = emitted(code)
+        # Functions and globals come out in source order, uninitialised globals at the end
+        self.assertLess(assembly.index("_two:"), assembly.index("_g:"))
+        self.assertLess(assembly.index("_g:"), assembly.index("_main:"))
+        self.assertTrue(assembly.rstrip().endswith(".zerofill __DATA,__bss,_h,8,3"))
+        self.assertNotIn("_g,8,3", assembly)
+
+    def test_generate_program_to_sink(self):
+        class Sink(io.StringIO):
+            writes = 0
+            def write(self, text):
+                Sink.writes += 1
+                return super().write(text)
+
+        code = "int main(void) { int a = 1; " + "a = a + 2 * a;" * FLUSH_EVERY + " return a; }"
+        outputs = []
+        for out in (None, Sink()):
+            context = CompilationContext()
+            generator = gen(parser(lexer(code, context=context).tokenise_buffer(), context=context).parse_program(), context=context)
+            text = generator.generate_program(out)
+            outputs.append(text if out is None else out.getvalue())
+        self.assertEqual(outputs[0], outputs[1])
+        # The buffer is written out in chunks as it fills, not once at the end
+        self.assertGreater(Sink.writes, 1)
+
+    def test_function_cache(self):
+        code = (
+            "int g = 1;\n"
+            "int f(int a) { while (a > 0) a = a - g; return a ? 1 : 2; }\n"
+            "int h(int a) { if (a) return a; return 0; }\n"
+            "int main(void) { int x = 4; return f(x) + h(x); }\n"
+        )
+        functions = FunctionCache()
+        self.assertEqual(emitted(code, functions), emitted(code))
+        self.assertEqual((functions.hits, functions.misses), (0, 3))
+        # Moving every function down a line changes nothing they generate
+        self.assertEqual(emitted("int z;\n" + code, functions), emitted("int z;\n" + code))
+        self.assertEqual((functions.hits, functions.misses), (3, 3))
+        # Only the changed function is generated again, the others are spliced in from the cache
+        changed = code.replace("return 0;", "return a - 1;")
+        self.assertEqual(emitted(changed, functions), emitted(changed))
+        self.assertEqual((functions.hits, functions.misses), (5, 4))
+
+    def test_parallel_generation(self):
+        code = (
+            "int g = 1;\n"
+            + "".join(f"int f{n}(int a) {{ while (a > {n}) a = a - g; return a ? {n} : g; }}\n" for n in range(12))
+            + "int main(void) { int x = 4; if (x) x = f0(x) + f11(x); return x; }\n"
+        )
+        def generate(jobs, functions=None):
+            context = CompilationContext()
+            program = parser(lexer(code, context=context).tokenise_buffer(), context=context).parse_program()
+            return gen(program, functions=functions, context=context).generate_program(jobs=jobs)
+
+        expected = generate(1)
+        for jobs in (2, 5):
+            with self.subTest(jobs=jobs):
+                self.assertEqual(generate(jobs), expected)
+        # Spawned workers are sent the functions in arenas
+        with mock.patch("core.codegen.start_method", return_value="spawn"):
+            self.assertEqual(generate(2), expected)
+        # Functions generated by the workers are cached, a second run takes them all from the cache
+        functions = FunctionCache()
+        self.assertEqual(generate(3, functions), expected)
+        self.assertEqual(generate(3, functions), expected)
+        self.assertEqual((functions.hits, functions.misses), (13, 13))
+        # Programs generated in parallel from several threads at once each get their own functions back
+        texts = [code.replace("a - g", f"a - {n}") for n in range(4)]
+        def generate_text(text):
+            context = CompilationContext()
+            program = parser(lexer(text, context=context).tokenise_buffer(), context=context).parse_program()
+            return gen(program, context=context).generate_program(jobs=2)
+        with ThreadPoolExecutor(4) as pool:
+            self.assertEqual(list(pool.map(generate_text, texts)), [generated(text) for text in texts])
+            # Forking from a thread is never safe, those workers are spawned
+            self.assertEqual(pool.submit(start_method).result(), "spawn")
 
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
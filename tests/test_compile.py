@@ -0,0 +1,99 @@
+import contextlib
+import glob
+import io
+import os
+import sys
+import tempfile
+import unittest
+from core.compile import compile_to_assembly, emit_assembly, CompileOptions, Diagnostic, PHASES
+from core.util.cache import FunctionCache
+from core.util.context import CompilationContext
+from core.util.error import ErrorManager
+from core.util.timing import PassTimer
+from tests.helpers import emitted
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+CODE = "int g; int two(void) { return 2; } int g = 5; int h; int main(void) { return two() + g + h; }"
+
+class TestCompileToAssembly(unittest.TestCase):
+    def test_same_assembly_as_emit_assembly(self):
+        for path in sorted(glob.glob(os.path.join(SRC, "*.c"))):
+            with open(path) as file:
+                text = file.read()
+            with self.subTest(path=os.path.basename(path)):
+                result = compile_to_assembly(text)
+                self.assertTrue(result.ok)
+                self.assertEqual(result.assembly, emitted(text))
+                self.assertEqual(result.timings, {})
+                timed = compile_to_assembly(text, CompileOptions(timer=PassTimer()))
+                self.assertEqual(timed.assembly, result.assembly)
+                self.assertEqual(set(timed.timings), set(PHASES))
+
+    def test_streams_to_out(self):
+        out = io.StringIO()
+        result = compile_to_assembly(CODE, CompileOptions(engine="regex", mode="stack"), out)
+        self.assertIsNone(result.assembly)
+        self.assertEqual(out.getvalue(), emitted(CODE))
+
+    def test_diagnostics_without_side_effects(self):
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as root:
+            os.chdir(root)
+            try:
+                printed = io.StringIO()
+                with contextlib.redirect_stdout(printed):
+                    lexing = compile_to_assembly("int main(void) { return 1a; }")
+                    parsing = compile_to_assembly("int main(void) { return x; }")
+                    codegen = compile_to_assembly("int g = 1 + 2; int main(void) { break; }")
+                self.assertEqual(os.listdir(root), [])
+            finally:
+                os.chdir(cwd)
+        self.assertEqual(printed.getvalue(), "")
+        self.assertEqual(lexing.stopped, "Lexing")
+        self.assertEqual(parsing.stopped, "Parsing")
+        self.assertEqual(parsing.diagnostics, [Diagnostic("Variable x not declared at this scope", 1, "SyntaxError")])
+        self.assertEqual(codegen.stopped, "Code generation")
+        for result in (lexing, parsing, codegen):
+            self.assertFalse(result.ok)
+            self.assertIsNone(result.assembly)
+
+    def test_internal_errors_are_diagnostics(self):
+        deep = compile_to_assembly("int main(void) { return " + "(" * 3000 + "1" + ")" * 3000 + "; }")
+        engine = compile_to_assembly(CODE, CompileOptions(engine="dfa"))
+        for result, type in ((deep, "RecursionError"), (engine, "ValueError")):
+            self.assertEqual(result.stopped, "Internal compiler error")
+            self.assertIsNone(result.assembly)
+            self.assertEqual((result.diagnostics[-1].line, result.diagnostics[-1].type), (None, type))
+
+    def test_function_cache(self):
+        functions = FunctionCache()
+        options = CompileOptions(functions=functions)
+        self.assertEqual(compile_to_assembly(CODE, options).assembly, compile_to_assembly(CODE, options).assembly)
+        self.assertEqual((functions.hits, functions.misses), (2, 2))
+
+    # The parser, Fold and the code generator all keep the nesting off the Python stack
+    def test_stack_mode_compiles_deep_input(self):
+        depth = sys.getrecursionlimit() * 5
+        options = CompileOptions(mode="stack")
+        parens = compile_to_assembly("int main(void) { return " + "(" * depth + "1" + ")" * depth + "; }", options)
+        self.assertEqual(parens.assembly, compile_to_assembly("int main(void) { return 1; }").assembly)
+        chain = " else ".join(f"if (x == {i}) return {i};" for i in range(depth))
+        sums = "(x + " * depth + "1" + ")" * depth
+        for text in ("int main(void) { int x = 3; " + chain + " return 0; }", "int main(void) { int x = 1; return " + sums + "; }"):
+            result = compile_to_assembly(text, options)
+            self.assertTrue(result.ok)
+            self.assertEqual(result.assembly.count("    ret\n"), text.count("return"))
+
+class TestEmitAssembly(unittest.TestCase):
+    # Without a timer the tokens are lexed as the parser reads them, lexing errors still stop at Lexing
+    def test_lexing_error_while_streaming(self):
+        for text in ("int main(void) { return 1a; }", "int main(void) { return 1; } /* open"):
+            with self.subTest(text=text):
+                context = CompilationContext()
+                with self.assertRaises(ErrorManager.Stop):
+                    emit_assembly(text, io.StringIO(), context=context)
+                self.assertEqual(context.error.stopped, "Lexing")
+                self.assertEqual(context.error.error_count, 1)
+
+if __name__ == "__main__":
+    unittest.main()
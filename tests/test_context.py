@@ -0,0 +1,35 @@
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from core.util.context import CompilationContext
+from core.util.error import ErrorManager
+from tests.helpers import emitted
+
+CODE = "int g = 3;\nint f(int a) { return a * g; }\nint main(void) { return f(2); }\n"
+
+class TestCompilationContext(unittest.TestCase):
+    def test_errors_stay_with_their_compilation(self):
+        expected = emitted(CODE)
+        with self.assertRaises(ErrorManager.Stop):
+            emitted("int main(void) { return x; }")
+        # The failed unit's errors and globals are gone with its context
+        self.assertEqual(emitted(CODE), expected)
+
+    def test_globals_stay_with_their_compilation(self):
+        context = CompilationContext()
+        emitted(CODE, context=context)
+        self.assertIn("g", context.global_table)
+        self.assertEqual(context.error.error_count, 0)
+        # Defining g again in a new unit is not a redefinition
+        self.assertEqual(emitted(CODE), emitted(CODE))
+        # but it is within the same one
+        with self.assertRaises(ErrorManager.Stop):
+            emitted(CODE, context=context)
+
+    def test_concurrent_compilations(self):
+        expected = emitted(CODE)
+        with ThreadPoolExecutor(4) as pool:
+            outputs = list(pool.map(emitted, [CODE] * 16))
+        self.assertEqual(outputs, [expected] * 16)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+import sys
+import unittest
+from core.lexer import Lexer as lexer
+from core.parser import Parser as parser
+from core.fold import Fold
+from core.data.nodes import *
+from core.util.context import CompilationContext
+
+def fold_return(exp: str, mode: str = "recursive"):
+    code = "int main(void) { int a = 1; return " + exp + "; }"
+    context = CompilationContext()
+    ast = Fold(parser(lexer(code, context=context).tokenise_buffer(), mode, context=context).parse_program(), context=context).start_fold()
+    return ast.funcs[0].body.block_items[-1].exp
+
+class TestFold(unittest.TestCase):
+    def test_constant_expressions(self):
+        cases = {
+            "(2 + 3) * 4 - 10 / 3": 17,
+            "~5 + -(2)": -8,
+            "1 << 4 | 3 >> 1": 17,
+            "3 > 2 ? 7 : 9": 7,
+            "!0 && (4 != 4 || 2 <= 2)": 1,
+        }
+        for exp, value in cases.items():
+            with self.subTest(exp=exp):
+                self.assertEqual(fold_return(exp), IntLiteral(value=value, line=1))
+
+    def test_variables_are_kept(self):
+        folded = fold_return("a + (2 * 3)")
+        self.assertIsInstance(folded, AddSub)
+        self.assertEqual(folded.operand2, IntLiteral(value=6, line=1))
+
+    def test_deep_expression(self):
+        depth = sys.getrecursionlimit() * 5
+        self.assertEqual(fold_return("(1 + " * depth + "1" + ")" * depth, "stack"), IntLiteral(value=depth + 1, line=1))
+
+class TestVisitor(unittest.TestCase):
+    def test_dispatch(self):
+        class Names(Visitor):
+            @visits(AddSub, MultDivMod)
+            def visit_arithmetic(self, node):
+                return "arithmetic"
+
+            @visits(IntLiteral)
+            def visit_literal(self, node):
+                return "literal"
+
+        class Subclass(IntLiteral):
+            pass
+
+        class Override(Names):
+            def visit_literal(self, node):
+                return "override"
+
+        names = Names()
+        self.assertEqual(names.visit(AddSub(TokenType.ADDITION, None, None, line=1)), "arithmetic")
+        # Subclasses of a node use the method of the closest registered base
+        self.assertEqual(names.visit(Subclass(1, line=1)), "literal")
+        self.assertIn(Subclass, Names.dispatch)
+        self.assertEqual(Override().visit(IntLiteral(1, line=1)), "override")
+        with self.assertRaises(TypeError):
+            names.visit(Var("a", TokenType.INT, line=1))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,13 @@
+import glob
 import unittest
-from core.lexer import Lexer as lexer
+from unittest import mock
+from core.lexer import Lexer
+from core.data.token_buffer import TokenBuffer
+from core.util.context import CompilationContext
+
+# Every lexer here is a compilation of its own
+def lexer(code: str, engine: str = "scan") -> Lexer:
+    return Lexer(code, engine, context=CompilationContext())
 
 class TestLexer(unittest.TestCase):
     def test_declaration(self):
@@ -13,5 +21,93 @@ class TestLexer(unittest.TestCase):
         tokens = lexer(code).tokenise()
         self.assertEqual(tokens, [])
 
+    def test_number_at_end_of_input(self):
+        tokens = lexer("return 42").tokenise()
+        self.assertEqual([t.type.name for t in tokens], ["RETURN", "INT_LITERAL"])
+        self.assertEqual(tokens[-1].value, "42")
+
+    def test_iter_tokens_is_lazy(self):
+        stream = lexer("int x;").iter_tokens()
+        self.assertEqual(next(stream).type.name, "INT")
+        self.assertEqual([t.type.name for t in stream], ["ID", "SEMICOLON"])
+
+    def test_long_input_does_not_recurse(self):
+        code = "x = x + 1;\n" * 20000
+        tokens = lexer(code).tokenise()
+        self.assertEqual(len(tokens), 6 * 20000)
+        self.assertEqual(tokens[-1].line, 20000)
+
+    def test_regex_engine_matches_scan_engine(self):
+        sources = [open(f).read() for f in sorted(glob.glob("src/*.c"))]
+        sources.append("a <<= b >>= 1.5 /* multi\nline */ c&&d||e // done\n x2 2x \"str\" 3.4.5 $ ~y")
+        for code in sources:
+            scan = lexer(code).tokenise()
+            regex = lexer(code, engine="regex").tokenise()
+            self.assertEqual(scan, regex)
+
+    def test_regex_buffer_matches_scan_buffer(self):
+        sources = [open(f).read() for f in sorted(glob.glob("src/*.c"))]
+        sources += ["", "\n\n", "a /* c\n\n */ b // x\n c\n", "x/*/ y */z", "int x = 1.5;\n\n",
+                    "x /* open", "1.2.3", "12abc", "a$b", "\"str\"", "x[1]", "a\xa0b", "12. + 3",
+                    "a\n\n  \"s\" b /* x\n y */ c\n\"t d\n12abc\ne", "x = 1;\n y = \"ab", "$\n$ /* open\n"]
+        for code in sources:
+            with self.subTest(code=code[:20]):
+                scan, regex = lexer(code), lexer(code, engine="regex")
+                expected, buffer = scan.tokenise_buffer(), regex.tokenise_buffer()
+                for column in ("types", "lines", "starts", "ends", "value_ids", "values"):
+                    self.assertEqual(getattr(buffer, column), getattr(expected, column))
+                self.assertEqual(regex.error.errors, scan.error.errors)
+                self.assertEqual((regex.line, regex.current), (scan.line, scan.current))
+
+    def test_regex_buffer_builds_no_tokens(self):
+        with mock.patch("core.lexer.Token", side_effect=AssertionError("built a Token")):
+            lexer("int x = 1; // ok\n", engine="regex").regex_buffer()
+
+    def test_regex_buffer_falls_back_one_line_at_a_time(self):
+        code = "int x = 1;\n" * 50 + "x = \"s\" + 12abc;\n" + "int y = 2;\n" * 50
+        regex = lexer(code, engine="regex")
+        lexed, made = regex.iter_regex_tokens, []
+        def fallback(stop):
+            for tok in lexed(stop):
+                made.append(tok.type.name)
+                yield tok
+        with mock.patch.object(regex, "iter_regex_tokens", side_effect=fallback):
+            buffer = regex.regex_buffer()
+        scan = lexer(code)
+        self.assertEqual(list(buffer), scan.tokenise())
+        self.assertEqual(regex.error.errors, scan.error.errors)
+        # Strings have lexemes of their own, only the tokens from the ill-formed number on were made one at a time
+        self.assertEqual(made, ["ERROR", "SEMICOLON"])
+
+    def test_values_are_spans_into_source(self):
+        code = "count = count + 12;"
+        tokens = lexer(code).tokenise()
+        self.assertEqual((tokens[0].start, tokens[0].end), (0, 5))
+        self.assertIs(tokens[0].value, tokens[2].value)
+        self.assertEqual(tokens[4].value, "12")
+        self.assertIsNone(tokens[1].value)
+
+    def test_token_buffer_round_trip(self):
+        code = "int main(void)\n{\n    int x = 1;\n    x += x2;\n    return x;\n}"
+        tokens = lexer(code).tokenise()
+        buffer = lexer(code).tokenise_buffer()
+        self.assertEqual(len(buffer), len(tokens))
+        self.assertEqual(list(buffer), tokens)
+        self.assertEqual([buffer.value_at(i) for i in range(len(buffer))], [t.value for t in tokens])
+        self.assertEqual(buffer.type_at(0), tokens[0].type)
+
+    def test_token_buffer_leaves_values_lazy(self):
+        code = "int main(void) { int x = 1; return x + x; }"
+        tokens = lexer(code).tokenise()
+        buffer = TokenBuffer.from_tokens(tokens, source=code)
+        self.assertTrue(all(tok._value is None for tok in tokens))
+        ids = [i for i in range(len(buffer)) if buffer.value_at(i) == "x"]
+        self.assertEqual(len(ids), 3)
+        self.assertEqual(len({buffer.value_ids[i] for i in ids}), 1)
+
+    def test_unknown_engine(self):
+        with self.assertRaises(ValueError):
+            lexer("", engine="dfa")
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,45 @@
+import tracemalloc
+import unittest
+from core.util.memory import MemoryReport
+from tests.helpers import emitted
+
+CODE = "int g = 3;\nint f(int a) { return a * g; }\nint main(void) { int x = f(2); return x + 1; }\n"
+
+class TestMemoryReport(unittest.TestCase):
+    def reported(self, text: str):
+        memory = MemoryReport()
+        memory.start()
+        try:
+            assembly = emitted(text, memory=memory)
+        finally:
+            memory.stop()
+        return memory, assembly
+
+    def test_passes_and_snapshot(self):
+        memory, assembly = self.reported(CODE)
+        self.assertEqual(assembly, emitted(CODE))
+        data = memory.to_dict()
+        self.assertEqual(list(data["passes"]), ["lex", "parse", "fold", "codegen"])
+        for spent in data["passes"].values():
+            self.assertGreaterEqual(spent["peak"], spent["retained"])
+        snapshot = data["snapshot"]
+        self.assertIn("core.data.token_buffer", snapshot["modules"])
+        self.assertNotIn("core.util.memory", snapshot["modules"])
+        for module, held in snapshot["modules"].items():
+            self.assertTrue(module.startswith("core."))
+            self.assertLessEqual(sum(held["sites"].values()), held["size"])
+        self.assertIn("Function", snapshot["live"])
+        report = memory.report()
+        for name in ("lex", "codegen", "peak MB", "Live objects"):
+            self.assertIn(name, report)
+
+    def test_leaves_tracing_it_did_not_start(self):
+        tracemalloc.start()
+        try:
+            self.reported(CODE)
+            self.assertTrue(tracemalloc.is_tracing())
+        finally:
+            tracemalloc.stop()
+
+if __name__ == "__main__":
+    unittest.main()
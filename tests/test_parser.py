@@ -1,23 +1,131 @@
+import glob
+import re
+import sys
 import unittest
 from core.parser import Parser as parser
 from core.lexer import Lexer as lexer
-from core.data.nodes import IntLiteral, UnOp
+from core.fold import Fold
+from core.codegen import CodeGenerator
+from core.data.nodes import IntLiteral, UnOp, AddSub, MultDivMod, BitShift, BitXOR, Assign, Var
+from core.data.token_types import TokenType
+from core.util.context import CompilationContext
 
 class TestParser(unittest.TestCase):
     def test_parse_int_literal(self):
         code = "42"
-        tokens = lexer(code).tokenise()
-        ast = parser(tokens).parse_fact()
+        context = CompilationContext()
+        ast = parser(lexer(code, context=context).tokenise(), context=context).parse_fact()
         self.assertIsInstance(ast, IntLiteral)
         self.assertEqual(ast.value, 42)
 
     def test_parse_unary_op(self):
         code = "-5"
-        tokens = lexer(code).tokenise()
-        ast = parser(tokens).parse_fact()
+        context = CompilationContext()
+        ast = parser(lexer(code, context=context).tokenise(), context=context).parse_fact()
         self.assertIsInstance(ast, UnOp)
-        self.assertEqual(ast.operator, '-')
+        self.assertEqual(ast.operator, TokenType.SUBTRACTION)
         self.assertEqual(ast.operand.value, 5)
 
+    def parse_body(self, code):
+        context = CompilationContext()
+        tokens = lexer("int main(void) { " + code + " }", context=context).tokenise()
+        return parser(tokens, context=context).parse_program().funcs[0].body.block_items
+
+    def test_precedence_and_associativity(self):
+        ret = self.parse_body("return 1 - 2 - 3 * 4 << 1;")[0]
+        shift = ret.exp
+        self.assertIsInstance(shift, BitShift)
+        sub = shift.value
+        self.assertIsInstance(sub, AddSub)
+        self.assertIsInstance(sub.operand1, AddSub)  # (1 - 2) - (3 * 4)
+        self.assertEqual(sub.operand1.operand1.value, 1)
+        self.assertIsInstance(sub.operand2, MultDivMod)
+
+    def test_compound_assignment_desugars(self):
+        items = self.parse_body("int x = 1; x ^= 3; x <<= 2;")
+        xor, shift = items[1].exp, items[2].exp
+        self.assertIsInstance(xor, Assign)
+        self.assertIsInstance(xor.exp, BitXOR)
+        self.assertIsInstance(xor.exp.operand1, Var)
+        self.assertIsInstance(shift.exp, BitShift)
+        self.assertEqual(shift.exp.operator, TokenType.BIT_SHIFT_LEFT)
+        self.assertEqual(shift.exp.shift.value, 2)
+
+    def test_chained_assignment_keeps_inner_store(self):
+        items = self.parse_body("int a; int b; a = b = 5;")
+        outer = items[2].exp
+        self.assertIsInstance(outer.exp, Assign)
+        self.assertEqual(outer.exp.id.id, "b")
+
+    def test_assigning_a_global_leaves_its_declaration_uninitialised(self):
+        code = "int g; int f(void) { g = 1; return g; } int g = 5; int main(void) { return f(); }"
+        context = CompilationContext()
+        program = parser(lexer(code, context=context).tokenise(), context=context).parse_program()
+        self.assertEqual([var.id.id for var in program.init_vars], ["g"])
+        self.assertEqual(program.init_vars[0].exp.value, 5)
+
+    def parse_mode(self, code, mode):
+        context = CompilationContext()
+        return parser(lexer(code, context=context).tokenise_buffer(), mode=mode, context=context).parse_program()
+
+    def test_stack_mode_matches_recursive(self):
+        for path in sorted(glob.glob("src/*.c")):
+            with open(path) as file:
+                code = file.read()
+            with self.subTest(path=path):
+                # Symbol tables are compared by identity, so leave them out
+                stack, recursive = (re.sub(r"symboltable=<[^>]*>", "", repr(self.parse_mode(code, mode))) for mode in ("stack", "recursive"))
+                self.assertEqual(stack, recursive)
+
+    def test_stack_mode_has_no_depth_limit(self):
+        depth = sys.getrecursionlimit() * 5
+        ladder = " else ".join(f"if (x == {i}) return {i};" for i in range(depth))
+        blocks = "{" * depth + "x = 1;" + "}" * depth
+        parens = "(1 + " * depth + "x" + ")" * depth
+        code = f"int main(void) {{ int x = 7; {ladder} {blocks} return {parens}; }}"
+        body = self.parse_mode(code, "stack").funcs[0].body.block_items
+        rung = body[1]
+        for i in range(depth - 1):
+            rung = rung.else_statement
+        self.assertEqual(rung.condition.operand2.value, depth - 1)
+        self.assertIsNone(rung.else_statement)
+
+    def test_iter_program_releases_tokens(self):
+        code = "".join(f"int f{i}(int a) {{ return a + {i}; }}\n" for i in range(200))
+        context = CompilationContext()
+        tokens = lexer(code, context=context).tokenise_stream()
+        held = []
+        names = []
+        for top in parser(tokens, context=context).iter_program():
+            held.append(len(tokens.types))
+            names.append(top.name)
+        self.assertEqual(names, [f"f{i}" for i in range(200)])
+        self.assertLessEqual(max(held), 16)
+
+    def test_function_keys(self):
+        code = "int g;\nint f(int a) { return a + g; }\nint h(void) { return 1; }\n"
+        keys = [func.key for func in self.parse_mode(code, "recursive").funcs]
+        self.assertEqual(len(set(keys)), 2)
+        self.assertEqual([func.key for func in self.parse_mode(code, "stack").funcs], keys)
+        context = CompilationContext()
+        streamed = [top.key for top in parser(lexer(code, context=context).tokenise_stream(), context=context).iter_program() if hasattr(top, "key")]
+        self.assertEqual(streamed, keys)
+        # Moving a function keeps its key, changing it or what its names are globally does not
+        self.assertEqual(self.parse_mode("\n\n" + code, "recursive").funcs[0].key, keys[0])
+        self.assertNotEqual(self.parse_mode(code.replace("a + g", "a - g"), "recursive").funcs[0].key, keys[0])
+        self.assertNotEqual(self.parse_mode("int a;\n" + code, "recursive").funcs[0].key, keys[0])
+
+    def test_passes_need_a_context(self):
+        # Chaining passes by hand must share one context, none of them makes its own
+        tokens = lexer("int x;", context=CompilationContext()).tokenise()
+        for make in (lambda: lexer("int x;"), lambda: parser(tokens), lambda: Fold(None), lambda: CodeGenerator(None)):
+            with self.assertRaises(TypeError):
+                make()
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            context = CompilationContext()
+            parser(lexer("int x;", context=context).tokenise(), mode="loop", context=context)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
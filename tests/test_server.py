@@ -0,0 +1,105 @@
+import os
+import socket
+import stat
+import tempfile
+import threading
+import unittest
+from unittest import mock
+from concurrent.futures import ThreadPoolExecutor
+from core.server import CompileServer
+from core.util.protocol import make_socket_dir, request, send, receive
+from tests.helpers import emitted
+
+CODE = "int g = 3;\nint f(int a) { return a * g; }\nint main(void) { return f(2); }\n"
+BAD = "int main(void) { return x; }"
+
+class TestCompileServer(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.path = os.path.join(self.dir.name, "compile.sock")
+        self.server = CompileServer(self.path)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.start()
+        def stop():
+            self.server.shutdown()
+            self.server.server_close()
+            thread.join()
+        self.addCleanup(stop)
+
+    def test_compile(self):
+        response = request(CODE, path=self.path)
+        self.assertEqual(response["assembly"], emitted(CODE))
+        self.assertEqual(response["diagnostics"], [])
+        self.assertIsNone(response["stopped"])
+        self.assertEqual(set(response["timings"]), {"lex", "parse", "fold", "codegen", "compile"})
+
+    def test_diagnostics(self):
+        response = request(BAD, path=self.path)
+        self.assertIsNone(response["assembly"])
+        self.assertEqual(response["stopped"], "Parsing")
+        self.assertEqual(len(response["diagnostics"]), 1)
+        self.assertEqual(response["diagnostics"][0]["line"], 1)
+        self.assertIn("Unknown options", request(CODE, {"bogus": 1}, path=self.path)["stopped"])
+
+    def test_requests_are_isolated(self):
+        expected = request(CODE, path=self.path)["assembly"]
+        # Concurrent requests, half of them failing, and the same globals defined by every one
+        with ThreadPoolExecutor(8) as pool:
+            responses = list(pool.map(lambda text: request(text, path=self.path), [CODE, BAD] * 8))
+        for response in responses[::2]:
+            self.assertEqual(response["assembly"], expected)
+            self.assertEqual(response["diagnostics"], [])
+        for response in responses[1::2]:
+            self.assertEqual(len(response["diagnostics"]), 1)
+
+    def test_only_its_user_may_connect(self):
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o600)
+        with mock.patch("os.getuid", return_value=os.getuid() + 1):
+            with self.assertRaises(PermissionError):
+                request(CODE, path=self.path)
+
+    def test_many_requests_on_one_connection(self):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(self.path)
+            for text in (CODE, BAD, CODE):
+                send(sock, {"text": text, "options": {}})
+                self.assertEqual(receive(sock)["stopped"] is None, text == CODE)
+
+class TestStaleSocket(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.path = os.path.join(self.dir.name, "compile.sock")
+
+    def test_leaves_other_files_alone(self):
+        with open(self.path, "w") as file:
+            file.write(CODE)
+        with self.assertRaises(FileExistsError):
+            CompileServer(self.path)
+        with open(self.path) as file:
+            self.assertEqual(file.read(), CODE)
+
+    def test_replaces_a_stale_socket(self):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.bind(self.path)
+        server = CompileServer(self.path)
+        server.server_close()
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_socket_dir_is_private(self):
+        path = os.path.join(self.dir.name, "run", "compile.sock")
+        make_socket_dir(path)
+        self.assertEqual(stat.S_IMODE(os.stat(os.path.dirname(path)).st_mode), 0o700)
+        os.chmod(self.dir.name, 0o777)
+        with self.assertRaises(PermissionError):
+            CompileServer(self.path)
+
+    def test_leaves_a_live_server_alone(self):
+        server = CompileServer(self.path)
+        self.addCleanup(server.server_close)
+        with self.assertRaises(FileExistsError):
+            CompileServer(self.path)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+from core.batch import compile_many
+from core.compile import compile_to_assembly, CompileOptions
+from core.lexer import Lexer
+from core.util.context import CompilationContext
+from core.util.stats import Stats, InstructionCounter
+from tests.helpers import emitted
+
+CODE = (
+    "int g = 3;\n"
+    "int f(int a) { int b = a; { int c = b; while (c) { c = c - 1; b += c; } } return b * g; }\n"
+    "int main(void) { int x = f(2); x; return x ? 1 : 0; }\n"
+)
+
+def counted(text: str) -> tuple:
+    stats = Stats()
+    return stats, emitted(text, context=CompilationContext(stats=stats))
+
+class TestStats(unittest.TestCase):
+    def test_counts(self):
+        stats, assembly = counted(CODE)
+        self.assertEqual(assembly, emitted(CODE))
+        tokens = Lexer(CODE, context=CompilationContext()).tokenise_buffer()
+        self.assertEqual(sum(stats.tokens.values()), len(tokens))
+        self.assertEqual(stats.tokens["ID"], sum(1 for i in range(len(tokens)) if tokens.type_at(i).name == "ID"))
+        self.assertEqual(stats.nodes["Function"], 2)
+        self.assertEqual(stats.nodes["While"], 1)
+        # Some tokens are stepped over without consume
+        self.assertGreater(stats.parser["consume"], len(tokens) // 2)
+        self.assertLessEqual(stats.parser["consume"], len(tokens))
+        self.assertGreater(stats.parser["assign lookaheads"], stats.parser["assign backtracks"])
+        small, _ = counted("int main(void) { int x = 1; x; x = 2; return 0; }")
+        # Only "x;" starts with a name without being an assignment
+        self.assertEqual(small.parser["assign backtracks"], 1)
+        self.assertGreater(stats.lookups["scope depth walked"], 0)
+        self.assertEqual(
+            stats.lookups["search_blocks"],
+            stats.lookups["scope hits"] + stats.lookups["scope misses"]
+        )
+        self.assertEqual(stats.labels, {"start": 1, "end": 2, "el": 1})
+        self.assertEqual(stats.opcodes["ret"], 2)
+        self.assertEqual(stats.opcodes["call"], 1)
+
+    def test_loops_count_every_instruction(self):
+        stats, assembly = counted("int main(void) { int a = 3; while (a) a = a - 1; do a = a + 1; while (a < 2); return a; }")
+        lines = [line.split(None, 1)[0] for line in assembly.splitlines() if line.startswith("    ") and not line.lstrip().startswith(".")]
+        self.assertEqual(sum(stats.opcodes.values()), len(lines))
+        self.assertEqual(stats.opcodes["cmpq"], lines.count("cmpq"))
+        # A label in front of an instruction does not hide it
+        stats = Stats()
+        InstructionCounter(io.StringIO(), stats).write("_main.start1:    movq    $1, %rax\n_main.end1:\n")
+        self.assertEqual(stats.opcodes, {"movq": 1})
+
+    def test_add_and_json(self):
+        once, _ = counted(CODE)
+        twice = Stats()
+        options = CompileOptions(stats=twice)
+        for _ in range(2):
+            self.assertTrue(compile_to_assembly(CODE, options).ok)
+        for group, counts in once.to_dict().items():
+            self.assertEqual(twice.to_dict()[group], {name: 2 * count for name, count in counts.items()})
+        self.assertEqual(Stats.from_dict(json.loads(twice.to_json())).to_dict(), twice.to_dict())
+        self.assertIn("opcodes", twice.report())
+
+    def test_batch(self):
+        with tempfile.TemporaryDirectory() as root:
+            paths = []
+            for index in range(3):
+                paths.append(os.path.join(root, f"f{index}.c"))
+                with open(paths[-1], "w") as file:
+                    file.write(CODE)
+            results = compile_many(paths, 2, stats=True)
+        total = Stats()
+        for result in results:
+            total.add(result.stats)
+        once, _ = counted(CODE)
+        self.assertEqual(total.opcodes, {name: 3 * count for name, count in once.opcodes.items()})
+        self.assertIsNone(compile_many(paths[:1], 1)[0].stats)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+import unittest
+from core.lexer import Lexer as lexer
+from core.parser import Parser as parser
+from core.data.token_types import TokenType
+from core.util.symbol_table import ScopedSymbolTable, SymbolEntry
+from core.util.context import CompilationContext
+
+def entry(id, line):
+    return SymbolEntry(id=id, type=TokenType.INT, initialised=True, line=line)
+
+class TestScopedSymbolTable(unittest.TestCase):
+    def test_shadowing_is_undone_on_pop(self):
+        scopes = ScopedSymbolTable()
+        outer, inner = entry("x", 1), entry("x", 2)
+        scopes.push()
+        scopes.insert("x", outer)
+        scopes.push()
+        self.assertFalse(scopes.declared_in_scope("x"))
+        scopes.insert("x", inner)
+        self.assertTrue(scopes.declared_in_scope("x"))
+        self.assertIs(scopes.get("x"), inner)
+        table = scopes.pop()
+        self.assertIs(table.get("x"), inner)
+        self.assertIs(scopes.get("x"), outer)
+        scopes.pop()
+        self.assertIsNone(scopes.get("x"))
+        self.assertEqual(scopes.bindings, {})
+
+    def test_line_visibility(self):
+        scopes = ScopedSymbolTable()
+        outer, later = entry("x", 1), entry("x", 5)
+        scopes.push()
+        scopes.insert("x", outer)
+        scopes.push()
+        scopes.insert("x", later)
+        # A use on line 3 comes before the inner declaration, so it sees the outer one
+        self.assertIs(scopes.get("x", 3), outer)
+        self.assertIs(scopes.get("x", 5), later)
+        self.assertIsNone(scopes.get("y", 5))
+
+    def test_empty_scope_has_no_table(self):
+        scopes = ScopedSymbolTable()
+        scopes.push()
+        scopes.bind("_break", entry("_break", 0))
+        self.assertIsNone(scopes.pop())
+
+    def test_deep_nesting(self):
+        scopes = ScopedSymbolTable()
+        scopes.push()
+        scopes.insert("x", entry("x", 1))
+        for _ in range(10000):
+            scopes.push()
+        self.assertEqual(scopes.get("x").line, 1)
+        for _ in range(10000):
+            self.assertIsNone(scopes.pop())
+        self.assertEqual(scopes.pop().get("x").line, 1)
+
+    def test_parser_blocks(self):
+        code = "int main(void) { int x = 1; { } { int x = 2; { x = 3; } } return x; }"
+        context = CompilationContext()
+        body = parser(lexer(code, context=context).tokenise_buffer(), context=context).parse_program().funcs[0].body
+        empty, inner = body.block_items[1], body.block_items[2]
+        self.assertIsNone(empty.symboltable)
+        self.assertIsNone(inner.block_items[1].symboltable)
+        self.assertEqual(list(inner.symboltable.table), ["x"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import contextlib
+import io
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+from core.batch import compile_many
+from core.compile import compile, compile_to_assembly, CompileOptions
+from core.lexer import Lexer
+from core.util.timing import PassTimer
+from core.util.context import CompilationContext
+
+CODE = "int g = 3;\nint f(int a) { return a * g; }\nint main(void) { return f(2); }\n"
+
+class TestPassTimer(unittest.TestCase):
+    def test_counts_and_rates(self):
+        timer = PassTimer()
+        result = compile_to_assembly(CODE, CompileOptions(timer=timer))
+        self.assertEqual(timer.counts["tokens"], len(Lexer(CODE, context=CompilationContext()).tokenise_buffer()))
+        self.assertEqual(timer.counts["lines"], result.assembly.count("\n"))
+        self.assertGreater(timer.counts["nodes"], 10)
+        self.assertEqual(set(timer.rates()), {"tokens/s", "nodes/s", "lines/s"})
+        # A timer adds up every compilation it is given
+        compile_to_assembly(CODE, CompileOptions(timer=timer))
+        self.assertEqual(timer.counts["lines"], 2 * result.assembly.count("\n"))
+
+    def test_compile_times_clang_and_the_program(self):
+        def run(args, cwd=None):
+            if args[0] == "clang":
+                open(os.path.join(cwd, args[-1]), "w").close()
+            return mock.Mock(returncode=0)
+
+        timer = PassTimer()
+        with mock.patch("core.compile.subprocess") as subprocess, \
+             contextlib.redirect_stdout(io.StringIO()):
+            subprocess.run.side_effect = run
+            compile(CODE, timer=timer)
+        data = json.loads(timer.to_json())
+        self.assertEqual(list(data["passes"]), ["lex", "parse", "fold", "codegen", "assemble", "run"])
+        self.assertAlmostEqual(data["total"]["wall"], sum(spent["wall"] for spent in data["passes"].values()))
+        report = timer.report()
+        for name in ("lex", "parse", "fold", "codegen", "assemble", "run", "total", "tokens/s"):
+            self.assertIn(name, report)
+
+    def test_batch_timers_add_up(self):
+        with tempfile.TemporaryDirectory() as root:
+            paths = []
+            for n in range(3):
+                paths.append(os.path.join(root, f"unit{n}.c"))
+                with open(paths[-1], "w") as file:
+                    file.write(CODE)
+            results = compile_many(paths, 2, timed=True)
+        timer = PassTimer()
+        for result in results:
+            timer.add(result.timer)
+        self.assertEqual(timer.counts["tokens"], 3 * len(Lexer(CODE, context=CompilationContext()).tokenise_buffer()))
+        self.assertEqual(list(timer.to_dict()["passes"]), ["lex", "parse", "fold", "codegen"])
+
+if __name__ == "__main__":
+    unittest.main()
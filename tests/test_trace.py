@@ -0,0 +1,74 @@
+import json
+import os
+import tempfile
+import unittest
+from core.batch import compile_many
+from core.compile import compile_to_assembly, CompileOptions
+from core.util.cache import FunctionCache
+from core.util.trace import Tracer
+from tests.helpers import emitted
+
+CODE = "int g = 3;\nint f(int a) { return a * g + 2 * 3; }\nint main(void) { return f(2); }\n"
+
+def spans(tracer: Tracer) -> list:
+    # Pairs every begin event with its end event, checking they nest
+    open_spans, closed = [], []
+    for event in tracer.events:
+        if event["ph"] == "B":
+            open_spans.append(event)
+        else:
+            begin = open_spans.pop()
+            assert (begin["name"], begin["cat"]) == (event["name"], event["cat"])
+            assert begin["ts"] <= event["ts"]
+            closed.append((begin, event))
+    assert not open_spans
+    return closed
+
+class TestTracer(unittest.TestCase):
+    def test_passes_and_functions(self):
+        tracer = Tracer()
+        result = compile_to_assembly(CODE, CompileOptions(tracer=tracer))
+        closed = spans(tracer)
+        passes = [begin["name"] for begin, _ in closed if begin["cat"] == "pass"]
+        self.assertEqual(passes[0], "lex")
+        self.assertEqual(set(passes), {"lex", "parse", "fold", "codegen"})
+        folded = {begin["name"]: (begin["args"], end["args"]) for begin, end in closed if begin["cat"] == "fold"}
+        self.assertEqual(list(folded), ["f", "main"])
+        # 2 * 3 folded into one literal
+        self.assertEqual(folded["f"][0]["nodes"] - folded["f"][1]["nodes"], 2)
+        generated = {begin["name"]: end["args"] for begin, end in closed if begin["cat"] == "codegen"}
+        self.assertEqual(list(generated), ["f", "main"])
+        for name, args in generated.items():
+            self.assertIn(f"_{name}:", result.assembly)
+            self.assertGreater(args["bytes"], 0)
+            self.assertFalse(args["cached"])
+        self.assertLess(sum(args["bytes"] for args in generated.values()), len(result.assembly))
+        json.dumps(tracer.to_dict())
+
+    def test_traced_output_is_unchanged(self):
+        expected = emitted(CODE)
+        functions = FunctionCache()
+        for _ in range(2):
+            tracer = Tracer()
+            self.assertEqual(compile_to_assembly(CODE, CompileOptions(functions=functions, tracer=tracer)).assembly, expected)
+        cached = [end["args"]["cached"] for _, end in spans(tracer) if end["cat"] == "codegen"]
+        self.assertEqual(cached, [True, True])
+
+    def test_batch_traces_add_up(self):
+        with tempfile.TemporaryDirectory() as root:
+            paths = []
+            for n in range(3):
+                paths.append(os.path.join(root, f"unit{n}.c"))
+                with open(paths[-1], "w") as file:
+                    file.write(CODE)
+            results = compile_many(paths, 2, traced=True)
+        tracer = Tracer()
+        for result in results:
+            tracer.add(result.tracer)
+        closed = spans(tracer)
+        self.assertEqual(sum(1 for begin, _ in closed if (begin["name"], begin["cat"]) == ("main", "codegen")), 3)
+        # Every event was recorded in a worker
+        self.assertNotIn(os.getpid(), {event["pid"] for event in tracer.events})
+
+if __name__ == "__main__":
+    unittest.main()